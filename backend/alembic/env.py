@@ -30,12 +30,25 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+# Maintained by migrations / triggers outside the ORM models
+UNMAPPED_OBJECTS = {("column", "search_vector"), ("index", "ix_analyses_search_vector"),
+                    ("index", "ix_cases_search_vector")}
+# SQLite's FTS5 search table and the shadow tables it creates
+UNMAPPED_OBJECTS |= {("table", name) for name in ("search_index", "search_index_data", "search_index_idx",
+                                                  "search_index_content", "search_index_docsize",
+                                                  "search_index_config")}
+
+def include_object(object, name, type_, reflected, compare_to):
+    return (type_, name) not in UNMAPPED_OBJECTS
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
+        render_as_batch=True,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -44,7 +57,9 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # Batch mode lets ALTER-style operations run on SQLite too, by copying the table
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object,
+                      render_as_batch=True)
 
     with context.begin_transaction():
         context.run_migrations()
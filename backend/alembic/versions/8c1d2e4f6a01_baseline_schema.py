@@ -0,0 +1,111 @@
+"""baseline schema
+
+Revision ID: 8c1d2e4f6a01
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+Schema of the initial models, as created by Base.metadata.create_all at startup.
+Databases created that way can be adopted with `alembic stamp 8c1d2e4f6a01`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1d2e4f6a01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('phone', sa.String(), nullable=True),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('role', sa.Enum('CLIENT', 'OPERATOR', 'ADMIN', name='userrole'), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+
+    op.create_table(
+        'cases',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('client_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Enum('NEW', 'ANALYZING', 'ANALYSIS_READY', 'DOCUMENTS_READY', 'COMPLETED',
+                                    name='casestatus'), nullable=True),
+        sa.Column('client_notes', sa.Text(), nullable=True),
+        sa.Column('operator_notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['client_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_cases_id', 'cases', ['id'], unique=False)
+
+    op.create_table(
+        'documents',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('case_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('type', sa.Enum('PDF', 'IMAGE', name='documenttype'), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('uploaded_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['case_id'], ['cases.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_documents_id', 'documents', ['id'], unique=False)
+
+    op.create_table(
+        'analyses',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('case_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=False),
+        sa.Column('recommendations', sa.Text(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['case_id'], ['cases.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_analyses_id', 'analyses', ['id'], unique=False)
+
+    op.create_table(
+        'document_options',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('analysis_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('estimated_time', sa.String(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['analysis_id'], ['analyses.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_document_options_id', 'document_options', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_document_options_id', table_name='document_options')
+    op.drop_table('document_options')
+    op.drop_index('ix_analyses_id', table_name='analyses')
+    op.drop_table('analyses')
+    op.drop_index('ix_documents_id', table_name='documents')
+    op.drop_table('documents')
+    op.drop_index('ix_cases_id', table_name='cases')
+    op.drop_table('cases')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_table('users')
+    sa.Enum(name='documenttype').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='casestatus').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='userrole').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,25 @@
+"""document sha256
+
+Revision ID: 8f3a1b5c7d02
+Revises: 8c1d2e4f6a01
+Create Date: 2026-10-18 12:02:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a1b5c7d02'
+down_revision = '8c1d2e4f6a01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.drop_column('sha256')
@@ -0,0 +1,41 @@
+"""document blob store
+
+Revision ID: 9d2e3f5a7b12
+Revises: 8f3a1b5c7d02
+Create Date: 2026-10-18 12:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2e3f5a7b12'
+down_revision = '8f3a1b5c7d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+    # Hashes of documents uploaded before the blob store, so the foreign key holds
+    op.execute(
+        "INSERT INTO blobs (sha256, size, ref_count) "
+        "SELECT sha256, MAX(size), COUNT(*) FROM documents WHERE sha256 IS NOT NULL GROUP BY sha256"
+    )
+    # Batch mode so SQLite, which cannot add a constraint to a table, rebuilds it instead
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.create_foreign_key('documents_sha256_fkey', 'blobs', ['sha256'], ['sha256'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.drop_constraint('documents_sha256_fkey', type_='foreignkey')
+    op.drop_table('blobs')
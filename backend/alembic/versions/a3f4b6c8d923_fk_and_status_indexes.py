@@ -0,0 +1,40 @@
+"""foreign key and status indexes
+
+Revision ID: a3f4b6c8d923
+Revises: 9d2e3f5a7b12
+Create Date: 2026-10-18 12:10:00.000000
+
+Composite indexes follow the (created_at, id) keyset ordering used by the
+list endpoints, so filtered pages are read in index order.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f4b6c8d923'
+down_revision = '9d2e3f5a7b12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+    op.create_index('ix_cases_client_id_created_at_id', 'cases', ['client_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_cases_status_created_at_id', 'cases', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_cases_created_at_id', 'cases', ['created_at', 'id'], unique=False)
+    op.create_index('ix_documents_case_id_uploaded_at_id', 'documents', ['case_id', 'uploaded_at', 'id'],
+                    unique=False)
+    op.create_index('ix_documents_sha256', 'documents', ['sha256'], unique=False)
+    op.create_index('ix_analyses_case_id', 'analyses', ['case_id'], unique=False)
+    op.create_index('ix_document_options_analysis_id', 'document_options', ['analysis_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_document_options_analysis_id', table_name='document_options')
+    op.drop_index('ix_analyses_case_id', table_name='analyses')
+    op.drop_index('ix_documents_sha256', table_name='documents')
+    op.drop_index('ix_documents_case_id_uploaded_at_id', table_name='documents')
+    op.drop_index('ix_cases_created_at_id', table_name='cases')
+    op.drop_index('ix_cases_status_created_at_id', table_name='cases')
+    op.drop_index('ix_cases_client_id_created_at_id', table_name='cases')
+    op.drop_index('ix_users_created_at_id', table_name='users')
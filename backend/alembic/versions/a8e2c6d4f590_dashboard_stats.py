@@ -0,0 +1,80 @@
+"""dashboard stats summary tables
+
+Revision ID: a8e2c6d4f590
+Revises: f7d1b5c4a389
+Create Date: 2026-10-18 21:30:00.000000
+
+Rows are keyed by a shard as well as the status or day, so concurrent
+writers update different rows. Both tables only hold derived data and are
+backfilled from the source tables, on PostgreSQL and SQLite alike.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e2c6d4f590'
+down_revision = 'f7d1b5c4a389'
+branch_labels = None
+depends_on = None
+
+DAILY_COLUMNS = ('cases_created', 'analyses_created', 'documents_uploaded', 'analysis_revenue', 'option_revenue')
+
+
+def _key(name: str, type_) -> list:
+    # Declared on the columns, as in app/models.py
+    return [sa.Column(name, type_, primary_key=True), sa.Column('shard', sa.Integer(), primary_key=True)]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'case_status_counts',
+        *_key('status', sa.String(length=32)),
+        sa.Column('count', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'daily_stats',
+        *_key('day', sa.Date()),
+        sa.Column('cases_created', sa.Integer(), nullable=False),
+        sa.Column('analyses_created', sa.Integer(), nullable=False),
+        sa.Column('documents_uploaded', sa.Integer(), nullable=False),
+        sa.Column('analysis_revenue', sa.Float(), nullable=False),
+        sa.Column('option_revenue', sa.Float(), nullable=False),
+    )
+    # Backfill into shard 0; from here on the application keeps both tables up to date
+    if op.get_bind().dialect.name == 'postgresql':
+        day = "timezone('UTC', {})::date"
+    else:
+        # SQLite stores CURRENT_TIMESTAMP, which is UTC
+        day = "date({})"
+    op.execute(
+        "INSERT INTO case_status_counts (status, shard, count) "
+        "SELECT CAST(status AS VARCHAR(32)), 0, count(*) FROM cases GROUP BY status"
+    )
+    op.execute(
+        f"""
+        INSERT INTO daily_stats (day, shard, {', '.join(DAILY_COLUMNS)})
+        SELECT day, 0, sum(cases), sum(analyses), sum(documents), sum(analysis_revenue), sum(option_revenue)
+        FROM (
+            SELECT {day.format('created_at')} AS day, count(*) AS cases, 0 AS analyses, 0 AS documents,
+                   0 AS analysis_revenue, 0 AS option_revenue
+            FROM cases GROUP BY 1
+            UNION ALL
+            SELECT {day.format('created_at')}, 0, count(*), 0, sum(price), 0
+            FROM analyses GROUP BY 1
+            UNION ALL
+            SELECT {day.format('uploaded_at')}, 0, 0, count(*), 0, 0
+            FROM documents GROUP BY 1
+            UNION ALL
+            SELECT {day.format('a.created_at')}, 0, 0, 0, 0, sum(o.price)
+            FROM document_options o JOIN analyses a ON a.id = o.analysis_id GROUP BY 1
+        ) buckets
+        WHERE day IS NOT NULL
+        GROUP BY day
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_stats')
+    op.drop_table('case_status_counts')
@@ -0,0 +1,123 @@
+"""full text search
+
+Revision ID: b7e1c9d2f334
+Revises: a3f4b6c8d923
+Create Date: 2026-10-18 14:00:00.000000
+
+Adds generated tsvector columns with GIN indexes on analyses and cases,
+using the `legal_pl` text search configuration. It starts as a copy of
+`simple`. When Polish ispell files (polish.dict, polish.affix and
+polish.stop in $SHAREDIR/tsearch_data) are installed, run the migration
+with SEARCH_POLISH_ISPELL=true to add Polish stemming.
+
+On SQLite, search uses an FTS5 table kept in sync by triggers instead;
+this creates it and indexes the existing rows.
+"""
+import os
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1c9d2f334'
+down_revision = 'a3f4b6c8d923'
+branch_labels = None
+depends_on = None
+
+SEARCH_POLISH_ISPELL = os.getenv("SEARCH_POLISH_ISPELL", "false").lower() in ("1", "true", "yes")
+
+# table: (kind, indexed text, case id), as in app/search.py
+SOURCES = {
+    'analyses': ('analysis', "coalesce({row}.summary, '') || ' ' || coalesce({row}.content, '')", '{row}.case_id'),
+    'cases': (
+        'case',
+        "coalesce({row}.name, '') || ' ' || coalesce({row}.client_notes, '') || ' ' "
+        "|| coalesce({row}.operator_notes, '')",
+        '{row}.id',
+    ),
+}
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        upgrade_postgresql()
+    elif dialect == 'sqlite':
+        upgrade_sqlite()
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        downgrade_postgresql()
+    elif dialect == 'sqlite':
+        downgrade_sqlite()
+
+
+def upgrade_postgresql() -> None:
+    op.execute("CREATE TEXT SEARCH CONFIGURATION legal_pl (COPY = simple)")
+    if SEARCH_POLISH_ISPELL:
+        op.execute(
+            "CREATE TEXT SEARCH DICTIONARY polish_ispell "
+            "(TEMPLATE = ispell, DictFile = polish, AffFile = polish, StopWords = polish)"
+        )
+        op.execute(
+            "ALTER TEXT SEARCH CONFIGURATION legal_pl "
+            "ALTER MAPPING FOR asciiword, asciihword, hword_asciipart, word, hword, hword_part "
+            "WITH polish_ispell, simple"
+        )
+
+    op.execute(
+        "ALTER TABLE analyses ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('legal_pl', coalesce(summary, '')), 'A') || "
+        "setweight(to_tsvector('legal_pl', coalesce(content, '')), 'B')"
+        ") STORED"
+    )
+    op.execute(
+        "ALTER TABLE cases ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('legal_pl', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('legal_pl', coalesce(client_notes, '')), 'B') || "
+        "setweight(to_tsvector('legal_pl', coalesce(operator_notes, '')), 'B')"
+        ") STORED"
+    )
+    op.create_index('ix_analyses_search_vector', 'analyses', ['search_vector'], postgresql_using='gin')
+    op.create_index('ix_cases_search_vector', 'cases', ['search_vector'], postgresql_using='gin')
+
+
+def upgrade_sqlite() -> None:
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "body, kind UNINDEXED, ref_id UNINDEXED, case_id UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    for table, (kind, body, case_id) in SOURCES.items():
+        insert = (
+            f"INSERT INTO search_index (body, kind, ref_id, case_id) "
+            f"VALUES ({body.format(row='new')}, '{kind}', new.id, {case_id.format(row='new')});"
+        )
+        delete = f"DELETE FROM search_index WHERE kind = '{kind}' AND ref_id = old.id;"
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END"
+        )
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END")
+        op.execute(
+            f"INSERT INTO search_index (body, kind, ref_id, case_id) "
+            f"SELECT {body.format(row=table)}, '{kind}', {table}.id, {case_id.format(row=table)} FROM {table}"
+        )
+
+
+def downgrade_postgresql() -> None:
+    op.drop_index('ix_cases_search_vector', table_name='cases')
+    op.drop_index('ix_analyses_search_vector', table_name='analyses')
+    op.drop_column('cases', 'search_vector')
+    op.drop_column('analyses', 'search_vector')
+    op.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS legal_pl")
+    op.execute("DROP TEXT SEARCH DICTIONARY IF EXISTS polish_ispell")
+
+
+def downgrade_sqlite() -> None:
+    for table in SOURCES:
+        for suffix in ('ai', 'au', 'ad'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+    op.execute("DROP TABLE IF EXISTS search_index")
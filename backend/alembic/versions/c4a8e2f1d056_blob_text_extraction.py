@@ -0,0 +1,45 @@
+"""blob text extraction
+
+Revision ID: c4a8e2f1d056
+Revises: b7e1c9d2f334
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f1d056'
+down_revision = 'b7e1c9d2f334'
+branch_labels = None
+depends_on = None
+
+extraction_status = sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', name='extractionstatus')
+
+
+def upgrade() -> None:
+    extraction_status.create(op.get_bind(), checkfirst=True)
+    op.add_column('blobs', sa.Column('extraction_status', extraction_status, server_default='PENDING', nullable=False))
+    op.add_column('blobs', sa.Column('extraction_error', sa.Text(), nullable=True))
+    op.add_column('blobs', sa.Column('extraction_claimed_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('blobs', sa.Column('page_count', sa.Integer(), nullable=True))
+    op.add_column('blobs', sa.Column('extracted_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_table(
+        'blob_pages',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('page_number', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['sha256'], ['blobs.sha256'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('sha256', 'page_number'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('blob_pages')
+    op.drop_column('blobs', 'extracted_at')
+    op.drop_column('blobs', 'page_count')
+    op.drop_column('blobs', 'extraction_claimed_at')
+    op.drop_column('blobs', 'extraction_error')
+    op.drop_column('blobs', 'extraction_status')
+    extraction_status.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,24 @@
+"""analysis updated_at
+
+Revision ID: d5b9f3a2e167
+Revises: c4a8e2f1d056
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b9f3a2e167'
+down_revision = 'c4a8e2f1d056'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('analyses', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('analyses', 'updated_at')
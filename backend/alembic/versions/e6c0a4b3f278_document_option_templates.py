@@ -0,0 +1,63 @@
+"""document option templates
+
+Revision ID: e6c0a4b3f278
+Revises: d5b9f3a2e167
+Create Date: 2026-10-18 17:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c0a4b3f278'
+down_revision = 'd5b9f3a2e167'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    templates = op.create_table(
+        'document_option_templates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('estimated_time', sa.String(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('sort_order', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_document_option_templates_id'), 'document_option_templates', ['id'], unique=False)
+    op.create_index(op.f('ix_document_option_templates_category'), 'document_option_templates', ['category'], unique=False)
+
+    # The two options create_analysis used to hard-code
+    op.bulk_insert(templates, [
+        {
+            'name': 'Sprzeciw od nakazu zapłaty',
+            'description': 'Profesjonalnie przygotowany sprzeciw z uzasadnieniem prawnym',
+            'price': 89.0,
+            'estimated_time': '24h',
+            'category': 'Pisma procesowe',
+            'sort_order': 10,
+            'is_active': True,
+        },
+        {
+            'name': 'Wniosek o rozłożenie na raty',
+            'description': 'Wniosek o rozłożenie należności na raty płatne',
+            'price': 59.0,
+            'estimated_time': '12h',
+            'category': 'Wnioski',
+            'sort_order': 20,
+            'is_active': True,
+        },
+    ])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_document_option_templates_category'), table_name='document_option_templates')
+    op.drop_index(op.f('ix_document_option_templates_id'), table_name='document_option_templates')
+    op.drop_table('document_option_templates')
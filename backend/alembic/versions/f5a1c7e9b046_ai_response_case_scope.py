@@ -0,0 +1,33 @@
+"""ai response case scope
+
+Revision ID: f5a1c7e9b046
+Revises: a8e2c6d4f590
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a1c7e9b046'
+down_revision = 'a8e2c6d4f590'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing entries cannot be attributed to a case and may hold another case's passages
+    op.execute("DELETE FROM ai_response_bands")
+    op.execute("DELETE FROM ai_responses")
+    with op.batch_alter_table('ai_responses') as batch_op:
+        batch_op.add_column(sa.Column('case_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('ai_responses_case_id_fkey', 'cases', ['case_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_index(batch_op.f('ix_ai_responses_case_id'), ['case_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('ai_responses') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ai_responses_case_id'))
+        batch_op.drop_constraint('ai_responses_case_id_fkey', type_='foreignkey')
+        batch_op.drop_column('case_id')
@@ -0,0 +1,53 @@
+"""ai response cache
+
+Revision ID: f7d1b5c4a389
+Revises: e6c0a4b3f278
+Create Date: 2026-10-18 18:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7d1b5c4a389'
+down_revision = 'e6c0a4b3f278'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ai_responses',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('prompt_hash', sa.String(length=64), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('question', sa.Text(), nullable=False),
+        sa.Column('normalized_question', sa.Text(), nullable=False),
+        sa.Column('minhash', sa.LargeBinary(), nullable=False),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('hit_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('last_hit_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('prompt_hash'),
+    )
+    op.create_index(op.f('ix_ai_responses_id'), 'ai_responses', ['id'], unique=False)
+    op.create_index(op.f('ix_ai_responses_expires_at'), 'ai_responses', ['expires_at'], unique=False)
+    op.create_table(
+        'ai_response_bands',
+        sa.Column('band_key', sa.String(length=32), nullable=False),
+        sa.Column('response_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['response_id'], ['ai_responses.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('band_key', 'response_id'),
+    )
+    op.create_index(op.f('ix_ai_response_bands_response_id'), 'ai_response_bands', ['response_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ai_response_bands_response_id'), table_name='ai_response_bands')
+    op.drop_table('ai_response_bands')
+    op.drop_index(op.f('ix_ai_responses_expires_at'), table_name='ai_responses')
+    op.drop_index(op.f('ix_ai_responses_id'), table_name='ai_responses')
+    op.drop_table('ai_responses')
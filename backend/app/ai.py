@@ -0,0 +1,414 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.metrics import AI_MODEL_CALL_LATENCY, AI_MODEL_CALLS
+
+AI_BACKEND = os.getenv("AI_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
+AI_FAKE_DELAY = float(os.getenv("AI_FAKE_DELAY", "0"))
+# Pause between streamed chunks of the fake backend, to simulate token generation
+AI_FAKE_CHUNK_DELAY = float(os.getenv("AI_FAKE_CHUNK_DELAY", "0"))
+
+# Model calls running at once, across all callers in this process
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+# Limit for a single attempt, and for the call including retries and backoff
+AI_CALL_TIMEOUT = float(os.getenv("AI_CALL_TIMEOUT", "60"))
+AI_CALL_DEADLINE = float(os.getenv("AI_CALL_DEADLINE", "180"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_RETRY_BACKOFF = float(os.getenv("AI_RETRY_BACKOFF", "1"))
+AI_RETRY_MAX_BACKOFF = float(os.getenv("AI_RETRY_MAX_BACKOFF", "10"))
+# Consecutive transient failures that open the circuit, and how long it stays open
+AI_BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", "5"))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+
+
+class TransientModelError(Exception):
+    """Temporary model failure worth retrying; raised by FakeBackend to simulate outages."""
+
+
+class ModelUnavailable(Exception):
+    """The circuit breaker is open: calls fail fast until the model recovers."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("AI model temporarily unavailable")
+        self.retry_after = retry_after
+
+
+def build_analysis_prompt(question: str, context: Optional[str] = None) -> str:
+    # Without context the prompt is unchanged, so earlier cache entries still match
+    materials = f"""
+        Materiały sprawy (fragmenty dokumentów i notatek klienta, najtrafniejsze do pytania):
+{context}
+
+        Opieraj się na tych materiałach i wskazuj numery fragmentów, z których korzystasz.
+""" if context else ""
+    return f"""
+        Jesteś profesjonalnym prawnikiem specjalizującym się w prawie polskim.
+        Przeanalizuj następujące pytanie prawne i udziel szczegółowej odpowiedzi:
+
+        Pytanie: {question}
+{materials}
+        Proszę o:
+        1. Szczegółową analizę prawną
+        2. Podsumowanie w 2-3 zdaniach
+        3. Konkretne zalecenia działania
+        4. Wskazanie możliwych pism do sporządzenia
+
+        Odpowiedź powinna być profesjonalna i zgodna z polskim prawem.
+        """
+
+
+class ModelBackend(ABC):
+    """Synchronous text generation backend; called from worker threads."""
+
+    # Part of the AI response cache key
+    model_name = "unknown"
+
+    @abstractmethod
+    def generate(self, prompt: str) -> str:
+        """Return the whole response."""
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield the response in chunks as the model produces them."""
+        yield self.generate(prompt)
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, (TransientModelError, ConnectionError, TimeoutError))
+
+
+class GeminiBackend(ModelBackend):
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        self.model_name = model_name
+        self._genai = None
+        self._lock = threading.Lock()
+
+    def _sdk(self):
+        # The SDK takes most of a second to import; load it on the first call, not at worker start
+        with self._lock:
+            if self._genai is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=os.getenv("GOOGLE_GENERATIVE_AI_API_KEY"))
+                self._genai = genai
+        return self._genai
+
+    def generate(self, prompt: str) -> str:
+        model = self._sdk().GenerativeModel(self.model_name)
+        return model.generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        model = self._sdk().GenerativeModel(self.model_name)
+        for chunk in model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+    def is_retryable(self, error: Exception) -> bool:
+        # Loaded by now: SDK errors can only come from calls that imported it
+        from google.api_core import exceptions
+
+        retryable = (
+            exceptions.TooManyRequests,
+            exceptions.InternalServerError,
+            exceptions.ServiceUnavailable,
+            exceptions.GatewayTimeout,
+            exceptions.DeadlineExceeded,
+        )
+        return isinstance(error, retryable) or super().is_retryable(error)
+
+
+class FakeBackend(ModelBackend):
+    """Offline backend returning a canned answer, for tests and benchmarks."""
+
+    model_name = "fake"
+
+    def __init__(self, response: Optional[str] = None, delay: float = AI_FAKE_DELAY,
+                 chunk_delay: float = AI_FAKE_CHUNK_DELAY, failures: int = 0):
+        self.response = response
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        # The first `failures` calls raise TransientModelError
+        self.failures = failures
+        self.prompts: List[str] = []
+
+    def generate(self, prompt: str) -> str:
+        self._start(prompt)
+        return self._answer(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        # `delay` is the time to the first chunk, `chunk_delay` the gap between chunks
+        self._start(prompt)
+        words = self._answer(prompt).split(" ")
+        for index, word in enumerate(words):
+            if index and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield word if index == len(words) - 1 else word + " "
+
+    def _start(self, prompt: str) -> None:
+        self.prompts.append(prompt)
+        if self.delay:
+            time.sleep(self.delay)
+        if len(self.prompts) <= self.failures:
+            raise TransientModelError(f"simulated failure {len(self.prompts)} of {self.failures}")
+
+    def _answer(self, prompt: str) -> str:
+        if self.response is not None:
+            return self.response
+        return "Analiza testowa wygenerowana offline.\n\n" + prompt.strip()
+
+
+_backend: Optional[ModelBackend] = None
+
+
+def get_backend() -> ModelBackend:
+    global _backend
+    if _backend is None:
+        _backend = FakeBackend() if AI_BACKEND == "fake" else GeminiBackend()
+    return _backend
+
+
+def set_backend(backend: Optional[ModelBackend]) -> None:
+    global _backend
+    _backend = backend
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `reset_seconds` one trial call is let through."""
+
+    def __init__(self, threshold: int = AI_BREAKER_THRESHOLD, reset_seconds: float = AI_BREAKER_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - self.clock())
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and (self._trial_running or self.retry_after() > 0)
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._trial_running or self.retry_after() > 0:
+            return False
+        self._trial_running = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.threshold:
+            self.opened_at = self.clock()
+        self._trial_running = False
+
+    def release_trial(self) -> None:
+        """The trial call ended without an outcome (cancelled); let the next call try instead."""
+        self._trial_running = False
+
+
+class _Flight:
+    """One model call shared by every caller asking for the same prompt meanwhile."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.listeners: List[Callable[[str], None]] = []
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Retrieve the exception even when no follower awaits it
+        self.result.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def listen(self, on_chunk: Optional[Callable[[str], None]]) -> None:
+        if on_chunk is None:
+            return
+        # Late joiners first receive what was already streamed
+        for chunk in self.chunks:
+            on_chunk(chunk)
+        self.listeners.append(on_chunk)
+
+    def emit(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        for listener in self.listeners:
+            listener(chunk)
+
+
+class ModelClient:
+    """Async entry point for model calls.
+
+    Caps concurrent calls, enforces per-attempt timeouts and an overall
+    deadline, retries transient failures with full-jitter backoff, fails fast
+    while the circuit breaker is open, and coalesces identical prompts that
+    are already in flight into one call (single-flight).
+    """
+
+    def __init__(self, backend: Optional[ModelBackend] = None, max_concurrency: int = AI_MAX_CONCURRENCY,
+                 timeout: float = AI_CALL_TIMEOUT, deadline: float = AI_CALL_DEADLINE,
+                 max_retries: int = AI_MAX_RETRIES, backoff: float = AI_RETRY_BACKOFF,
+                 max_backoff: float = AI_RETRY_MAX_BACKOFF, breaker: Optional[CircuitBreaker] = None):
+        self._backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[str, _Flight] = {}
+
+    @property
+    def backend(self) -> ModelBackend:
+        return self._backend or get_backend()
+
+    async def generate(self, prompt: str, on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """Return the full response; on_chunk, if given, receives each chunk on the event loop."""
+        flight = self._inflight.get(prompt)
+        if flight is not None:
+            AI_MODEL_CALLS.labels("coalesced").inc()
+            flight.listen(on_chunk)
+            return await asyncio.shield(flight.result)
+
+        flight = _Flight()
+        flight.listen(on_chunk)
+        self._inflight[prompt] = flight
+        try:
+            text = await self._call(prompt, flight)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                flight.result.set_exception(e)
+            else:
+                flight.result.cancel()
+            raise
+        finally:
+            del self._inflight[prompt]
+        flight.result.set_result(text)
+        return text
+
+    async def _call(self, prompt: str, flight: _Flight) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        backend = self.backend
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                AI_MODEL_CALLS.labels("rejected").inc()
+                raise ModelUnavailable(self.breaker.retry_after())
+            # Allowed while open: this attempt is the half-open trial
+            trial = self.breaker.opened_at is not None
+
+            abandoned = threading.Event()
+
+            def emit(chunk: str) -> None:
+                if not abandoned.is_set():
+                    flight.emit(chunk)
+
+            started = time.perf_counter()
+            try:
+                call = await self._start(backend, prompt, emit, abandoned, deadline)
+                text = await asyncio.wait_for(asyncio.shield(call), timeout=min(self.timeout, deadline - loop.time()))
+            except Exception as e:
+                abandoned.set()
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                retryable = timed_out or backend.is_retryable(e)
+                AI_MODEL_CALLS.labels("timeout" if timed_out else "error").inc()
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The model answered; the request itself was bad
+                    self.breaker.record_success()
+
+                attempt += 1
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+                # Output already streamed to callers cannot be taken back, so such calls are not retried
+                if (not retryable or flight.chunks or attempt > self.max_retries
+                        or loop.time() + delay >= deadline):
+                    if timed_out:
+                        raise TimeoutError(f"AI model call timed out after {attempt} attempt(s)") from e
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled: no outcome to record, but a trial must not keep the breaker open forever
+                abandoned.set()
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            finally:
+                AI_MODEL_CALL_LATENCY.observe(time.perf_counter() - started)
+
+            self.breaker.record_success()
+            AI_MODEL_CALLS.labels("success").inc()
+            return text
+
+    async def _start(self, backend: ModelBackend, prompt: str, emit: Callable[[str], None],
+                     abandoned: threading.Event, deadline: float) -> asyncio.Future:
+        """Run the model call on a worker thread once a concurrency slot is free.
+
+        The slot is held until the thread finishes, not until the caller stops
+        waiting: a timed-out or cancelled call cannot be interrupted and keeps
+        running (and billing) until the model's next chunk, so it still counts
+        against max_concurrency.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore()
+        await asyncio.wait_for(semaphore.acquire(), timeout=deadline - loop.time())
+        try:
+            call = loop.run_in_executor(self._get_executor(), self._stream, backend, prompt, emit, abandoned, loop)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        def finished(future: asyncio.Future) -> None:
+            semaphore.release()
+            # Retrieve the outcome even when the caller stopped waiting for it
+            future.cancelled() or future.exception()
+
+        call.add_done_callback(finished)
+        return call
+
+    @staticmethod
+    def _stream(backend: ModelBackend, prompt: str, emit: Callable[[str], None],
+                abandoned: threading.Event, loop: asyncio.AbstractEventLoop) -> str:
+        # Runs on a worker thread; chunks reach the event loop as soon as the model yields them
+        parts = []
+        for chunk in backend.stream(prompt):
+            if abandoned.is_set():
+                break
+            parts.append(chunk)
+            loop.call_soon_threadsafe(emit, chunk)
+        return "".join(parts)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            # A thread per concurrency slot: slots are only freed when their thread finishes
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="ai-model")
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._semaphore = None
+
+
+model_client = ModelClient()
@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import re
+import struct
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai import build_analysis_prompt
+from app.database import dialect_insert
+from app.metrics import AI_CACHE_LOOKUPS
+from app.models import AIResponse, AIResponseBand
+
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+AI_CACHE_TTL_DAYS = float(os.getenv("AI_CACHE_TTL_DAYS", "30"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "10000"))
+# Estimated Jaccard similarity of character shingles above which a cached answer is offered
+# as a draft. Rephrasings of one short question typically score 0.45-0.7, unrelated ones < 0.2
+AI_CACHE_SIMILARITY = float(os.getenv("AI_CACHE_SIMILARITY", "0.4"))
+
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 64
+# 32 bands of 2 rows: a pair at 0.4 similarity shares a band with ~99% probability
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+PURGE_EVERY = 100
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+_SIGNATURE = struct.Struct(f">{NUM_PERMUTATIONS}Q")
+
+_stores_since_purge = 0
+
+
+@dataclass(frozen=True)
+class SimilarResponse:
+    id: int
+    question: str
+    similarity: float
+    response: str
+    created_at: datetime
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, strip Polish diacritics and punctuation, collapse whitespace."""
+    text = text.lower().replace("ł", "l")
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def prompt_hash(normalized: str, model: str, context: Optional[str] = None, case_id: Optional[int] = None) -> str:
+    # The full prompt is hashed, so changing the template or the retrieved case
+    # passages also misses old entries. Two cases can retrieve identical passages
+    # (the same file uploaded to both), so a case's entries are keyed by its id too
+    scope = f"{case_id}\n" if case_id is not None else ""
+    return hashlib.sha256(f"{model}\n{scope}{build_analysis_prompt(normalized, context)}".encode()).hexdigest()
+
+
+def _owner(context: Optional[str], case_id: Optional[int]) -> Optional[int]:
+    # Answers built from a case's documents and notes belong to that case; answers without context are shared
+    return case_id if context is not None else None
+
+
+def _visible_to(case_id: Optional[int]):
+    if case_id is None:
+        return AIResponse.case_id.is_(None)
+    return or_(AIResponse.case_id.is_(None), AIResponse.case_id == case_id)
+
+
+def _shingle_hashes(normalized: str) -> set:
+    # Character shingles tolerate Polish inflection ("nakaz" / "nakazu") better than words
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    return {int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles}
+
+
+def minhash(normalized: str) -> List[int]:
+    hashes = _shingle_hashes(normalized)
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature: List[int]) -> List[str]:
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(struct.pack(f">{LSH_ROWS}Q", *rows), digest_size=8).hexdigest()
+        keys.append(f"{band:02d}{digest}")
+    return keys
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity: the share of equal MinHash slots."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERMUTATIONS
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def lookup(db: AsyncSession, question: str, model: str, context: Optional[str] = None,
+                 case_id: Optional[int] = None) -> Optional[str]:
+    """Cached response for the same normalized question, context and model, if still fresh.
+
+    With context, only responses stored for the same case_id match.
+    """
+    owner = _owner(context, case_id)
+    key = prompt_hash(normalize_question(question), model, context, owner)
+    owned = AIResponse.case_id.is_(None) if owner is None else AIResponse.case_id == owner
+    result = await db.execute(
+        select(AIResponse.id, AIResponse.response)
+        .where(AIResponse.prompt_hash == key, owned, AIResponse.expires_at > _now())
+    )
+    row = result.one_or_none()
+    if row is None:
+        AI_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+    AI_CACHE_LOOKUPS.labels("hit").inc()
+    await _record_hit(db, row.id)
+    return row.response
+
+
+async def get_draft(db: AsyncSession, response_id: int, case_id: Optional[int] = None) -> Optional[str]:
+    """A cached response chosen by an operator for case_id, typically from find_similar.
+
+    None unless the response is shared or was generated for case_id.
+    """
+    result = await db.execute(
+        select(AIResponse.response)
+        .where(AIResponse.id == response_id, _visible_to(case_id), AIResponse.expires_at > _now())
+    )
+    response = result.scalar_one_or_none()
+    if response is not None:
+        AI_CACHE_LOOKUPS.labels("draft").inc()
+        await _record_hit(db, response_id)
+    return response
+
+
+async def _record_hit(db: AsyncSession, response_id: int) -> None:
+    await db.execute(
+        update(AIResponse)
+        .where(AIResponse.id == response_id)
+        .values(hit_count=AIResponse.hit_count + 1, last_hit_at=_now())
+    )
+    await db.commit()
+
+
+async def find_similar(db: AsyncSession, question: str, model: str, case_id: Optional[int] = None, limit: int = 5,
+                       threshold: float = AI_CACHE_SIMILARITY) -> List[SimilarResponse]:
+    """Fresh cached responses to near-duplicate questions, most similar first.
+
+    Only shared responses and those generated for case_id are considered.
+    """
+    signature = minhash(normalize_question(question))
+    candidates = (
+        select(AIResponseBand.response_id)
+        .where(AIResponseBand.band_key.in_(band_keys(signature)))
+        .distinct()
+    )
+    result = await db.execute(
+        select(AIResponse)
+        .where(AIResponse.id.in_(candidates), AIResponse.model == model, _visible_to(case_id),
+               AIResponse.expires_at > _now())
+    )
+    matches = []
+    for row in result.scalars():
+        score = similarity(signature, list(_SIGNATURE.unpack(row.minhash)))
+        if score >= threshold:
+            matches.append(SimilarResponse(
+                id=row.id,
+                question=row.question,
+                similarity=score,
+                response=row.response,
+                created_at=row.created_at,
+            ))
+    matches.sort(key=lambda match: match.similarity, reverse=True)
+    AI_CACHE_LOOKUPS.labels("similar_hit" if matches else "similar_miss").inc()
+    return matches[:limit]
+
+
+async def store(db: AsyncSession, question: str, model: str, response: str, context: Optional[str] = None,
+                case_id: Optional[int] = None) -> None:
+    """Cache a freshly generated response, replacing any entry for the same prompt.
+
+    A response generated with context is only offered again for case_id.
+    """
+    global _stores_since_purge
+    normalized = normalize_question(question)
+    signature = minhash(normalized)
+    owner = _owner(context, case_id)
+    values = {
+        "prompt_hash": prompt_hash(normalized, model, context, owner),
+        "model": model,
+        "case_id": owner,
+        "question": question,
+        "normalized_question": normalized,
+        "minhash": _SIGNATURE.pack(*signature),
+        "response": response,
+        "hit_count": 0,
+        "expires_at": _now() + timedelta(days=AI_CACHE_TTL_DAYS),
+    }
+    stmt = dialect_insert(db)(AIResponse).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AIResponse.prompt_hash],
+        set_={key: stmt.excluded[key] for key in ("question", "minhash", "response", "hit_count", "expires_at")}
+    ).returning(AIResponse.id)
+    response_id = (await db.execute(stmt)).scalar_one()
+
+    await db.execute(delete(AIResponseBand).where(AIResponseBand.response_id == response_id))
+    await db.execute(
+        AIResponseBand.__table__.insert(),
+        [{"band_key": key, "response_id": response_id} for key in set(band_keys(signature))]
+    )
+    await db.commit()
+
+    _stores_since_purge += 1
+    if _stores_since_purge >= PURGE_EVERY:
+        _stores_since_purge = 0
+        await purge(db)
+
+
+async def purge(db: AsyncSession, max_entries: int = AI_CACHE_MAX_ENTRIES) -> int:
+    """Delete expired entries, then the least recently used beyond max_entries."""
+    expired = select(AIResponse.id).where(AIResponse.expires_at <= _now())
+    recent = (
+        select(AIResponse.id)
+        .order_by(func.coalesce(AIResponse.last_hit_at, AIResponse.created_at).desc(), AIResponse.id.desc())
+        .limit(max_entries)
+    )
+    stale_ids = set((await db.execute(expired)).scalars().all())
+    stale_ids |= set((await db.execute(select(AIResponse.id).where(AIResponse.id.not_in(recent)))).scalars().all())
+    if stale_ids:
+        # Bands are deleted explicitly; SQLite does not enforce the cascade
+        await db.execute(delete(AIResponseBand).where(AIResponseBand.response_id.in_(stale_ids)))
+        await db.execute(delete(AIResponse).where(AIResponse.id.in_(stale_ids)))
+        await db.commit()
+    return len(stale_ids)
+
+
+async def _purge_command() -> None:
+    from app.database import async_session
+
+    async with async_session() as db:
+        deleted = await purge(db)
+    print(f"deleted={deleted}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Legal Nexus AI response cache maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("purge", help="delete expired and least recently used entries")
+    args = parser.parse_args()
+    asyncio.run(_purge_command())
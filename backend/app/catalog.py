@@ -0,0 +1,126 @@
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache
+from app.models import Analysis, DocumentOption, DocumentOptionTemplate
+
+OPTION_TEMPLATE_CACHE_TTL = float(os.getenv("OPTION_TEMPLATE_CACHE_TTL", "300"))
+
+_CATALOG_KEY = "active"
+
+# Initial catalog, also seeded by the document_option_templates migration
+DEFAULT_OPTION_TEMPLATES = [
+    {
+        "name": "Sprzeciw od nakazu zapłaty",
+        "description": "Profesjonalnie przygotowany sprzeciw z uzasadnieniem prawnym",
+        "price": 89.0,
+        "estimated_time": "24h",
+        "category": "Pisma procesowe",
+        "sort_order": 10,
+    },
+    {
+        "name": "Wniosek o rozłożenie na raty",
+        "description": "Wniosek o rozłożenie należności na raty płatne",
+        "price": 59.0,
+        "estimated_time": "12h",
+        "category": "Wnioski",
+        "sort_order": 20,
+    },
+]
+
+
+@dataclass(frozen=True)
+class OptionTemplate:
+    """Session-independent snapshot of an active DocumentOptionTemplate row."""
+    id: int
+    name: str
+    description: str
+    price: float
+    estimated_time: str
+    category: str
+
+
+# The whole active catalog under one key. Per-process; other workers converge
+# within OPTION_TEMPLATE_CACHE_TTL
+option_template_cache = TTLCache("option_templates", maxsize=1, ttl=OPTION_TEMPLATE_CACHE_TTL)
+
+
+@event.listens_for(DocumentOptionTemplate.__table__, "after_create")
+def _seed_catalog(table, connection, **kw):
+    # Databases created with init_db (SQLite, benchmarks) get the same catalog as migrated ones
+    connection.execute(table.insert(), DEFAULT_OPTION_TEMPLATES)
+
+
+@event.listens_for(DocumentOptionTemplate, "after_insert")
+@event.listens_for(DocumentOptionTemplate, "after_update")
+@event.listens_for(DocumentOptionTemplate, "after_delete")
+def _invalidate_catalog(mapper, connection, target):
+    option_template_cache.clear()
+
+
+async def get_option_templates(db: AsyncSession) -> Tuple[OptionTemplate, ...]:
+    templates = option_template_cache.get(_CATALOG_KEY)
+    if templates is None:
+        result = await db.execute(
+            select(DocumentOptionTemplate)
+            .where(DocumentOptionTemplate.is_active.is_(True))
+            .order_by(DocumentOptionTemplate.sort_order, DocumentOptionTemplate.id)
+        )
+        templates = tuple(
+            OptionTemplate(
+                id=row.id,
+                name=row.name,
+                description=row.description,
+                price=row.price,
+                estimated_time=row.estimated_time,
+                category=row.category,
+            )
+            for row in result.scalars()
+        )
+        option_template_cache.set(_CATALOG_KEY, templates)
+    return templates
+
+
+async def build_analysis(
+    db: AsyncSession,
+    case_id: int,
+    content: str,
+    summary: str,
+    recommendations: str,
+    price: float,
+    option_categories: Optional[Iterable[str]] = None,
+) -> Analysis:
+    """Add an analysis with its document options to the session, uncommitted.
+
+    Options are copied from the active templates, limited to option_categories
+    when given. The caller's single commit inserts the analysis and then all
+    options in one batch.
+    """
+    templates = await get_option_templates(db)
+    if option_categories is not None:
+        categories = set(option_categories)
+        templates = [template for template in templates if template.category in categories]
+
+    db_analysis = Analysis(
+        case_id=case_id,
+        content=content,
+        summary=summary,
+        recommendations=recommendations,
+        price=price,
+        document_options=[
+            DocumentOption(
+                name=template.name,
+                description=template.description,
+                price=template.price,
+                estimated_time=template.estimated_time,
+                category=template.category,
+            )
+            for template in templates
+        ],
+    )
+    db.add(db_analysis)
+    return db_analysis
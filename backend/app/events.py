@@ -0,0 +1,280 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, object_session
+
+from app.database import DATABASE_URL
+from app.metrics import EVENT_SUBSCRIBERS
+from app.models import Analysis, Case, Document, UserRole
+
+logger = logging.getLogger(__name__)
+
+# "memory" delivers events to subscribers of this process only; "postgres" fans
+# them out to every worker through LISTEN/NOTIFY
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+# LISTEN needs a session-level connection: set this to connect directly when
+# DATABASE_URL goes through PgBouncer in transaction mode
+EVENT_DATABASE_URL = os.getenv("EVENT_DATABASE_URL", DATABASE_URL)
+# Recent events kept for clients resuming with Last-Event-ID
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+
+EVENT_CHANNEL = "legal_nexus_events"
+LISTEN_RETRY_SECONDS = 5
+
+# Markers yielded by EventBroker.subscribe besides events
+HEARTBEAT = "heartbeat"
+RESET = "reset"
+
+
+@dataclass(frozen=True)
+class CaseEvent:
+    id: str
+    type: str
+    case_id: int
+    client_id: int
+    data: dict
+    created_at: str
+
+    def visible_to(self, principal) -> bool:
+        return principal.role != UserRole.CLIENT or self.client_id == principal.id
+
+
+class EventBroker:
+    """Fans committed case, document and analysis changes out to SSE subscribers.
+
+    Events get ids unique across workers. With the postgres backend every
+    worker receives every NOTIFY in the same order, so a client can resume
+    with Last-Event-ID on any worker that still buffers that event.
+    """
+
+    def __init__(self, backend: str = EVENT_BROKER, history_size: int = EVENT_HISTORY_SIZE):
+        self.backend = backend
+        self.history: Deque[Tuple[int, CaseEvent]] = deque(maxlen=history_size)
+        self._offsets: Dict[str, int] = {}
+        self._next_offset = 0
+        # Bumped when events may have been missed (listener reconnect); subscribers then get RESET
+        self._epoch = 0
+        self._waiters: List[asyncio.Future] = []
+        self._node = uuid.uuid4().hex[:8]
+        self._sequence = itertools.count(1)
+        self._connection = None
+        self._listener: Optional[asyncio.Task] = None
+        self._send_lock: Optional[asyncio.Lock] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        if self.backend != "postgres" or self._listener is not None:
+            return
+        if not EVENT_DATABASE_URL.startswith("postgresql"):
+            logger.warning("EVENT_BROKER=postgres needs a PostgreSQL database; delivering events in-process")
+            return
+        self._send_lock = asyncio.Lock()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    def publish(self, type: str, case_id: int, client_id: int, data: dict) -> None:
+        """Deliver an event to subscribers in every worker; call once the change is committed."""
+        case_event = CaseEvent(
+            id=f"{self._node}-{next(self._sequence)}",
+            type=type,
+            case_id=case_id,
+            client_id=client_id,
+            data=data,
+            created_at=datetime.now(timezone.utc).isoformat(),
+        )
+        if self._connection is None:
+            self._deliver(case_event)
+            return
+        # Delivered locally when the notification comes back, in the same order as in other workers
+        task = asyncio.get_running_loop().create_task(self._notify(case_event))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def subscribe(self, principal, last_event_id: Optional[str] = None, case_id: Optional[int] = None,
+                        heartbeat: float = EVENT_HEARTBEAT_SECONDS) -> AsyncIterator[Union[CaseEvent, str]]:
+        """Yield events visible to principal, HEARTBEAT after `heartbeat` idle seconds.
+
+        With last_event_id, buffered events after it are replayed first. RESET
+        is yielded when events may have been missed (the id is no longer
+        buffered, or the subscriber fell behind); the client should refetch.
+        """
+        index = self._next_offset
+        if last_event_id is not None:
+            if last_event_id in self._offsets:
+                index = self._offsets[last_event_id] + 1
+            else:
+                yield RESET
+        epoch = self._epoch
+
+        EVENT_SUBSCRIBERS.inc()
+        try:
+            while True:
+                first = self.history[0][0] if self.history else self._next_offset
+                if epoch != self._epoch or index < first:
+                    epoch, index = self._epoch, self._next_offset
+                    yield RESET
+                    continue
+
+                pending = list(itertools.islice(self.history, index - first, None))
+                index = self._next_offset
+                for _, case_event in pending:
+                    if case_event.visible_to(principal) and (case_id is None or case_event.case_id == case_id):
+                        yield case_event
+                if pending:
+                    continue
+
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    await asyncio.wait({waiter}, timeout=heartbeat)
+                finally:
+                    if not waiter.done():
+                        self._waiters.remove(waiter)
+                if not waiter.done():
+                    yield HEARTBEAT
+        finally:
+            EVENT_SUBSCRIBERS.dec()
+
+    def _deliver(self, case_event: CaseEvent) -> None:
+        if len(self.history) == self.history.maxlen:
+            self._offsets.pop(self.history[0][1].id, None)
+        self.history.append((self._next_offset, case_event))
+        self._offsets[case_event.id] = self._next_offset
+        self._next_offset += 1
+        self._wake()
+
+    def _wake(self) -> None:
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _notify(self, case_event: CaseEvent) -> None:
+        try:
+            async with self._send_lock:
+                await self._connection.execute("SELECT pg_notify($1, $2)", EVENT_CHANNEL, json.dumps(asdict(case_event)))
+        except Exception as e:
+            # Other workers miss this event; local subscribers still get it
+            logger.warning("Could not broadcast event %s: %s", case_event.id, e)
+            self._deliver(case_event)
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:
+        self._deliver(CaseEvent(**json.loads(payload)))
+
+    async def _listen(self) -> None:
+        import asyncpg
+
+        dsn = make_url(EVENT_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(EVENT_CHANNEL, self._on_notification)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+                logger.warning("Event listener could not connect, retrying in %ss: %s", LISTEN_RETRY_SECONDS, e)
+                await asyncio.sleep(LISTEN_RETRY_SECONDS)
+                continue
+
+            lost = asyncio.get_running_loop().create_future()
+            connection.add_termination_listener(lambda _: lost.done() or lost.set_result(None))
+            self._connection = connection
+            try:
+                await lost
+            finally:
+                self._connection = None
+                if not connection.is_closed():
+                    await connection.close()
+            logger.warning("Event listener connection lost, reconnecting")
+            self._reset()
+
+    def _reset(self) -> None:
+        # Notifications sent meanwhile are gone; subscribers and resuming clients must refetch
+        self._epoch += 1
+        self.history.clear()
+        self._offsets.clear()
+        self._wake()
+
+
+case_events = EventBroker()
+
+
+def _queue(session: Optional[Session], type: str, case_id: int, client_id: int, data: dict) -> None:
+    # Published after commit, so subscribers never see changes that are rolled back
+    if session is not None:
+        session.info.setdefault("case_events", []).append((type, case_id, client_id, data))
+
+
+def _client_id(connection, session: Optional[Session], case_id: int) -> int:
+    # Documents and analyses name only their case; look the owner up once per session
+    owners = session.info.setdefault("case_event_owners", {}) if session is not None else {}
+    if case_id not in owners:
+        owners[case_id] = connection.scalar(select(Case.client_id).where(Case.id == case_id))
+    return owners[case_id]
+
+
+@event.listens_for(Case, "after_insert")
+def _case_created(mapper, connection, target):
+    _queue(object_session(target), "case.created", target.id, target.client_id,
+           {"name": target.name, "status": target.status})
+
+
+@event.listens_for(Case, "after_update")
+def _case_updated(mapper, connection, target):
+    state = inspect(target)
+    changed = [attr.key for attr in state.mapper.column_attrs if state.attrs[attr.key].history.has_changes()]
+    data = {"status": target.status, "changed": changed}
+    previous = state.attrs.status.history.deleted
+    if previous:
+        data["previous_status"] = previous[0]
+    _queue(object_session(target), "case.updated", target.id, target.client_id, data)
+
+
+@event.listens_for(Document, "after_insert")
+def _document_created(mapper, connection, target):
+    session = object_session(target)
+    _queue(session, "document.created", target.case_id, _client_id(connection, session, target.case_id),
+           {"document_id": target.id, "name": target.name})
+
+
+def _queue_analysis(connection, target, type: str) -> None:
+    session = object_session(target)
+    _queue(session, type, target.case_id, _client_id(connection, session, target.case_id),
+           {"analysis_id": target.id})
+
+
+@event.listens_for(Analysis, "after_insert")
+def _analysis_created(mapper, connection, target):
+    _queue_analysis(connection, target, "analysis.created")
+
+
+@event.listens_for(Analysis, "after_update")
+def _analysis_updated(mapper, connection, target):
+    _queue_analysis(connection, target, "analysis.updated")
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    session.info.pop("case_event_owners", None)
+    for type, case_id, client_id, data in session.info.pop("case_events", ()):
+        case_events.publish(type, case_id, client_id, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session):
+    session.info.pop("case_event_owners", None)
+    session.info.pop("case_events", None)
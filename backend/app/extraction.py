@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session
+from app.models import Blob, BlobPage, ExtractionStatus
+from app.storage import blob_path
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Tesseract language packs, e.g. "pol+eng"
+EXTRACTION_OCR_LANG = os.getenv("EXTRACTION_OCR_LANG", "pol")
+# A blob RUNNING for longer than this was abandoned by a crashed process and is extracted again
+EXTRACTION_CLAIM_TIMEOUT = float(os.getenv("EXTRACTION_CLAIM_TIMEOUT", "1800"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def extract_file(path: str, ocr_lang: str = EXTRACTION_OCR_LANG) -> List[str]:
+    """Return the text of every page of a PDF or image file.
+
+    Runs in a worker process; PDFs are read with pypdf, images are OCRed with
+    Tesseract (one page per frame for multi-page TIFFs). The optional libraries
+    are imported here so the API process, which never parses files, starts faster.
+    """
+    with open(path, "rb") as f:
+        is_pdf = f.read(5) == b"%PDF-"
+
+    if is_pdf:
+        try:
+            import pypdf
+        except ImportError:  # pragma: no cover - optional dependency
+            raise ExtractionError("PDF extraction requires the pypdf package")
+        reader = pypdf.PdfReader(path)
+        pages = [page.extract_text() or "" for page in reader.pages]
+    else:
+        try:
+            import pytesseract
+            from PIL import Image, ImageSequence
+        except ImportError:  # pragma: no cover - optional dependency
+            raise ExtractionError("OCR requires the pytesseract and Pillow packages")
+        with Image.open(path) as image:
+            pages = [
+                pytesseract.image_to_string(frame.convert("RGB"), lang=ocr_lang)
+                for frame in ImageSequence.Iterator(image)
+            ]
+    # PostgreSQL text columns cannot hold NUL characters
+    return [page.replace("\x00", "").strip() for page in pages]
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Spawned rather than forked: the API process runs threads (bcrypt, AI jobs)
+        _executor = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_extraction() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _claimable(retry_failed: bool):
+    statuses = [ExtractionStatus.PENDING]
+    if retry_failed:
+        statuses.append(ExtractionStatus.FAILED)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=EXTRACTION_CLAIM_TIMEOUT)
+    stale = and_(
+        Blob.extraction_status == ExtractionStatus.RUNNING,
+        # Claims made before claimed_at existed have none
+        or_(Blob.extraction_claimed_at.is_(None), Blob.extraction_claimed_at < cutoff),
+    )
+    return or_(Blob.extraction_status.in_(statuses), stale)
+
+
+async def _claim(db: AsyncSession, sha256: str, retry_failed: bool) -> bool:
+    result = await db.execute(
+        update(Blob)
+        .where(Blob.sha256 == sha256, _claimable(retry_failed))
+        .values(extraction_status=ExtractionStatus.RUNNING, extraction_error=None,
+                extraction_claimed_at=datetime.now(timezone.utc))
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def extract_blob(sha256: str, retry_failed: bool = False) -> Optional[ExtractionStatus]:
+    """Extract and store the page text of one blob.
+
+    Each content hash is processed once: blobs that are already extracted or
+    being extracted are skipped and None is returned. A RUNNING claim older
+    than EXTRACTION_CLAIM_TIMEOUT is taken over.
+    """
+    async with async_session() as db:
+        if not await _claim(db, sha256, retry_failed):
+            return None
+
+        loop = asyncio.get_running_loop()
+        try:
+            pages = await loop.run_in_executor(_get_executor(), extract_file, str(blob_path(sha256)))
+        except Exception as e:
+            logger.warning("Text extraction failed for blob %s: %s", sha256, e)
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. out of memory); start a fresh pool for the next blob
+                shutdown_extraction()
+            await db.execute(
+                update(Blob)
+                .where(Blob.sha256 == sha256)
+                .values(extraction_status=ExtractionStatus.FAILED, extraction_error=str(e))
+            )
+            await db.commit()
+            return ExtractionStatus.FAILED
+
+        await db.execute(delete(BlobPage).where(BlobPage.sha256 == sha256))
+        db.add_all(
+            BlobPage(sha256=sha256, page_number=number, text=text)
+            for number, text in enumerate(pages, start=1)
+        )
+        await db.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256)
+            .values(
+                extraction_status=ExtractionStatus.COMPLETED,
+                extraction_error=None,
+                page_count=len(pages),
+                extracted_at=datetime.now(timezone.utc),
+            )
+        )
+        await db.commit()
+        return ExtractionStatus.COMPLETED
+
+
+async def extract_pending(retry_failed: bool = False) -> dict:
+    """Extract every blob not processed yet or abandoned mid-extraction, EXTRACTION_WORKERS at a time."""
+    async with async_session() as db:
+        result = await db.execute(select(Blob.sha256).where(_claimable(retry_failed)))
+        hashes = result.scalars().all()
+
+    semaphore = asyncio.Semaphore(EXTRACTION_WORKERS)
+
+    async def run(sha256: str):
+        async with semaphore:
+            return await extract_blob(sha256, retry_failed=retry_failed)
+
+    outcomes = await asyncio.gather(*(run(sha256) for sha256 in hashes))
+    stats = {"completed": 0, "failed": 0, "skipped": 0}
+    for outcome in outcomes:
+        if outcome == ExtractionStatus.COMPLETED:
+            stats["completed"] += 1
+        elif outcome == ExtractionStatus.FAILED:
+            stats["failed"] += 1
+        else:
+            stats["skipped"] += 1
+    return stats
+
+
+async def _run_command(retry_failed: bool) -> None:
+    try:
+        stats = await extract_pending(retry_failed=retry_failed)
+    finally:
+        shutdown_extraction()
+    print(", ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Legal Nexus document text extraction")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="extract text from blobs not processed yet or left RUNNING")
+    run_parser.add_argument("--retry-failed", action="store_true", help="also retry failed extractions")
+    args = parser.parse_args()
+    asyncio.run(_run_command(args.retry_failed))
@@ -0,0 +1,371 @@
+"""Idempotency-Key support for POST requests.
+
+A client that retries a POST with the same Idempotency-Key header gets the
+response of the first attempt instead of running it again. A retry that
+arrives while the first attempt is still running waits for it. Keys are
+scoped to the user a valid bearer token was issued to, so they replay to
+the same user across re-logins; requests without a valid token are passed
+through without deduplication. Request bodies over
+IDEMPOTENCY_MAX_REQUEST_BODY are rejected with 413.
+
+Keys and responses are kept in the idempotency_keys table for
+IDEMPOTENCY_TTL seconds, so a retry can be served by any worker. Server
+errors and 429s are not kept, so retrying them runs the request again.
+Event streams are kept only when they name a Content-Location to follow
+them again, as generation streams name their job's stream; a retry, even
+one arriving while the first stream is still open, is answered with a GET
+of that location instead of starting another generation.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, select, update
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth import token_subject
+from app.database import async_session, dialect_insert
+from app.metrics import IDEMPOTENCY_REQUESTS
+from app.models import IdempotencyKey
+from app.storage import MAX_UPLOAD_SIZE
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Larger responses are passed through without being stored
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", str(256 * 1024)))
+# Request bodies are buffered before running the request; one upload plus form overhead by default
+IDEMPOTENCY_MAX_REQUEST_BODY = int(os.getenv("IDEMPOTENCY_MAX_REQUEST_BODY", str(MAX_UPLOAD_SIZE + 1024 * 1024)))
+# How long a retry waits for the first attempt before getting 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+# An attempt still unfinished after this long is presumed lost with its worker, and its key is freed
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "300"))
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+# Request bodies up to this size are buffered in memory, larger ones in a temporary file
+SPOOL_MEMORY_SIZE = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# How often a waiting retry checks whether the first attempt finished
+POLL_SECONDS = 0.2
+PURGE_EVERY = 100
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    @property
+    def stream_location(self) -> Optional[bytes]:
+        """For a kept event stream, the path that follows it again."""
+        headers = dict(self.headers)
+        if not headers.get(b"content-type", b"").startswith(b"text/event-stream"):
+            return None
+        return headers.get(b"content-location")
+
+
+@dataclass
+class IdempotencyEntry:
+    fingerprint: str
+    # None while the first attempt is running
+    response: Optional[StoredResponse] = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _match(key: Tuple[str, str]):
+    return and_(IdempotencyKey.subject == key[0], IdempotencyKey.key == key[1])
+
+
+class IdempotencyStore:
+    """Entries by (user, key) in the idempotency_keys table: in flight, then completed until they expire."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, lock_seconds: float = IDEMPOTENCY_LOCK_SECONDS):
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        self._completed_since_purge = 0
+
+    async def begin(self, key: Tuple[str, str], fingerprint: str) -> Optional[IdempotencyEntry]:
+        """Claim the key for a new attempt; if another attempt holds it, return that one's entry."""
+        async with async_session() as db:
+            # A finished entry past its TTL, or an attempt abandoned by a crashed worker, frees the key
+            await db.execute(delete(IdempotencyKey).where(_match(key), IdempotencyKey.expires_at <= _now()))
+            stmt = dialect_insert(db)(IdempotencyKey).values(
+                subject=key[0], key=key[1], fingerprint=fingerprint,
+                expires_at=_now() + timedelta(seconds=self.lock_seconds),
+            ).on_conflict_do_nothing(index_elements=["subject", "key"])
+            claimed = (await db.execute(stmt)).rowcount == 1
+            await db.commit()
+            if claimed:
+                return None
+            row = (await db.execute(select(IdempotencyKey).where(_match(key)))).scalar_one_or_none()
+        if row is None:
+            # Freed in between; the caller tries again
+            return IdempotencyEntry(fingerprint)
+        entry = IdempotencyEntry(row.fingerprint)
+        if row.status_code is not None:
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row.headers)]
+            entry.response = StoredResponse(row.status_code, headers, row.body)
+        return entry
+
+    async def complete(self, key: Tuple[str, str], fingerprint: str, response: Optional[StoredResponse]) -> None:
+        """Keep the response for replays, or free the key when there is nothing to keep."""
+        # Only the attempt's own row: after IDEMPOTENCY_LOCK_SECONDS another attempt may have taken the key
+        own = and_(_match(key), IdempotencyKey.fingerprint == fingerprint, IdempotencyKey.status_code.is_(None))
+        async with async_session() as db:
+            if response is None:
+                await db.execute(delete(IdempotencyKey).where(own))
+            else:
+                headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in response.headers]
+                await db.execute(update(IdempotencyKey).where(own).values(
+                    status_code=response.status, headers=json.dumps(headers), body=response.body,
+                    expires_at=_now() + timedelta(seconds=self.ttl),
+                ))
+            self._completed_since_purge += 1
+            if self._completed_since_purge >= PURGE_EVERY:
+                self._completed_since_purge = 0
+                await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= _now()))
+            await db.commit()
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _multipart_boundary(content_type: bytes) -> Optional[bytes]:
+    if not content_type.lower().startswith(b"multipart/"):
+        return None
+    for param in content_type.split(b";")[1:]:
+        name, _, value = param.strip().partition(b"=")
+        if name.lower() == b"boundary" and value:
+            return value.strip(b'"')
+    return None
+
+
+def _bearer_subject(authorization: Optional[bytes]) -> Optional[str]:
+    if authorization is None:
+        return None
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token_subject(token.strip())
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def _error(status_code: int, detail: str, headers: Optional[dict] = None) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying the stored response of a repeated Idempotency-Key."""
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        key = headers.get(HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        # Nothing is buffered for unauthenticated requests; the app rejects them as usual
+        subject = _bearer_subject(headers.get(b"authorization"))
+        if subject is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await _error(400, "Invalid Idempotency-Key header")(scope, receive, send)
+            return
+        try:
+            declared_size = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared_size = 0
+        if declared_size > IDEMPOTENCY_MAX_REQUEST_BODY:
+            await self._too_large(scope, receive, send)
+            return
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE) as body:
+            try:
+                fingerprint = await self._read_body(scope, headers, receive, body)
+            except BodyTooLarge:
+                await self._too_large(scope, receive, send)
+                return
+            if fingerprint is None:
+                # Client went away before sending the whole body
+                return
+            store_key = (subject, key.decode("latin-1"))
+            deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+            while True:
+                entry = await self.store.begin(store_key, fingerprint)
+                if entry is None:
+                    break
+                if entry.fingerprint != fingerprint:
+                    IDEMPOTENCY_REQUESTS.labels("mismatch").inc()
+                    await _error(422, "Idempotency-Key was already used for a different request")(
+                        scope, receive, send
+                    )
+                    return
+                if entry.response is not None:
+                    IDEMPOTENCY_REQUESTS.labels("replayed").inc()
+                    if entry.response.stream_location is not None:
+                        await self._follow(scope, entry.response.stream_location, receive, send)
+                    else:
+                        await self._replay(entry.response, send)
+                    return
+                # The first attempt, possibly on another worker, is still running; its result decides
+                if time.monotonic() >= deadline:
+                    IDEMPOTENCY_REQUESTS.labels("conflict").inc()
+                    await _error(409, "A request with this Idempotency-Key is still in progress",
+                                 headers={"Retry-After": "1"})(scope, receive, send)
+                    return
+                await asyncio.sleep(POLL_SECONDS)
+
+            IDEMPOTENCY_REQUESTS.labels("new").inc()
+            response = None
+            completed = False
+
+            async def keep_stream(stream: StoredResponse) -> None:
+                # Kept as soon as the stream starts, so retries follow it rather than wait for its end
+                nonlocal completed
+                await self.store.complete(store_key, fingerprint, stream)
+                completed = True
+
+            try:
+                response = await self._run(scope, body, receive, send, keep_stream)
+            finally:
+                if not completed:
+                    await self.store.complete(store_key, fingerprint, response)
+
+    async def _read_body(self, scope: Scope, headers: dict, receive: Receive, body) -> Optional[str]:
+        # Same key, path, query and body means the same request; anything else is a client bug
+        digest = hashlib.sha256()
+        content_type = headers.get(b"content-type", b"")
+        boundary = _multipart_boundary(content_type)
+        if boundary:
+            # Clients often pick a new multipart boundary per attempt; it is not part of the content
+            content_type = content_type.split(b";")[0]
+        for part in (scope["path"].encode(), scope["query_string"], content_type):
+            digest.update(part + b"\0")
+        pending = b""
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > IDEMPOTENCY_MAX_REQUEST_BODY:
+                raise BodyTooLarge()
+            body.write(chunk)
+            more = message.get("more_body", False)
+            if boundary:
+                # Keep a possible partial boundary at the end for the next chunk
+                data = (pending + chunk).replace(boundary, b"")
+                split = len(data) - (len(boundary) - 1) if more else len(data)
+                chunk, pending = data[:max(split, 0)], data[max(split, 0):]
+            digest.update(chunk)
+            if not more:
+                break
+        return digest.hexdigest()
+
+    async def _too_large(self, scope: Scope, receive: Receive, send: Send) -> None:
+        IDEMPOTENCY_REQUESTS.labels("too_large").inc()
+        await _error(413, f"Request body too large for an idempotent request "
+                          f"(max {IDEMPOTENCY_MAX_REQUEST_BODY} bytes)")(scope, receive, send)
+
+    async def _run(self, scope: Scope, body, receive: Receive, send: Send,
+                   keep_stream: Callable[[StoredResponse], Awaitable[None]]) -> Optional[StoredResponse]:
+        """Run the request with the buffered body; return the response if it should be kept.
+
+        An event stream with a Content-Location is passed to keep_stream when it starts.
+        """
+        size = body.seek(0, os.SEEK_END)
+        body.seek(0)
+
+        def body_messages():
+            while True:
+                chunk = body.read(CHUNK_SIZE)
+                more = body.tell() < size
+                yield {"type": "http.request", "body": chunk, "more_body": more}
+                if not more:
+                    return
+
+        messages = body_messages()
+
+        async def receive_buffered() -> Message:
+            # Once the body is delivered the app only waits for a disconnect
+            message = next(messages, None)
+            return message if message is not None else await receive()
+
+        status = 500
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: Optional[List[bytes]] = []
+        stored_size = 0
+
+        async def capture(message: Message) -> None:
+            nonlocal status, response_headers, chunks, stored_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+                content_type = dict(response_headers).get(b"content-type", b"")
+                if content_type.startswith(b"text/event-stream"):
+                    chunks = None
+                    stream = StoredResponse(status, response_headers, b"")
+                    if status == 200 and stream.stream_location is not None:
+                        await keep_stream(stream)
+                elif status >= 500 or status == 429:
+                    chunks = None
+            elif message["type"] == "http.response.body" and chunks is not None:
+                stored_size += len(message.get("body", b""))
+                if stored_size > IDEMPOTENCY_MAX_BODY:
+                    chunks = None
+                else:
+                    chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive_buffered, capture)
+        if chunks is None:
+            return None
+        return StoredResponse(status, response_headers, b"".join(chunks))
+
+    async def _replay(self, response: StoredResponse, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": response.headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": response.body})
+
+    async def _follow(self, scope: Scope, location: bytes, receive: Receive, send: Send) -> None:
+        """Answer a retried event stream with a GET of the location the first attempt named."""
+        path = location.decode("latin-1")
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        # The retry's own headers go along, so its Last-Event-ID resumes the stream
+        headers = [(name, value) for name, value in scope["headers"]
+                   if name not in (b"content-length", b"content-type")]
+        follow_scope = dict(scope, method="GET", path=path, raw_path=path.encode(), query_string=b"",
+                            headers=headers)
+
+        async def send_replayed(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"idempotent-replayed", b"true")])
+            await send(message)
+
+        await self.app(follow_scope, receive, send_replayed)
@@ -0,0 +1,258 @@
+import asyncio
+import enum
+import json
+import logging
+import os
+import uuid
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import accumulate
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app import ai_cache
+from app.ai import build_analysis_prompt, get_backend, model_client
+from app.ai_cache import AI_CACHE_ENABLED
+from app.catalog import build_analysis
+from app.database import async_session
+from app.metrics import AI_CACHE_LOOKUPS
+from app.retrieval import format_passages, retrieve_passages
+
+logger = logging.getLogger(__name__)
+
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "4"))
+AI_JOB_QUEUE_SIZE = int(os.getenv("AI_JOB_QUEUE_SIZE", "100"))
+AI_JOB_RETENTION = int(os.getenv("AI_JOB_RETENTION", "1000"))
+
+CONTENT_PREVIEW_LENGTH = 500
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+@dataclass
+class AnalysisJob:
+    case_id: int
+    question: str
+    # Skip the AI response cache and always call the model
+    force_refresh: bool = False
+    # Cached response (ai_responses.id) accepted by the operator instead of generating
+    draft_id: Optional[int] = None
+    # hit, miss, bypass or draft, once known
+    cache_status: Optional[str] = None
+    # Case passages retrieved into the prompt
+    context_passages: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    progress: int = 0
+    analysis_id: Optional[int] = None
+    content: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+    # (event, data) pairs for streaming subscribers: model chunks, then "done" or "error"
+    events: List[Tuple[str, dict]] = field(default_factory=list, repr=False)
+    # Once the job finishes, the chunks are folded into one string and the text
+    # length at the end of each chunk, so retained jobs hold no per-chunk objects
+    _text: Optional[str] = field(default=None, repr=False)
+    _chunk_ends: Optional[array] = field(default=None, repr=False)
+    _final: Optional[Tuple[str, dict]] = field(default=None, repr=False)
+    _waiters: List[asyncio.Future] = field(default_factory=list, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+    def publish(self, event: str, data: dict) -> None:
+        """Record an event and wake subscribers; must run on the event loop."""
+        self.events.append((event, data))
+        if event in ("done", "error"):
+            self._compact()
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _compact(self) -> None:
+        chunks = [data["text"] for event, data in self.events[:-1]]
+        self._text = "".join(chunks)
+        self._chunk_ends = array("q", accumulate(len(chunk) for chunk in chunks))
+        self._final = self.events[-1]
+        self.events = []
+
+    def _replay(self, after: int) -> List[Tuple[int, str, dict]]:
+        # The chunks after `after` as one event with the last chunk's id, then the final event
+        count = len(self._chunk_ends)
+        replay = []
+        if after < count:
+            start = self._chunk_ends[after - 1] if after else 0
+            replay.append((count, "chunk", {"text": self._text[start:]}))
+        if after <= count:
+            replay.append((count + 1, *self._final))
+        return replay
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[Tuple[int, str, dict]]:
+        """Yield (event id, event, data) from event id `after` on, until the job finishes.
+
+        Earlier events are replayed first, so late or reconnecting clients
+        still receive the whole response; for a finished job the missed
+        chunks arrive as a single event.
+        """
+        index = after
+        while True:
+            if self._final is not None:
+                for item in self._replay(index):
+                    yield item
+                return
+            if index < len(self.events):
+                event, data = self.events[index]
+                index += 1
+                yield index, event, data
+                continue
+            if self.done:
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+
+class AnalysisJobQueue:
+    def __init__(self, workers: int = AI_JOB_WORKERS, max_pending: int = AI_JOB_QUEUE_SIZE,
+                 retention: int = AI_JOB_RETENTION):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self.jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._ensure_started()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def _ensure_started(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, case_id: int, question: str, force_refresh: bool = False,
+               draft_id: Optional[int] = None) -> AnalysisJob:
+        """Enqueue a generation job; raises asyncio.QueueFull when saturated."""
+        self._ensure_started()
+        job = AnalysisJob(case_id=case_id, question=question, force_refresh=force_refresh, draft_id=draft_id)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self._evict()
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self.jobs.get(job_id)
+
+    def _evict(self) -> None:
+        if len(self.jobs) <= self.retention:
+            return
+        for job_id in [j.id for j in self.jobs.values() if j.done]:
+            if len(self.jobs) <= self.retention:
+                break
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: AnalysisJob) -> None:
+        job.status = JobStatus.RUNNING
+        job.progress = 10
+        try:
+            text = await self._generate(job)
+            job.progress = 80
+
+            async with async_session() as db:
+                db_analysis = await build_analysis(
+                    db,
+                    case_id=job.case_id,
+                    content=text,
+                    summary="Analiza wygenerowana przez AI - wymaga weryfikacji prawnika",
+                    recommendations=json.dumps([
+                        "Weryfikacja przez kwalifikowanego prawnika",
+                        "Analiza dokumentów sprawy",
+                        "Określenie strategii prawnej"
+                    ]),
+                    price=59.0
+                )
+                await db.commit()
+
+            job.analysis_id = db_analysis.id
+            job.content = text[:CONTENT_PREVIEW_LENGTH] + "..." if len(text) > CONTENT_PREVIEW_LENGTH else text
+            job.progress = 100
+            job.status = JobStatus.COMPLETED
+            job.publish("done", {"analysis_id": db_analysis.id})
+        except Exception as e:
+            logger.exception("Analysis job %s failed", job.id)
+            job.error = f"Error generating analysis: {str(e)}"
+            job.status = JobStatus.FAILED
+            job.publish("error", {"detail": job.error})
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+
+    async def _generate(self, job: AnalysisJob) -> str:
+        backend = get_backend()
+        if job.draft_id is not None:
+            async with async_session() as db:
+                text = await ai_cache.get_draft(db, job.draft_id, job.case_id)
+            if text is None:
+                raise ValueError(f"Cached response {job.draft_id} not found or expired")
+            job.cache_status = "draft"
+            job.publish("chunk", {"text": text})
+            return text
+
+        # The case's most relevant document and note passages, within the token budget
+        async with async_session() as db:
+            passages = await retrieve_passages(db, job.case_id, job.question)
+        job.context_passages = len(passages)
+        context = format_passages(passages)
+
+        if AI_CACHE_ENABLED and not job.force_refresh:
+            async with async_session() as db:
+                text = await ai_cache.lookup(db, job.question, backend.model_name, context, job.case_id)
+            if text is not None:
+                job.cache_status = "hit"
+                job.publish("chunk", {"text": text})
+                return text
+
+        # Identical questions generating at the same time share one model call
+        text = await model_client.generate(
+            build_analysis_prompt(job.question, context),
+            on_chunk=lambda chunk: job.publish("chunk", {"text": chunk})
+        )
+        if not AI_CACHE_ENABLED:
+            return text
+        job.cache_status = "bypass" if job.force_refresh else "miss"
+        if job.force_refresh:
+            AI_CACHE_LOOKUPS.labels("bypass").inc()
+        try:
+            async with async_session() as db:
+                await ai_cache.store(db, job.question, backend.model_name, text, context, job.case_id)
+        except Exception:
+            # The analysis itself must not fail because caching did
+            logger.exception("Could not cache the response of analysis job %s", job.id)
+        return text
+
+
+analysis_jobs = AnalysisJobQueue()
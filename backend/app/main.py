@@ -1,13 +1,17 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer
-from sqlalchemy.ext.asyncio import AsyncSession
-import os
+import asyncio
 from dotenv import load_dotenv
 
-from app.database import get_db, init_db
-from app.routers import auth, cases, documents, analyses, users
-from app.models import Base
+from app.routers import auth, cases, documents, analyses, users, search, option_templates, exports, events, stats
+from app.ai import model_client
+from app.events import case_events
+from app.idempotency import IdempotencyMiddleware
+from app.stats import STATS_RECONCILE_SECONDS, reconcile_periodically
+from app.storage import UploadLimitMiddleware
+from app.jobs import analysis_jobs
+from app.extraction import shutdown_extraction
+from app.metrics import MetricsMiddleware, render_metrics
 
 load_dotenv()
 
@@ -19,6 +23,13 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Replays the first response to POST retries with the same Idempotency-Key;
+# innermost, so replays still get CORS headers and are counted in metrics
+app.add_middleware(IdempotencyMiddleware)
+
+# Rejects oversized uploads before their multipart body is spooled to disk
+app.add_middleware(UploadLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,16 +39,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, status and SQL statement metrics, served at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(cases.router, prefix="/api/v1/cases", tags=["Cases"])
 app.include_router(documents.router, prefix="/api/v1/documents", tags=["Documents"])
 app.include_router(analyses.router, prefix="/api/v1/analyses", tags=["Analyses"])
 app.include_router(users.router, prefix="/api/v1/users", tags=["Users"])
+app.include_router(search.router, prefix="/api/v1/search", tags=["Search"])
+app.include_router(option_templates.router, prefix="/api/v1/option-templates", tags=["Document Option Templates"])
+app.include_router(exports.router, prefix="/api/v1/exports", tags=["Exports"])
+app.include_router(events.router, prefix="/api/v1/events", tags=["Events"])
+app.include_router(stats.router, prefix="/api/v1/stats", tags=["Stats"])
+
+reconcile_task = None
 
 @app.on_event("startup")
 async def startup_event():
-    await init_db()
+    # Schema is managed by Alembic (`alembic upgrade head`), not at startup
+    await analysis_jobs.start()
+    await case_events.start()
+    global reconcile_task
+    if STATS_RECONCILE_SECONDS > 0:
+        reconcile_task = asyncio.create_task(reconcile_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if reconcile_task is not None:
+        reconcile_task.cancel()
+    await case_events.stop()
+    await analysis_jobs.stop()
+    model_client.shutdown()
+    shutdown_extraction()
 
 @app.get("/")
 async def root():
@@ -45,4 +80,9 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "legal-nexus-api"}
\ No newline at end of file
+    return {"status": "healthy", "service": "legal-nexus-api"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
@@ -0,0 +1,183 @@
+import contextvars
+import logging
+import os
+import time
+from typing import List, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.cache import CACHES
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route"],
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP responses by route and status code",
+    ["method", "route", "status"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Duration of individual SQL statements",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Number of SQL statements executed while serving one request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+AI_MODEL_CALLS = Counter(
+    "ai_model_calls_total",
+    "AI model call attempts by outcome (success, error, timeout, rejected, coalesced)",
+    ["outcome"],
+)
+AI_MODEL_CALL_LATENCY = Histogram(
+    "ai_model_call_duration_seconds",
+    "Duration of AI model call attempts, including waiting for a concurrency slot",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+)
+EVENT_SUBSCRIBERS = Gauge(
+    "event_stream_subscribers",
+    "Open case event streams in this process",
+)
+AI_PROMPT_CONTEXT_TOKENS = Histogram(
+    "ai_prompt_context_tokens",
+    "Estimated tokens of retrieved case passages added to analysis prompts",
+    buckets=(50, 100, 250, 500, 1000, 1500, 2000, 4000, 8000),
+)
+IDEMPOTENCY_REQUESTS = Counter(
+    "idempotency_requests_total",
+    "POST requests with an Idempotency-Key by outcome (new, replayed, mismatch, conflict, too_large)",
+    ["outcome"],
+)
+AI_CACHE_LOOKUPS = Counter(
+    "ai_cache_lookups_total",
+    "AI response cache lookups by result",
+    ["result"],
+)
+
+_instrumented_engines: List[AsyncEngine] = []
+_request_queries: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("request_queries", default=None)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement, count statements per request and expose pool gauges."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_LATENCY.observe(elapsed)
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_query_logger.warning("slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+    _instrumented_engines.append(engine)
+
+
+class _PoolCollector:
+    def collect(self):
+        gauges = [
+            GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"]),
+            GaugeMetricFamily("db_pool_checked_out", "Connections currently checked out", labels=["engine"]),
+            GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["engine"]),
+            GaugeMetricFamily("db_pool_overflow", "Connections open beyond pool_size", labels=["engine"]),
+        ]
+        for engine in _instrumented_engines:
+            pool = engine.sync_engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue
+            label = [engine.url.render_as_string(hide_password=True)]
+            for gauge, value in zip(gauges, (pool.size(), pool.checkedout(), pool.checkedin(), pool.overflow())):
+                gauge.add_metric(label, value)
+        yield from gauges
+
+
+class _CacheCollector:
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "In-process cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "In-process cache misses", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries held in in-process caches", labels=["cache"])
+        for name, cache in CACHES.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            entries.add_metric([name], len(cache))
+        yield hits
+        yield misses
+        yield entries
+
+
+REGISTRY.register(_PoolCollector())
+REGISTRY.register(_CacheCollector())
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL statement count per route template."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route_path).observe(time.perf_counter() - started)
+            REQUESTS.labels(method, route_path, str(status_code)).inc()
+            DB_QUERIES_PER_REQUEST.labels(route_path).observe(queries[0])
+
+
+def render_metrics() -> tuple:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, Float
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, Enum, Float, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -20,8 +20,17 @@ class DocumentType(str, enum.Enum):
     PDF = "PDF"
     IMAGE = "IMAGE"
 
+class ExtractionStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
@@ -37,6 +46,12 @@ class User(Base):
 
 class Case(Base):
     __tablename__ = "cases"
+    # Composite indexes match the keyset-paginated list queries in routers/cases.py
+    __table_args__ = (
+        Index("ix_cases_client_id_created_at_id", "client_id", "created_at", "id"),
+        Index("ix_cases_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_cases_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -54,6 +69,9 @@ class Case(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_case_id_uploaded_at_id", "case_id", "uploaded_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     case_id = Column(Integer, ForeignKey("cases.id"), nullable=False)
@@ -61,22 +79,55 @@ class Document(Base):
     type = Column(Enum(DocumentType), nullable=False)
     url = Column(String, nullable=False)
     size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     case = relationship("Case", back_populates="documents")
 
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Text extraction runs once per content hash, see app/extraction.py
+    extraction_status = Column(Enum(ExtractionStatus), nullable=False, default=ExtractionStatus.PENDING,
+                               server_default=ExtractionStatus.PENDING.value)
+    extraction_error = Column(Text, nullable=True)
+    # When the current RUNNING attempt started; stale claims are taken over
+    extraction_claimed_at = Column(DateTime(timezone=True), nullable=True)
+    page_count = Column(Integer, nullable=True)
+    extracted_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationships
+    pages = relationship("BlobPage", back_populates="blob", order_by="BlobPage.page_number")
+
+class BlobPage(Base):
+    __tablename__ = "blob_pages"
+
+    sha256 = Column(String(64), ForeignKey("blobs.sha256", ondelete="CASCADE"), primary_key=True)
+    page_number = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+
+    # Relationships
+    blob = relationship("Blob", back_populates="pages")
+
 class Analysis(Base):
     __tablename__ = "analyses"
+    # Server defaults come back via RETURNING instead of a refresh query
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
-    case_id = Column(Integer, ForeignKey("cases.id"), nullable=False)
+    case_id = Column(Integer, ForeignKey("cases.id"), nullable=False, index=True)
     content = Column(Text, nullable=False)
     summary = Column(Text, nullable=False)
     recommendations = Column(Text, nullable=False)  # JSON string
     price = Column(Float, nullable=False)
     status = Column(String, default="completed")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     case = relationship("Case", back_populates="analysis")
@@ -86,7 +137,7 @@ class DocumentOption(Base):
     __tablename__ = "document_options"
 
     id = Column(Integer, primary_key=True, index=True)
-    analysis_id = Column(Integer, ForeignKey("analyses.id"), nullable=False)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), nullable=False, index=True)
     name = Column(String, nullable=False)
     description = Column(Text, nullable=False)
     price = Column(Float, nullable=False)
@@ -94,4 +145,81 @@ class DocumentOption(Base):
     category = Column(String, nullable=False)
     
     # Relationships
-    analysis = relationship("Analysis", back_populates="document_options")
\ No newline at end of file
+    analysis = relationship("Analysis", back_populates="document_options")
+
+class DocumentOptionTemplate(Base):
+    __tablename__ = "document_option_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    price = Column(Float, nullable=False)
+    estimated_time = Column(String, nullable=False)
+    category = Column(String, nullable=False, index=True)
+    sort_order = Column(Integer, nullable=False, default=0)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class AIResponse(Base):
+    """Cached model output for a normalized question, see app/ai_cache.py."""
+    __tablename__ = "ai_responses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    prompt_hash = Column(String(64), unique=True, nullable=False)
+    model = Column(String, nullable=False)
+    question = Column(Text, nullable=False)
+    normalized_question = Column(Text, nullable=False)
+    minhash = Column(LargeBinary, nullable=False)
+    response = Column(Text, nullable=False)
+    # Case whose documents and notes were in the prompt; NULL when generated without context and shared
+    case_id = Column(Integer, ForeignKey("cases.id", ondelete="CASCADE"), nullable=True, index=True)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class AIResponseBand(Base):
+    """MinHash LSH band of an AIResponse; shared band keys mark candidate near-duplicates."""
+    __tablename__ = "ai_response_bands"
+
+    band_key = Column(String(32), primary_key=True)
+    response_id = Column(Integer, ForeignKey("ai_responses.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class CaseStatusCount(Base):
+    """Current number of cases per status, maintained incrementally by app/stats.py.
+
+    Spread over STATS_SHARDS rows per status so concurrent writers rarely wait
+    on the same row; the count is the sum over shards.
+    """
+    __tablename__ = "case_status_counts"
+
+    status = Column(String(32), primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+class DailyStats(Base):
+    """Activity and revenue per UTC day, maintained incrementally by app/stats.py; sharded like CaseStatusCount."""
+    __tablename__ = "daily_stats"
+
+    day = Column(Date, primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    cases_created = Column(Integer, nullable=False, default=0)
+    analyses_created = Column(Integer, nullable=False, default=0)
+    documents_uploaded = Column(Integer, nullable=False, default=0)
+    analysis_revenue = Column(Float, nullable=False, default=0)
+    option_revenue = Column(Float, nullable=False, default=0)
+
+class IdempotencyKey(Base):
+    """A POST request's Idempotency-Key and, once it finished, its response; see app/idempotency.py."""
+    __tablename__ = "idempotency_keys"
+
+    subject = Column(String, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    # Unset while the first attempt is running
+    status_code = Column(Integer, nullable=True)
+    headers = Column(Text, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PageParams:
+    """Common keyset pagination and date-range query parameters for list endpoints."""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        order: Literal["asc", "desc"] = Query("desc"),
+        created_from: Optional[datetime] = Query(None),
+        created_to: Optional[datetime] = Query(None),
+        include_total: bool = Query(False, description="also count all matching rows"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.order = order
+        self.created_from = created_from
+        self.created_to = created_to
+        self.include_total = include_total
+
+
+def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(db: AsyncSession, stmt, created_column, id_column, params: PageParams) -> dict:
+    """Run a filtered select one keyset page at a time, ordered by (created_column, id_column).
+
+    Returns a dict matching schemas.Page.
+    """
+    if params.created_from is not None:
+        stmt = stmt.where(created_column >= params.created_from)
+    if params.created_to is not None:
+        stmt = stmt.where(created_column < params.created_to)
+
+    total = None
+    if params.include_total:
+        total = await db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+
+    sort_column = created_column
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite keeps timestamps as text in mixed formats; compare them numerically
+        sort_column = func.julianday(created_column)
+
+    key = tuple_(sort_column, id_column)
+    if params.cursor:
+        created_at, row_id = decode_cursor(params.cursor)
+        if sort_column is not created_column:
+            created_at = func.julianday(created_at)
+        position = tuple_(created_at, row_id)
+        stmt = stmt.where(key < position if params.order == "desc" else key > position)
+    if params.order == "desc":
+        stmt = stmt.order_by(sort_column.desc(), id_column.desc())
+    else:
+        stmt = stmt.order_by(sort_column.asc(), id_column.asc())
+
+    rows = (await db.execute(stmt.limit(params.limit + 1))).scalars().all()
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+
+    return {"items": rows, "next_cursor": next_cursor, "total": total}
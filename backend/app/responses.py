@@ -0,0 +1,199 @@
+import json
+import os
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import anyio
+from fastapi import HTTPException, Request, status
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# When set (e.g. "/protected-uploads/"), file bodies are handed to nginx via X-Accel-Redirect
+DOCUMENT_ACCEL_REDIRECT_PREFIX = os.getenv("DOCUMENT_ACCEL_REDIRECT_PREFIX")
+DOCUMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# API resources may change: browsers keep them but revalidate with If-None-Match
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def version_etag(kind: str, row_id: int, version: datetime) -> str:
+    """Strong ETag for a row representation, derived from its id and last write time."""
+    return f'"{kind}-{row_id}-{int(_as_utc(version).timestamp() * 1_000_000)}"'
+
+
+def validator_headers(etag: str, last_modified: datetime) -> dict:
+    return {
+        "etag": etag,
+        "last-modified": format_datetime(_as_utc(last_modified), usegmt=True),
+        "cache-control": REVALIDATE_CACHE_CONTROL,
+    }
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no ETag was sent."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into inclusive (start, end).
+
+    Returns None for headers we answer with the full body (multiple ranges,
+    other units, malformed values); raises ValueError if unsatisfiable.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse that can send a byte range, zero-copy when the server supports it."""
+
+    def __init__(self, path, stat_result: os.stat_result, byte_range: Optional[Tuple[int, int]] = None,
+                 **kwargs):
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.headers["accept-ranges"] = "bytes"
+        if byte_range is None:
+            self.start, self.length = 0, stat_result.st_size
+        else:
+            start, end = byte_range
+            self.status_code = status.HTTP_206_PARTIAL_CONTENT
+            self.start, self.length = start, end - start + 1
+            self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+            self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = self.length
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+async def file_response(request: Request, path: Path, filename: str, media_type: Optional[str] = None,
+                        etag: Optional[str] = None) -> Response:
+    """Serve a stored file with conditional GET and single-range support.
+
+    A matching If-None-Match is answered with 304 before the file is touched.
+    """
+    headers = {"cache-control": DOCUMENT_CACHE_CONTROL}
+    if etag is not None:
+        etag = f'"{etag}"'
+        headers["etag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if DOCUMENT_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the body (with sendfile and Range) from its internal location
+        headers["x-accel-redirect"] = DOCUMENT_ACCEL_REDIRECT_PREFIX + str(path)
+        return Response(media_type=media_type, headers=headers)
+
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Document content not found")
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or (etag is not None and if_range == etag)):
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "content-range": f"bytes */{stat_result.st_size}"}
+            )
+
+    return RangeFileResponse(
+        path,
+        stat_result=stat_result,
+        byte_range=byte_range,
+        headers=headers,
+        media_type=media_type,
+        filename=filename,
+        method=request.method,
+        content_disposition_type="inline",
+    )
+
+
+def format_sse(event: str, data: dict, event_id: Union[int, str, None] = None) -> str:
+    """One Server-Sent Events message; data is JSON so newlines need no escaping."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def event_stream_response(messages, headers: Optional[dict] = None) -> StreamingResponse:
+    """Stream SSE messages unbuffered: no proxy buffering, no caching."""
+    return StreamingResponse(
+        messages,
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no", **(headers or {})}
+    )
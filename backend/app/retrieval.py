@@ -0,0 +1,226 @@
+"""Per-case BM25 retrieval over extracted document text and client notes.
+
+Each case gets an in-memory index of fixed-size passages. It is synced with
+the database on every lookup, which only reads the text of documents
+extracted (or extracted again) since the last sync and drops deleted ones,
+and the best passages that fit in a token budget are placed in the
+analysis prompt.
+"""
+import asyncio
+import heapq
+import math
+import os
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai_cache import normalize_question
+from app.cache import TTLCache
+from app.metrics import AI_PROMPT_CONTEXT_TOKENS
+from app.models import Blob, BlobPage, Case, Document, ExtractionStatus
+
+RAG_ENABLED = os.getenv("RAG_ENABLED", "true").lower() in ("1", "true", "yes")
+# Estimated prompt tokens spent on retrieved passages, and the most passages used
+RAG_TOKEN_BUDGET = int(os.getenv("RAG_TOKEN_BUDGET", "1500"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "8"))
+RAG_PASSAGE_WORDS = int(os.getenv("RAG_PASSAGE_WORDS", "120"))
+# Case indexes kept per process; an evicted index is rebuilt on its next lookup
+RAG_INDEX_CACHE_SIZE = int(os.getenv("RAG_INDEX_CACHE_SIZE", "200"))
+RAG_INDEX_TTL = float(os.getenv("RAG_INDEX_TTL", "86400"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rough for Polish text with the usual subword tokenizers; good enough for a budget
+CHARS_PER_TOKEN = 4
+# Crude stemming: Polish inflects by suffix, so "nakaz", "nakazu" and "nakazem" share a prefix
+STEM_LENGTH = 6
+NOTES_SOURCE = "notes"
+
+STOPWORDS = frozenset(
+    "aby ale albo bo by byc byl byla bylo czy dla do gdy ich jak jako jest jego jej juz lub ma mi mnie "
+    "na nad nie nim od oraz po pod przez przy sa sie ta tak te tego tej ten to tu tym we za ze zeby "
+    "ktory ktora ktore moze moj moja mam".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, diacritic-free word stems without stopwords."""
+    return [word[:STEM_LENGTH] for word in normalize_question(text).split() if len(word) > 1 and word not in STOPWORDS]
+
+
+def split_passages(text: str, words: int = RAG_PASSAGE_WORDS) -> List[str]:
+    tokens = text.split()
+    return [" ".join(tokens[start:start + words]) for start in range(0, len(tokens), words)]
+
+
+def prepare_passages(pages: List[Tuple[str, str]]) -> List[Tuple[str, str, Counter]]:
+    """(label, text, term frequencies) of the passages of (label, text) pages; CPU-bound."""
+    prepared = []
+    for label, text in pages:
+        for passage_text in split_passages(text):
+            terms = Counter(tokenize(passage_text))
+            if terms:
+                prepared.append((label, passage_text, terms))
+    return prepared
+
+
+@dataclass(frozen=True)
+class Passage:
+    source: str
+    label: str
+    text: str
+    length: int
+
+
+class CaseIndex:
+    """BM25 index over the passages of one case; sources can be added and replaced."""
+
+    def __init__(self):
+        self.passages: Dict[int, Passage] = {}
+        self.sources: Dict[str, List[int]] = {}
+        # Text of each source when indexed, to detect changed notes
+        self.versions: Dict[str, str] = {}
+        # term -> {passage id: term frequency}
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.total_length = 0
+        self._next_id = 0
+
+    def add(self, source: str, pages: List[Tuple[str, str]], version: str = "") -> None:
+        """Index (label, text) pages of a source, replacing what it had before."""
+        self.add_prepared(source, prepare_passages(pages), version)
+
+    def add_prepared(self, source: str, passages: List[Tuple[str, str, Counter]], version: str = "") -> None:
+        self.remove(source)
+        ids = []
+        for label, text, terms in passages:
+            passage_id = self._next_id
+            self._next_id += 1
+            self.passages[passage_id] = Passage(source, label, text, sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings[term][passage_id] = frequency
+            self.total_length += self.passages[passage_id].length
+            ids.append(passage_id)
+        self.sources[source] = ids
+        self.versions[source] = version
+
+    def remove(self, source: str) -> None:
+        removed = set(self.sources.pop(source, ()))
+        self.versions.pop(source, None)
+        if not removed:
+            return
+        for passage_id in removed:
+            self.total_length -= self.passages.pop(passage_id).length
+        for term in list(self.postings):
+            postings = self.postings[term]
+            for passage_id in removed.intersection(postings):
+                del postings[passage_id]
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query: str, limit: int = RAG_TOP_K * 4) -> List[Tuple[float, Passage]]:
+        """(score, passage) for passages sharing a term with query, best first."""
+        count = len(self.passages)
+        if not count:
+            return []
+        average_length = self.total_length / count
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, frequency in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.passages[passage_id].length / average_length)
+                scores[passage_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, self.passages[passage_id]) for passage_id, score in best]
+
+
+# Per process, like analysis_cache; workers build their own indexes from the database
+case_indexes = TTLCache("case_indexes", maxsize=RAG_INDEX_CACHE_SIZE, ttl=RAG_INDEX_TTL)
+
+
+async def sync_case_index(db: AsyncSession, case_id: int) -> CaseIndex:
+    """The case's index, updated with the documents and notes changed since the last call."""
+    index = case_indexes.get(case_id)
+    if index is None:
+        index = CaseIndex()
+        case_indexes.set(case_id, index)
+
+    notes = (await db.execute(select(Case.client_notes).where(Case.id == case_id))).scalar_one_or_none() or ""
+    if index.versions.get(NOTES_SOURCE) != notes:
+        index.add(NOTES_SOURCE, [("notatki klienta", notes)], version=notes)
+
+    result = await db.execute(
+        select(Document.sha256, Document.name, Blob.extracted_at)
+        .join(Blob, Blob.sha256 == Document.sha256)
+        .where(Document.case_id == case_id, Blob.extraction_status == ExtractionStatus.COMPLETED)
+        .order_by(Document.id)
+    )
+    # A file uploaded twice to the case is indexed once, under its first name
+    names = {}
+    versions = {}
+    for sha256, name, extracted_at in result.all():
+        if sha256 not in names:
+            names[sha256] = name
+            # A new extraction or, after the first document was deleted, a new label replaces the passages
+            versions[sha256] = f"{extracted_at} {name}"
+    for source in list(index.sources):
+        if source != NOTES_SOURCE and source not in names:
+            # Its documents were deleted, or it is being extracted again
+            index.remove(source)
+    new = [sha256 for sha256 in names if index.versions.get(sha256) != versions[sha256]]
+    if new:
+        result = await db.execute(
+            select(BlobPage.sha256, BlobPage.page_number, BlobPage.text)
+            .where(BlobPage.sha256.in_(new))
+            .order_by(BlobPage.sha256, BlobPage.page_number)
+        )
+        pages: Dict[str, List[Tuple[str, str]]] = {sha256: [] for sha256 in new}
+        for sha256, page_number, text in result.all():
+            pages[sha256].append((f"{names[sha256]}, s. {page_number}", text))
+        # Tokenizing a large case takes a while; keep it off the event loop
+        prepared = await asyncio.to_thread(lambda: {sha256: prepare_passages(pages[sha256]) for sha256 in new})
+        for sha256 in new:
+            # Another request may have indexed it while this one was waiting
+            if index.versions.get(sha256) != versions[sha256]:
+                index.add_prepared(sha256, prepared[sha256], versions[sha256])
+    return index
+
+
+def select_passages(index: CaseIndex, question: str, token_budget: int = RAG_TOKEN_BUDGET,
+                    limit: int = RAG_TOP_K) -> List[Passage]:
+    """Highest scoring passages whose combined estimated size fits token_budget."""
+    selected = []
+    remaining = token_budget
+    for _, passage in index.search(question):
+        cost = estimate_tokens(passage.text)
+        if cost <= remaining:
+            selected.append(passage)
+            remaining -= cost
+            if len(selected) == limit:
+                break
+    return selected
+
+
+def format_passages(passages: List[Passage]) -> Optional[str]:
+    """Numbered passages with their source, for the prompt; None when there are none."""
+    if not passages:
+        return None
+    return "\n".join(f"[{number}] ({passage.label}) {passage.text}" for number, passage in enumerate(passages, 1))
+
+
+async def retrieve_passages(db: AsyncSession, case_id: int, question: str) -> List[Passage]:
+    """The case's passages most relevant to question, within RAG_TOKEN_BUDGET."""
+    if not RAG_ENABLED:
+        return []
+    passages = select_passages(await sync_case_index(db, case_id), question)
+    AI_PROMPT_CONTEXT_TOKENS.observe(sum(estimate_tokens(passage.text) for passage in passages))
+    return passages
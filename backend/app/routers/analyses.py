@@ -1,26 +1,72 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-import json
-import google.generativeai as genai
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+import asyncio
 import os
 
-from app.database import get_db
-from app.models import Analysis, Case, User, UserRole, DocumentOption
-from app.schemas import AnalysisCreate, Analysis as AnalysisSchema, DocumentOptionCreate
-from app.auth import get_current_active_user
+from app.database import get_db, get_read_db
+from app.models import Analysis, Case, UserRole
+from app.schemas import AnalysisCreate, Analysis as AnalysisSchema, AnalysisJob as AnalysisJobSchema, CachedAnalysisDraft
+from app import ai_cache
+from app.ai import get_backend, model_client
+from app.auth import Principal, get_current_active_user
+from app.cache import TTLCache
+from app.catalog import build_analysis
+from app.jobs import AnalysisJob, analysis_jobs
+from app.responses import event_stream_response, format_sse, is_not_modified, validator_headers, version_etag
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1000"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "60"))
 
 router = APIRouter()
 
-# Configure Gemini AI
-genai.configure(api_key=os.getenv("GOOGLE_GENERATIVE_AI_API_KEY"))
+@dataclass(frozen=True)
+class CachedAnalysis:
+    client_id: int
+    etag: str
+    last_modified: datetime
+    body: bytes
+
+# Serialized get_case_analysis responses by case id. Per-process; other workers
+# converge within ANALYSIS_CACHE_TTL
+analysis_cache = TTLCache("analysis_responses", maxsize=ANALYSIS_CACHE_SIZE, ttl=ANALYSIS_CACHE_TTL)
+
+def _invalidate_after_commit(target, case_id: int) -> None:
+    analysis_cache.invalidate(case_id)
+    # Invalidate again once committed, so a read between flush and commit cannot re-cache old data
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("analysis_cache_case_ids", set()).add(case_id)
+
+@event.listens_for(Analysis, "after_insert")
+@event.listens_for(Analysis, "after_update")
+@event.listens_for(Analysis, "after_delete")
+def _invalidate_analysis(mapper, connection, target):
+    _invalidate_after_commit(target, target.case_id)
+
+@event.listens_for(Case, "after_update")
+@event.listens_for(Case, "after_delete")
+def _invalidate_case_analysis(mapper, connection, target):
+    _invalidate_after_commit(target, target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for case_id in session.info.pop("analysis_cache_case_ids", ()):
+        analysis_cache.invalidate(case_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop("analysis_cache_case_ids", None)
 
 @router.post("/", response_model=AnalysisSchema)
 async def create_analysis(
     analysis: AnalysisCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     # Only operators and admins can create analyses
     if current_user.role == UserRole.CLIENT:
@@ -36,131 +82,187 @@ async def create_analysis(
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
     
-    # Create analysis
-    db_analysis = Analysis(
+    # Analysis and its catalog options are written in one transaction
+    db_analysis = await build_analysis(
+        db,
         case_id=analysis.case_id,
         content=analysis.content,
         summary=analysis.summary,
         recommendations=analysis.recommendations,
-        price=analysis.price
+        price=analysis.price,
+        option_categories=analysis.option_categories
     )
-    db.add(db_analysis)
     await db.commit()
-    await db.refresh(db_analysis)
+    return db_analysis
+
+async def _load_case_analysis(db: AsyncSession, case_id: int) -> CachedAnalysis:
+    # Case and its latest analysis in one round trip
+    result = await db.execute(
+        select(Case.client_id, Analysis)
+        .outerjoin(Analysis, Analysis.case_id == Case.id)
+        .where(Case.id == case_id)
+        .order_by(Analysis.created_at.desc(), Analysis.id.desc())
+        .limit(1)
+    )
+    row = result.one_or_none()
     
-    # Create default document options
-    default_options = [
-        {
-            "name": "Sprzeciw od nakazu zapłaty",
-            "description": "Profesjonalnie przygotowany sprzeciw z uzasadnieniem prawnym",
-            "price": 89.0,
-            "estimated_time": "24h",
-            "category": "Pisma procesowe"
-        },
-        {
-            "name": "Wniosek o rozłożenie na raty",
-            "description": "Wniosek o rozłożenie należności na raty płatne",
-            "price": 59.0,
-            "estimated_time": "12h",
-            "category": "Wnioski"
-        }
-    ]
+    if not row:
+        raise HTTPException(status_code=404, detail="Case not found")
     
-    for option_data in default_options:
-        db_option = DocumentOption(
-            analysis_id=db_analysis.id,
-            **option_data
-        )
-        db.add(db_option)
+    client_id, analysis = row
+    if analysis is None:
+        return CachedAnalysis(client_id=client_id, etag="", last_modified=datetime.min, body=b"")
     
-    await db.commit()
-    return db_analysis
+    last_modified = analysis.updated_at or analysis.created_at
+    return CachedAnalysis(
+        client_id=client_id,
+        etag=version_etag("analysis", analysis.id, last_modified),
+        last_modified=last_modified,
+        body=AnalysisSchema.model_validate(analysis).model_dump_json().encode()
+    )
 
 @router.get("/case/{case_id}", response_model=AnalysisSchema)
 async def get_case_analysis(
     case_id: int,
+    request: Request,
+    # The primary, not the replica: a lagging replica would refill the cache with data
+    # from before the last invalidation and serve it for ANALYSIS_CACHE_TTL
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    # Check case permissions
-    result = await db.execute(select(Case).where(Case.id == case_id))
-    case = result.scalar_one_or_none()
-    
-    if not case:
-        raise HTTPException(status_code=404, detail="Case not found")
+    cached = analysis_cache.get(case_id)
+    if cached is None:
+        cached = await _load_case_analysis(db, case_id)
+        analysis_cache.set(case_id, cached)
     
-    if current_user.role == UserRole.CLIENT and case.client_id != current_user.id:
+    # Check case permissions
+    if current_user.role == UserRole.CLIENT and cached.client_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this case")
     
-    # Get analysis
-    result = await db.execute(
-        select(Analysis).where(Analysis.case_id == case_id)
-    )
-    analysis = result.scalar_one_or_none()
-    
-    if not analysis:
+    if not cached.body:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    return analysis
+    headers = validator_headers(cached.etag, cached.last_modified)
+    if is_not_modified(request, cached.etag, cached.last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
 
-@router.post("/generate/{case_id}")
-async def generate_ai_analysis(
-    case_id: int,
-    question: str,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
+def _require_staff(current_user: Principal) -> None:
     # Only operators and admins can generate analyses
     if current_user.role == UserRole.CLIENT:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to generate analyses"
         )
+
+async def _submit_generation(db: AsyncSession, case_id: int, question: str, current_user: Principal,
+                             force_refresh: bool = False, draft_id: Optional[int] = None) -> AnalysisJob:
+    _require_staff(current_user)
     
+    result = await db.execute(select(Case).where(Case.id == case_id))
+    if not result.scalar_one_or_none():
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    # Fail fast rather than queue work the model cannot take right now
+    if model_client.breaker.is_open:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI model temporarily unavailable, try again later",
+            headers={"Retry-After": str(max(1, round(model_client.breaker.retry_after())))}
+        )
+    
+    # Model calls run on the job queue's worker pool, not on the event loop
     try:
-        model = genai.GenerativeModel('gemini-pro')
-        
-        prompt = f"""
-        Jesteś profesjonalnym prawnikiem specjalizującym się w prawie polskim.
-        Przeanalizuj następujące pytanie prawne i udziel szczegółowej odpowiedzi:
-        
-        Pytanie: {question}
-        
-        Proszę o:
-        1. Szczegółową analizę prawną
-        2. Podsumowanie w 2-3 zdaniach
-        3. Konkretne zalecenia działania
-        4. Wskazanie możliwych pism do sporządzenia
-        
-        Odpowiedź powinna być profesjonalna i zgodna z polskim prawem.
-        """
-        
-        response = model.generate_content(prompt)
-        
-        # Create analysis record
-        db_analysis = Analysis(
-            case_id=case_id,
-            content=response.text,
-            summary="Analiza wygenerowana przez AI - wymaga weryfikacji prawnika",
-            recommendations=json.dumps([
-                "Weryfikacja przez kwalifikowanego prawnika",
-                "Analiza dokumentów sprawy",
-                "Określenie strategii prawnej"
-            ]),
-            price=59.0
+        return analysis_jobs.submit(case_id, question, force_refresh=force_refresh, draft_id=draft_id)
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analysis queue is full, try again later"
         )
-        db.add(db_analysis)
-        await db.commit()
-        await db.refresh(db_analysis)
-        
-        return {
-            "message": "Analysis generated successfully",
-            "analysis_id": db_analysis.id,
-            "content": response.text[:500] + "..." if len(response.text) > 500 else response.text
-        }
-        
-    except Exception as e:
+
+async def _job_events(job: AnalysisJob, after: int = 0):
+    # The job runs independently of this response: a client disconnect stops
+    # the stream, not the generation, and the analysis is still saved
+    yield format_sse("job", {"job_id": job.id, "case_id": job.case_id})
+    async for event_id, name, data in job.subscribe(after):
+        yield format_sse(name, data, event_id)
+
+def _get_job(job_id: str, current_user: Principal) -> AnalysisJob:
+    if current_user.role == UserRole.CLIENT:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error generating analysis: {str(e)}"
-        )
\ No newline at end of file
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access analysis jobs"
+        )
+    
+    job = analysis_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
+@router.get("/similar", response_model=List[CachedAnalysisDraft])
+async def get_similar_analyses(
+    question: str = Query(..., min_length=2, max_length=2000),
+    case_id: Optional[int] = Query(None, description="case the draft is for; its own earlier answers are included"),
+    limit: int = Query(5, ge=1, le=20),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # Cached answers to near-duplicate questions; pass one as draft_id to skip generation.
+    # Answers built from another case's documents are never offered
+    _require_staff(current_user)
+    return await ai_cache.find_similar(db, question, get_backend().model_name, case_id=case_id, limit=limit)
+
+@router.post("/generate/{case_id}", response_model=AnalysisJobSchema, status_code=status.HTTP_202_ACCEPTED)
+async def generate_ai_analysis(
+    case_id: int,
+    question: str,
+    force_refresh: bool = False,
+    draft_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # Identical questions are answered from the AI response cache unless force_refresh is set
+    return await _submit_generation(db, case_id, question, current_user, force_refresh, draft_id)
+
+@router.post("/generate/{case_id}/stream")
+async def stream_ai_analysis(
+    case_id: int,
+    question: str,
+    request: Request,
+    force_refresh: bool = False,
+    draft_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """Generate an analysis and stream the model output as Server-Sent Events.
+
+    Emits `job`, then `chunk` events with text as it is generated, then
+    `done` (with analysis_id) or `error`.
+    """
+    job = await _submit_generation(db, case_id, question, current_user, force_refresh, draft_id)
+    # Release the pooled connection; the stream may stay open for a long time
+    await db.close()
+    # Where the job can be followed again; Idempotency-Key retries are replayed from there
+    location = request.url_for("stream_analysis_job", job_id=job.id).path
+    return event_stream_response(_job_events(job), headers={"content-location": location})
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobSchema)
+async def get_analysis_job(
+    job_id: str,
+    current_user: Principal = Depends(get_current_active_user)
+):
+    return _get_job(job_id, current_user)
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_analysis_job(
+    job_id: str,
+    last_event_id: Optional[int] = Header(None),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """Follow a generation job as Server-Sent Events, replaying earlier output.
+
+    EventSource reconnects send Last-Event-ID and resume after that event.
+    """
+    job = _get_job(job_id, current_user)
+    return event_stream_response(_job_events(job, after=last_event_id or 0))
@@ -1,13 +1,18 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from typing import Any, List, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
-from app.database import get_db
-from app.models import Case, User, UserRole
-from app.schemas import CaseCreate, Case as CaseSchema
-from app.auth import get_current_active_user
+from app.database import get_db, get_read_db
+from app.models import Case, CaseStatus, UserRole
+from app.schemas import BatchItemResult, BatchResult, CaseCreate, Case as CaseSchema, Page
+from app.auth import Principal, get_current_active_user
+from app.pagination import PageParams, paginate
+from app.responses import is_not_modified, validator_headers, version_etag
+
+MAX_BATCH_CASES = int(os.getenv("MAX_BATCH_CASES", "100"))
 
 router = APIRouter()
 
@@ -15,7 +20,7 @@ router = APIRouter()
 async def create_case(
     case: CaseCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     db_case = Case(
         name=case.name,
@@ -27,34 +32,72 @@ async def create_case(
     await db.refresh(db_case)
     return db_case
 
-@router.get("/", response_model=List[CaseSchema])
-async def get_cases(
+@router.post("/batch", response_model=BatchResult)
+async def create_cases(
+    cases: List[Any] = Body(..., description="CaseCreate objects; each is validated separately"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
+    if len(cases) > MAX_BATCH_CASES:
+        raise HTTPException(status_code=400, detail=f"Too many cases in one batch (max {MAX_BATCH_CASES})")
+    
+    # Invalid items are reported individually instead of rejecting the whole batch
+    items = []
+    db_cases = []
+    for index, data in enumerate(cases):
+        try:
+            case = CaseCreate.model_validate(data)
+        except ValidationError as e:
+            errors = [
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" if err["loc"] else err["msg"]
+                for err in e.errors()
+            ]
+            items.append(BatchItemResult(index=index, ok=False, error="; ".join(errors)))
+            continue
+        db_cases.append((index, Case(
+            name=case.name,
+            client_id=current_user.id,
+            client_notes=case.client_notes
+        )))
+    
+    db.add_all(db_case for _, db_case in db_cases)
+    await db.commit()
+    
+    for index, db_case in db_cases:
+        items.append(BatchItemResult(index=index, ok=True, id=db_case.id, name=db_case.name))
+    items.sort(key=lambda item: item.index)
+    
+    return BatchResult(created=len(db_cases), failed=len(cases) - len(db_cases), items=items)
+
+@router.get("/", response_model=Page[CaseSchema])
+async def get_cases(
+    case_status: Optional[CaseStatus] = Query(None, alias="status"),
+    client_id: Optional[int] = Query(None),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    stmt = select(Case)
     if current_user.role == UserRole.CLIENT:
         # Clients can only see their own cases
-        result = await db.execute(
-            select(Case).where(Case.client_id == current_user.id)
-        )
-    else:
+        stmt = stmt.where(Case.client_id == current_user.id)
+    elif client_id is not None:
         # Operators and admins can see all cases
-        result = await db.execute(select(Case))
+        stmt = stmt.where(Case.client_id == client_id)
+    if case_status is not None:
+        stmt = stmt.where(Case.status == case_status)
     
-    cases = result.scalars().all()
-    return cases
+    return await paginate(db, stmt, Case.created_at, Case.id, page)
 
 @router.get("/{case_id}", response_model=CaseSchema)
 async def get_case(
     case_id: int,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    result = await db.execute(
-        select(Case)
-        .options(selectinload(Case.documents), selectinload(Case.analysis))
-        .where(Case.id == case_id)
-    )
+    # The response has no relationships, so none are loaded
+    result = await db.execute(select(Case).where(Case.id == case_id))
     case = result.scalar_one_or_none()
     
     if not case:
@@ -64,4 +107,14 @@ async def get_case(
     if current_user.role == UserRole.CLIENT and case.client_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this case")
     
-    return case
\ No newline at end of file
+    last_modified = case.updated_at or case.created_at
+    etag = version_etag("case", case.id, last_modified)
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(
+        content=CaseSchema.model_validate(case).model_dump_json(),
+        media_type="application/json",
+        headers=headers
+    )
\ No newline at end of file
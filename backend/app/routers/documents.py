@@ -1,27 +1,39 @@
+import logging
+import os
+from pathlib import Path
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-import aiofiles
-import os
-from pathlib import Path
+from sqlalchemy.orm import selectinload
+
+from app.database import get_db, get_read_db
+from app.models import Blob, Document, Case, UserRole, DocumentType
+from app.schemas import BatchItemResult, BatchResult, Document as DocumentSchema, DocumentText, Page
+from app.auth import Principal, get_current_active_user
+from app.storage import add_blob_ref, add_blob_refs, ensure_dirs, save_upload
+from app.extraction import extract_blob
+from app.responses import file_response
+from app.pagination import PageParams, paginate
+
+logger = logging.getLogger(__name__)
 
-from app.database import get_db
-from app.models import Document, Case, User, UserRole, DocumentType
-from app.schemas import DocumentCreate, Document as DocumentSchema
-from app.auth import get_current_active_user
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "50"))
 
 router = APIRouter()
 
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+ensure_dirs()
+
+def _document_type(file: UploadFile) -> DocumentType:
+    return DocumentType.PDF if file.content_type == "application/pdf" else DocumentType.IMAGE
 
 @router.post("/upload/{case_id}")
 async def upload_document(
     case_id: int,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     # Check if case exists and user has permission
     result = await db.execute(select(Case).where(Case.id == case_id))
@@ -34,13 +46,11 @@ async def upload_document(
         raise HTTPException(status_code=403, detail="Not authorized to upload to this case")
     
     # Determine document type
-    doc_type = DocumentType.PDF if file.content_type == "application/pdf" else DocumentType.IMAGE
+    doc_type = _document_type(file)
     
-    # Save file
-    file_path = UPLOAD_DIR / f"{case_id}_{file.filename}"
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Save file into the content-addressed store; identical bytes are kept once
+    size, sha256, file_path = await save_upload(file)
+    await add_blob_ref(db, sha256, size)
     
     # Create document record
     db_document = Document(
@@ -48,19 +58,86 @@ async def upload_document(
         name=file.filename,
         type=doc_type,
         url=str(file_path),
-        size=len(content)
+        size=size,
+        sha256=sha256
     )
     db.add(db_document)
+    # No refresh: the id is already loaded, and a new transaction would keep the
+    # connection checked out until the background extraction below has finished
     await db.commit()
-    await db.refresh(db_document)
+
+    # Extract text after the response is sent; already processed content is skipped
+    background_tasks.add_task(extract_blob, sha256)
     
     return {"message": "Document uploaded successfully", "document_id": db_document.id}
 
-@router.get("/case/{case_id}", response_model=List[DocumentSchema])
-async def get_case_documents(
+@router.post("/upload/{case_id}/batch", response_model=BatchResult)
+async def upload_documents(
     case_id: int,
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
+):
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files in one batch (max {MAX_BATCH_FILES})")
+    
+    # Check if case exists and user has permission, once for the whole batch
+    result = await db.execute(select(Case.client_id).where(Case.id == case_id))
+    client_id = result.scalar_one_or_none()
+    
+    if client_id is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    if current_user.role == UserRole.CLIENT and client_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to upload to this case")
+    
+    # Store every file; one that fails (e.g. too large) is reported without failing the rest
+    items = []
+    documents = []
+    refs = {}
+    for index, file in enumerate(files):
+        try:
+            size, sha256, file_path = await save_upload(file)
+        except HTTPException as e:
+            items.append(BatchItemResult(index=index, ok=False, name=file.filename, error=e.detail))
+            continue
+        except Exception:
+            # e.g. a full disk or an unreadable part; the files already stored are still saved
+            logger.exception("Could not store batch upload %r for case %s", file.filename, case_id)
+            items.append(BatchItemResult(index=index, ok=False, name=file.filename, error="Could not store file"))
+            continue
+        _, count = refs.get(sha256, (size, 0))
+        refs[sha256] = (size, count + 1)
+        documents.append((index, Document(
+            case_id=case_id,
+            name=file.filename,
+            type=_document_type(file),
+            url=str(file_path),
+            size=size,
+            sha256=sha256
+        )))
+    
+    # One transaction: a single blob upsert and a bulk document insert
+    await add_blob_refs(db, refs)
+    db.add_all(document for _, document in documents)
+    await db.commit()
+    
+    for index, document in documents:
+        items.append(BatchItemResult(index=index, ok=True, id=document.id, name=document.name))
+    items.sort(key=lambda item: item.index)
+    
+    for sha256 in refs:
+        background_tasks.add_task(extract_blob, sha256)
+    
+    return BatchResult(created=len(documents), failed=len(files) - len(documents), items=items)
+
+@router.get("/case/{case_id}", response_model=Page[DocumentSchema])
+async def get_case_documents(
+    case_id: int,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     # Check case permissions
     result = await db.execute(select(Case).where(Case.id == case_id))
@@ -73,8 +150,68 @@ async def get_case_documents(
         raise HTTPException(status_code=403, detail="Not authorized to access this case")
     
     # Get documents
+    stmt = select(Document).where(Document.case_id == case_id)
+    return await paginate(db, stmt, Document.uploaded_at, Document.id, page)
+
+async def _get_readable_document(db: AsyncSession, document_id: int, current_user: Principal) -> Document:
     result = await db.execute(
-        select(Document).where(Document.case_id == case_id)
+        select(Document, Case.client_id)
+        .join(Case, Document.case_id == Case.id)
+        .where(Document.id == document_id)
+    )
+    row = result.one_or_none()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    document, client_id = row
+    
+    # Check case permissions
+    if current_user.role == UserRole.CLIENT and client_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this case")
+    
+    return document
+
+@router.get("/{document_id}/content")
+async def get_document_content(
+    document_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    document = await _get_readable_document(db, document_id, current_user)
+    
+    media_type = "application/pdf" if document.type == DocumentType.PDF else None
+    return await file_response(
+        request,
+        Path(document.url),
+        filename=document.name,
+        media_type=media_type,
+        etag=document.sha256
+    )
+
+@router.get("/{document_id}/text", response_model=DocumentText)
+async def get_document_text(
+    document_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    document = await _get_readable_document(db, document_id, current_user)
+    
+    blob = None
+    if document.sha256:
+        result = await db.execute(
+            select(Blob).options(selectinload(Blob.pages)).where(Blob.sha256 == document.sha256)
+        )
+        blob = result.scalar_one_or_none()
+    
+    if not blob:
+        raise HTTPException(status_code=404, detail="Document content not found")
+    
+    return DocumentText(
+        document_id=document.id,
+        status=blob.extraction_status,
+        error=blob.extraction_error,
+        page_count=blob.page_count,
+        pages=blob.pages
     )
-    documents = result.scalars().all()
-    return documents
\ No newline at end of file
@@ -0,0 +1,57 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.database import get_db
+from app.models import Case, UserRole
+from app.auth import Principal, get_stream_user
+from app.events import HEARTBEAT, RESET, case_events
+from app.responses import event_stream_response, format_sse
+
+router = APIRouter()
+
+# Reconnect delay suggested to EventSource clients, in milliseconds
+RECONNECT_MS = 3000
+
+async def _case_event_messages(principal: Principal, last_event_id: Optional[str], case_id: Optional[int]):
+    # A comment first, so the client sees the stream open before the first event
+    yield f"retry: {RECONNECT_MS}\n: connected\n\n"
+    async for item in case_events.subscribe(principal, last_event_id, case_id):
+        if item is HEARTBEAT:
+            # Keeps proxies from closing an idle connection and detects dead clients
+            yield ": heartbeat\n\n"
+        elif item is RESET:
+            yield format_sse("reset", {"detail": "Events were missed, refetch current state"})
+        else:
+            yield format_sse(item.type, {
+                "case_id": item.case_id,
+                "created_at": item.created_at,
+                **item.data
+            }, item.id)
+
+@router.get("/stream")
+async def stream_case_events(
+    case_id: Optional[int] = Query(None, description="only events of this case"),
+    last_event_id: Optional[str] = Header(None, description="id of the last event received, to resume"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_stream_user)
+):
+    """Push case status changes and new documents and analyses as Server-Sent Events.
+
+    Clients receive events of their own cases; operators and admins of all
+    cases. Event types: `case.created`, `case.updated`, `document.created`,
+    `analysis.created`, `analysis.updated`, and `reset` when events were
+    missed and current state should be refetched.
+    """
+    if case_id is not None:
+        result = await db.execute(select(Case.client_id).where(Case.id == case_id))
+        client_id = result.scalar_one_or_none()
+        if client_id is None:
+            raise HTTPException(status_code=404, detail="Case not found")
+        if current_user.role == UserRole.CLIENT and client_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to access this case")
+    
+    # Release the pooled connection; the stream stays open indefinitely
+    await db.close()
+    return event_stream_response(_case_event_messages(current_user, last_event_id, case_id))
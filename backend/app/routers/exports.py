@@ -0,0 +1,127 @@
+import csv
+import enum
+import io
+import os
+from datetime import datetime
+from typing import Literal, Optional, Sequence
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, select
+
+from app.database import read_session
+from app.models import Analysis, Case, CaseStatus, UserRole
+from app.auth import Principal, get_current_active_user
+
+router = APIRouter()
+
+# Rows fetched from the server-side cursor, and encoded, per chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+ExportFormat = Literal["ndjson", "csv"]
+
+# Starlette adds "; charset=utf-8" to text/* types itself
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+CASE_COLUMNS = (
+    Case.id, Case.name, Case.client_id, Case.status, Case.client_notes, Case.operator_notes,
+    Case.created_at, Case.updated_at,
+)
+ANALYSIS_COLUMNS = (
+    Analysis.id, Analysis.case_id, Case.client_id, Analysis.summary, Analysis.recommendations,
+    Analysis.price, Analysis.status, Analysis.created_at, Analysis.updated_at,
+)
+
+def _encode_ndjson(names: Sequence[str], rows) -> bytes:
+    # orjson handles datetimes and enums natively and returns bytes
+    return b"".join(orjson.dumps(dict(zip(names, row)), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+def _csv_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        # Keep spreadsheets from evaluating user-entered text as a formula
+        return "'" + value
+    return value
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+async def _export_chunks(stmt: Select, fmt: ExportFormat):
+    names = [column.name for column in stmt.selected_columns]
+    if fmt == "csv":
+        yield _encode_csv([names])
+    # The session is opened here, not as a dependency, so it lives exactly as long as the stream
+    async with read_session() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield _encode_ndjson(names, rows) if fmt == "ndjson" else _encode_csv(rows)
+
+def _export_response(stmt: Select, fmt: ExportFormat, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        _export_chunks(stmt, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{fmt}"',
+            "Cache-Control": "no-store",
+        }
+    )
+
+def _filter_cases(stmt: Select, current_user: Principal, case_status: Optional[CaseStatus],
+                  client_id: Optional[int], created_from: Optional[datetime],
+                  created_to: Optional[datetime], created_at) -> Select:
+    if current_user.role == UserRole.CLIENT:
+        # Clients can only export their own cases
+        if client_id is not None and client_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to export other clients' cases"
+            )
+        client_id = current_user.id
+    if client_id is not None:
+        stmt = stmt.where(Case.client_id == client_id)
+    if case_status is not None:
+        stmt = stmt.where(Case.status == case_status)
+    if created_from is not None:
+        stmt = stmt.where(created_at >= created_from)
+    if created_to is not None:
+        stmt = stmt.where(created_at < created_to)
+    return stmt
+
+@router.get("/cases")
+async def export_cases(
+    format: ExportFormat = Query("ndjson"),
+    case_status: Optional[CaseStatus] = Query(None, alias="status"),
+    client_id: Optional[int] = Query(None),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """Stream cases as NDJSON or CSV, one row per case in id order."""
+    stmt = _filter_cases(
+        select(*CASE_COLUMNS), current_user, case_status, client_id, created_from, created_to, Case.created_at
+    )
+    return _export_response(stmt.order_by(Case.id), format, "cases")
+
+@router.get("/analyses")
+async def export_analyses(
+    format: ExportFormat = Query("ndjson"),
+    case_status: Optional[CaseStatus] = Query(None, alias="status"),
+    client_id: Optional[int] = Query(None),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    include_content: bool = Query(False, description="include the full analysis text"),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """Stream analyses as NDJSON or CSV, one row per analysis in id order."""
+    columns = ANALYSIS_COLUMNS + ((Analysis.content,) if include_content else ())
+    stmt = _filter_cases(
+        select(*columns).join(Case, Case.id == Analysis.case_id),
+        current_user, case_status, client_id, created_from, created_to, Analysis.created_at
+    )
+    return _export_response(stmt.order_by(Analysis.id), format, "analyses")
@@ -0,0 +1,77 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.database import get_db, get_read_db
+from app.models import DocumentOptionTemplate, UserRole
+from app.schemas import (
+    DocumentOptionTemplate as DocumentOptionTemplateSchema,
+    DocumentOptionTemplateCreate,
+    DocumentOptionTemplateUpdate,
+)
+from app.auth import Principal, get_current_active_user
+from app.catalog import option_template_cache
+
+router = APIRouter()
+
+def _require_admin(current_user: Principal) -> None:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to manage document option templates"
+        )
+
+@router.get("/", response_model=List[DocumentOptionTemplateSchema])
+async def get_option_templates(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # Only operators and admins can see the catalog, including inactive entries
+    if current_user.role == UserRole.CLIENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view document option templates"
+        )
+
+    result = await db.execute(
+        select(DocumentOptionTemplate)
+        .order_by(DocumentOptionTemplate.sort_order, DocumentOptionTemplate.id)
+    )
+    return result.scalars().all()
+
+@router.post("/", response_model=DocumentOptionTemplateSchema)
+async def create_option_template(
+    template: DocumentOptionTemplateCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    _require_admin(current_user)
+
+    db_template = DocumentOptionTemplate(**template.model_dump())
+    db.add(db_template)
+    await db.commit()
+    await db.refresh(db_template)
+    # Mapper events already cleared it at flush; clear again now the change is visible
+    option_template_cache.clear()
+    return db_template
+
+@router.patch("/{template_id}", response_model=DocumentOptionTemplateSchema)
+async def update_option_template(
+    template_id: int,
+    template: DocumentOptionTemplateUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    _require_admin(current_user)
+
+    db_template = await db.get(DocumentOptionTemplate, template_id)
+    if not db_template:
+        raise HTTPException(status_code=404, detail="Document option template not found")
+
+    for field, value in template.model_dump(exclude_unset=True).items():
+        setattr(db_template, field, value)
+    await db.commit()
+    await db.refresh(db_template)
+    option_template_cache.clear()
+    return db_template
@@ -0,0 +1,31 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_read_db
+from app.schemas import Page, SearchHit
+from app.auth import Principal, get_current_active_user
+from app.search import search
+
+router = APIRouter()
+
+@router.get("/", response_model=Page[SearchHit])
+async def search_cases_and_analyses(
+    q: str = Query(..., min_length=2, max_length=200),
+    kind: Optional[Literal["analysis", "case"]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # Ranked results are paged by offset; the cursor is the offset of the next page
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    hits = await search(db, current_user, q, kind, limit + 1, offset)
+    next_cursor = str(offset + limit) if len(hits) > limit else None
+    return {"items": hits[:limit], "next_cursor": next_cursor}
@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+
+from app.database import get_read_db
+from app.models import CaseStatus, CaseStatusCount, DailyStats, UserRole
+from app.schemas import DailyStats as DailyStatsSchema, Stats, StatsTotals
+from app.auth import Principal, get_current_active_user
+from app.stats import DAILY_COLUMNS, utc_today
+
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+
+router = APIRouter()
+
+@router.get("/", response_model=Stats)
+async def get_stats(
+    date_from: Optional[date] = Query(None, description="first UTC day, default 29 days before date_to"),
+    date_to: Optional[date] = Query(None, description="last UTC day, inclusive, default today"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """Case counts per status and per-day activity and revenue, from the summary tables."""
+    # Only operators and admins can see firm-wide figures
+    if current_user.role == UserRole.CLIENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view statistics"
+        )
+
+    date_to = date_to or utc_today()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_STATS_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    if (date_to - date_from).days >= MAX_STATS_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range too long (max {MAX_STATS_DAYS} days)")
+
+    result = await db.execute(
+        select(CaseStatusCount.status, func.sum(CaseStatusCount.count)).group_by(CaseStatusCount.status)
+    )
+    counts = dict(result.all())
+    cases_by_status = {case_status: counts.get(case_status.name, 0) for case_status in CaseStatus}
+
+    # Rows are sharded; a day's figures are the sum over its shards
+    result = await db.execute(
+        select(DailyStats.day, *(func.sum(DailyStats.__table__.c[column]).label(column) for column in DAILY_COLUMNS))
+        .where(DailyStats.day >= date_from, DailyStats.day <= date_to)
+        .group_by(DailyStats.day)
+    )
+    stored = {row.day: row for row in result}
+    # Days without activity have no row; report them as zeros
+    days = [
+        DailyStatsSchema.model_validate(stored[day]) if day in stored else DailyStatsSchema(day=day)
+        for day in (date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1))
+    ]
+    totals = {column: sum(getattr(day, column) for day in days) for column in DAILY_COLUMNS}
+
+    return Stats(
+        cases_by_status=cases_by_status,
+        open_cases=sum(count for case_status, count in cases_by_status.items() if case_status != CaseStatus.COMPLETED),
+        date_from=date_from,
+        date_to=date_to,
+        totals=StatsTotals(**totals, revenue=totals["analysis_revenue"] + totals["option_revenue"]),
+        days=days
+    )
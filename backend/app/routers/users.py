@@ -1,23 +1,32 @@
-from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.database import get_db
+from app.database import get_read_db
 from app.models import User, UserRole
-from app.schemas import User as UserSchema
-from app.auth import get_current_active_user
+from app.schemas import User as UserSchema, Page
+from app.auth import Principal, get_current_active_user
+from app.cache import cache_stats
+from app.pagination import PageParams, paginate
 
 router = APIRouter()
 
 @router.get("/me", response_model=UserSchema)
-async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
-    return current_user
+async def get_current_user_info(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    # The cached principal only carries auth fields; load the full profile
+    user = await db.get(User, current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
-@router.get("/", response_model=List[UserSchema])
+@router.get("/", response_model=Page[UserSchema])
 async def get_users(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     # Only admins can list all users
     if current_user.role != UserRole.ADMIN:
@@ -26,6 +35,15 @@ async def get_users(
             detail="Not authorized to list users"
         )
     
-    result = await db.execute(select(User))
-    users = result.scalars().all()
-    return users
\ No newline at end of file
+    return await paginate(db, select(User), User.created_at, User.id, page)
+
+@router.get("/cache-stats")
+async def get_cache_stats(current_user: Principal = Depends(get_current_active_user)):
+    # Only admins can inspect server caches
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view cache statistics"
+        )
+    
+    return cache_stats()
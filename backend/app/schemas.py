@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
-from app.models import UserRole, CaseStatus, DocumentType
+from pydantic import BaseModel, EmailStr, model_validator
+from typing import Dict, Generic, Optional, List, TypeVar
+from datetime import date, datetime
+from app.models import UserRole, CaseStatus, DocumentType, ExtractionStatus
 
 # User schemas
 class UserBase(BaseModel):
@@ -59,11 +59,26 @@ class Document(DocumentBase):
     id: int
     case_id: int
     url: str
+    sha256: Optional[str] = None
     uploaded_at: datetime
 
     class Config:
         from_attributes = True
 
+class DocumentPage(BaseModel):
+    page_number: int
+    text: str
+
+    class Config:
+        from_attributes = True
+
+class DocumentText(BaseModel):
+    document_id: int
+    status: ExtractionStatus
+    error: Optional[str] = None
+    page_count: Optional[int] = None
+    pages: List[DocumentPage] = []
+
 # Analysis schemas
 class AnalysisBase(BaseModel):
     content: str
@@ -73,6 +88,8 @@ class AnalysisBase(BaseModel):
 
 class AnalysisCreate(AnalysisBase):
     case_id: int
+    # Attach only catalog options in these categories; all active options when omitted
+    option_categories: Optional[List[str]] = None
 
 class Analysis(AnalysisBase):
     id: int
@@ -83,6 +100,32 @@ class Analysis(AnalysisBase):
     class Config:
         from_attributes = True
 
+class AnalysisJob(BaseModel):
+    id: str
+    case_id: int
+    status: str
+    progress: int
+    analysis_id: Optional[int] = None
+    content: Optional[str] = None
+    error: Optional[str] = None
+    cache_status: Optional[str] = None
+    context_passages: int = 0
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class CachedAnalysisDraft(BaseModel):
+    id: int
+    question: str
+    similarity: float
+    response: str
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Document Option schemas
 class DocumentOptionBase(BaseModel):
     name: str
@@ -101,6 +144,99 @@ class DocumentOption(DocumentOptionBase):
     class Config:
         from_attributes = True
 
+# Document Option Template schemas
+class DocumentOptionTemplateBase(BaseModel):
+    name: str
+    description: str
+    price: float
+    estimated_time: str
+    category: str
+    sort_order: int = 0
+    is_active: bool = True
+
+class DocumentOptionTemplateCreate(DocumentOptionTemplateBase):
+    pass
+
+class DocumentOptionTemplateUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    estimated_time: Optional[str] = None
+    category: Optional[str] = None
+    sort_order: Optional[int] = None
+    is_active: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def _reject_nulls(self):
+        # Fields are optional to allow partial updates, but every column is NOT NULL
+        nulls = sorted(field for field in self.model_fields_set if getattr(self, field) is None)
+        if nulls:
+            raise ValueError(f"{', '.join(nulls)} cannot be null")
+        return self
+
+class DocumentOptionTemplate(DocumentOptionTemplateBase):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+# Pagination schemas
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+# Batch schemas
+class BatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    id: Optional[int] = None
+    name: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    created: int
+    failed: int
+    items: List[BatchItemResult]
+
+# Search schemas
+class SearchHit(BaseModel):
+    kind: str
+    id: int
+    case_id: int
+    rank: float
+    headline: str
+
+# Stats schemas
+class DailyStats(BaseModel):
+    day: date
+    cases_created: int = 0
+    analyses_created: int = 0
+    documents_uploaded: int = 0
+    analysis_revenue: float = 0
+    option_revenue: float = 0
+
+    class Config:
+        from_attributes = True
+
+class StatsTotals(BaseModel):
+    cases_created: int
+    analyses_created: int
+    documents_uploaded: int
+    analysis_revenue: float
+    option_revenue: float
+    revenue: float
+
+class Stats(BaseModel):
+    cases_by_status: Dict[CaseStatus, int]
+    open_cases: int
+    date_from: date
+    date_to: date
+    totals: StatsTotals
+    days: List[DailyStats]
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,166 @@
+import os
+import re
+from typing import Optional
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Base
+from app.models import UserRole
+
+# Text search configuration created by the full_text_search migration, or by init_db
+SEARCH_CONFIG = "legal_pl"
+# legal_pl is a copy of `simple` unless the Polish ispell files are installed and this is set
+SEARCH_POLISH_ISPELL = os.getenv("SEARCH_POLISH_ISPELL", "false").lower() in ("1", "true", "yes")
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+
+# SQLite fallback: an FTS5 index kept in sync by triggers, created alongside the
+# tables by init_db and by the e4f0a6c8d935 migration. PostgreSQL uses the generated tsvector columns below.
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "body, kind UNINDEXED, ref_id UNINDEXED, case_id UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2')",
+]
+_SQLITE_SOURCES = {
+    "analyses": ("analysis", "coalesce(new.summary, '') || ' ' || coalesce(new.content, '')", "new.case_id"),
+    "cases": (
+        "case",
+        "coalesce(new.name, '') || ' ' || coalesce(new.client_notes, '') || ' ' || coalesce(new.operator_notes, '')",
+        "new.id",
+    ),
+}
+for _table, (_kind, _body, _case_id) in _SQLITE_SOURCES.items():
+    _insert = (
+        f"INSERT INTO search_index (body, kind, ref_id, case_id) "
+        f"VALUES ({_body}, '{_kind}', new.id, {_case_id});"
+    )
+    _delete = f"DELETE FROM search_index WHERE kind = '{_kind}' AND ref_id = old.id;"
+    _SQLITE_DDL += [
+        f"CREATE TRIGGER IF NOT EXISTS {_table}_search_ai AFTER INSERT ON {_table} BEGIN {_insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {_table}_search_au AFTER UPDATE ON {_table} BEGIN {_delete} {_insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {_table}_search_ad AFTER DELETE ON {_table} BEGIN {_delete} END",
+    ]
+for _statement in _SQLITE_DDL:
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+# Not part of the metadata, so drop_all would leave stale rows behind; the triggers go with their tables
+event.listen(Base.metadata, "before_drop", DDL("DROP TABLE IF EXISTS search_index").execute_if(dialect="sqlite"))
+
+# PostgreSQL: the same configuration, generated tsvector columns and GIN indexes as the
+# b7e1c9d2f334 migration, for databases created by init_db (tests, benchmarks)
+_POSTGRES_CONFIG = [f"CREATE TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} (COPY = simple);"]
+if SEARCH_POLISH_ISPELL:
+    _POSTGRES_CONFIG += [
+        "CREATE TEXT SEARCH DICTIONARY polish_ispell "
+        "(TEMPLATE = ispell, DictFile = polish, AffFile = polish, StopWords = polish);",
+        f"ALTER TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} "
+        "ALTER MAPPING FOR asciiword, asciihword, hword_asciipart, word, hword, hword_part "
+        "WITH polish_ispell, simple;",
+    ]
+_POSTGRES_VECTORS = {
+    "analyses": (("summary", "A"), ("content", "B")),
+    "cases": (("name", "A"), ("client_notes", "B"), ("operator_notes", "B")),
+}
+# The configuration outlives drop_all, so it is only created once per database
+_POSTGRES_DDL = [
+    f"DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{SEARCH_CONFIG}') THEN "
+    + " ".join(_POSTGRES_CONFIG) + " END IF; END $$",
+]
+for _table, _columns in _POSTGRES_VECTORS.items():
+    _vector = " || ".join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({column}, '')), '{weight}')" for column, weight in _columns
+    )
+    _POSTGRES_DDL += [
+        f"ALTER TABLE {_table} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({_vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{_table}_search_vector ON {_table} USING gin (search_vector)",
+    ]
+for _statement in _POSTGRES_DDL:
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+_POSTGRES_HITS = {
+    "analysis": (
+        "SELECT 'analysis' AS kind, a.id, a.case_id, ts_rank_cd(a.search_vector, q.query) AS rank "
+        "FROM analyses a JOIN cases c ON c.id = a.case_id, q "
+        "WHERE a.search_vector @@ q.query {client_filter}"
+    ),
+    "case": (
+        "SELECT 'case' AS kind, c.id, c.id AS case_id, ts_rank_cd(c.search_vector, q.query) AS rank "
+        "FROM cases c, q "
+        "WHERE c.search_vector @@ q.query {client_filter}"
+    ),
+}
+
+_POSTGRES_SEARCH = """
+WITH q AS (SELECT to_tsquery(CAST(:config AS regconfig), :query) AS query),
+hits AS (
+    {hits}
+    ORDER BY rank DESC, kind, id
+    LIMIT :limit OFFSET :offset
+)
+SELECT h.kind, h.id, h.case_id, h.rank,
+       ts_headline(
+           CAST(:config AS regconfig),
+           CASE WHEN h.kind = 'analysis' THEN concat_ws(' ', a.summary, a.content)
+                ELSE concat_ws(' ', c.name, c.client_notes, c.operator_notes) END,
+           q.query,
+           :headline_options
+       ) AS headline
+FROM hits h
+CROSS JOIN q
+LEFT JOIN analyses a ON h.kind = 'analysis' AND a.id = h.id
+LEFT JOIN cases c ON h.kind = 'case' AND c.id = h.id
+ORDER BY h.rank DESC, h.kind, h.id
+"""
+
+_SQLITE_SEARCH = """
+SELECT search_index.kind, search_index.ref_id AS id, search_index.case_id,
+       -bm25(search_index) AS rank,
+       snippet(search_index, 0, '<mark>', '</mark>', '…', 24) AS headline
+FROM search_index JOIN cases c ON c.id = search_index.case_id
+WHERE search_index MATCH :query {kind_filter} {client_filter}
+ORDER BY rank DESC, search_index.kind, search_index.ref_id
+LIMIT :limit OFFSET :offset
+"""
+
+
+# Only word characters reach the query syntax, so user input cannot inject operators.
+# Every term is prefix-matched, a light substitute for stemming ("nakaz" finds "nakazu").
+def _terms(query: str) -> list:
+    return re.findall(r"\w+", query)
+
+
+def _fts5_query(query: str) -> str:
+    return " ".join(f'"{term}"*' for term in _terms(query))
+
+
+def _tsquery(query: str) -> str:
+    return " & ".join(f"{term}:*" for term in _terms(query))
+
+
+async def search(db: AsyncSession, current_user, query: str, kind: Optional[str],
+                 limit: int, offset: int) -> list:
+    """Ranked, highlighted hits over analyses and case notes visible to current_user."""
+    params = {"query": query, "limit": limit, "offset": offset}
+    client_filter = ""
+    if current_user.role == UserRole.CLIENT:
+        # Clients can only search their own cases
+        client_filter = "AND c.client_id = :client_id"
+        params["client_id"] = current_user.id
+
+    if not _terms(query):
+        return []
+
+    if db.get_bind().dialect.name == "sqlite":
+        params["query"] = _fts5_query(query)
+        kind_filter = ""
+        if kind:
+            kind_filter = "AND search_index.kind = :kind"
+            params["kind"] = kind
+        sql = _SQLITE_SEARCH.format(kind_filter=kind_filter, client_filter=client_filter)
+    else:
+        kinds = [kind] if kind else list(_POSTGRES_HITS)
+        hits = " UNION ALL ".join(_POSTGRES_HITS[k].format(client_filter=client_filter) for k in kinds)
+        sql = _POSTGRES_SEARCH.format(hits=hits)
+        params.update(query=_tsquery(query), config=SEARCH_CONFIG, headline_options=HEADLINE_OPTIONS)
+
+    result = await db.execute(text(sql), params)
+    return [dict(row) for row in result.mappings().all()]
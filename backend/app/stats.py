@@ -0,0 +1,311 @@
+"""Dashboard aggregates kept in summary tables.
+
+case_status_counts and daily_stats are updated in the same transaction as
+every case, analysis, document and document option write, so the stats
+endpoint reads a handful of rows whatever the size of the underlying tables.
+Each transaction adds to one of STATS_SHARDS rows per key, so concurrent
+writers seldom wait on each other's row locks. Writes that bypass the ORM
+(bulk update/delete statements, manual SQL) are not seen; reconcile()
+corrects the drift they cause.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import Date, String, cast, event, func, inspect, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from app.models import Analysis, Case, CaseStatusCount, DailyStats, Document, DocumentOption
+
+logger = logging.getLogger(__name__)
+
+# Reconciliation interval; 0 disables the periodic job (run `python -m app.stats reconcile` instead)
+STATS_RECONCILE_SECONDS = float(os.getenv("STATS_RECONCILE_SECONDS", "3600"))
+STATS_SHARDS = int(os.getenv("STATS_SHARDS", "16"))
+
+# PostgreSQL advisory lock held while reconciling, so workers never apply the same correction twice
+RECONCILE_LOCK_ID = 7_302_523
+# Revenue differences below this are float rounding, not drift
+REVENUE_TOLERANCE = 0.005
+
+DAILY_COLUMNS = ("cases_created", "analyses_created", "documents_uploaded", "analysis_revenue", "option_revenue")
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _day(value: Optional[datetime]) -> date:
+    # Rows inserted in this flush have no created_at loaded yet: the server default is now()
+    if value is None:
+        return utc_today()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def _loaded(target, key: str):
+    # Never lazy-load during a flush: under asyncio that would need a greenlet switch
+    return inspect(target).dict.get(key)
+
+
+def _deltas(session: Optional[Session]):
+    if session is None:
+        return None
+    if "stats_deltas" not in session.info:
+        session.info["stats_deltas"] = (defaultdict(int), defaultdict(lambda: defaultdict(float)))
+    return session.info["stats_deltas"]
+
+
+def _count_status(target, status, delta: int) -> None:
+    deltas = _deltas(object_session(target))
+    if deltas is not None and status is not None:
+        deltas[0][getattr(status, "name", status)] += delta
+
+
+def _add_daily(target, day: date, column: str, delta: float) -> None:
+    deltas = _deltas(object_session(target))
+    if deltas is not None and delta:
+        deltas[1][day][column] += delta
+
+
+def _analysis_day(connection, session: Optional[Session], analysis_id: int) -> date:
+    # Option revenue is bucketed by the day of its analysis; look each one up once per session
+    days = session.info.setdefault("stats_analysis_days", {}) if session is not None else {}
+    if analysis_id not in days:
+        days[analysis_id] = _day(connection.scalar(select(Analysis.created_at).where(Analysis.id == analysis_id)))
+    return days[analysis_id]
+
+
+@event.listens_for(Case, "after_insert")
+def _case_inserted(mapper, connection, target):
+    _count_status(target, target.status, 1)
+    _add_daily(target, _day(_loaded(target, "created_at")), "cases_created", 1)
+
+
+@event.listens_for(Case, "after_update")
+def _case_updated(mapper, connection, target):
+    history = inspect(target).attrs.status.history
+    if history.has_changes():
+        for status in history.deleted:
+            _count_status(target, status, -1)
+        for status in history.added:
+            _count_status(target, status, 1)
+
+
+@event.listens_for(Case, "after_delete")
+def _case_deleted(mapper, connection, target):
+    _count_status(target, target.status, -1)
+    _add_daily(target, _day(_loaded(target, "created_at")), "cases_created", -1)
+
+
+@event.listens_for(Analysis, "after_insert")
+def _analysis_inserted(mapper, connection, target):
+    day = _day(_loaded(target, "created_at"))
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("stats_analysis_days", {})[target.id] = day
+    _add_daily(target, day, "analyses_created", 1)
+    _add_daily(target, day, "analysis_revenue", target.price or 0)
+
+
+@event.listens_for(Analysis, "after_update")
+def _analysis_updated(mapper, connection, target):
+    history = inspect(target).attrs.price.history
+    if history.has_changes():
+        day = _analysis_day(connection, object_session(target), target.id)
+        _add_daily(target, day, "analysis_revenue", sum(history.added) - sum(history.deleted))
+
+
+@event.listens_for(Analysis, "after_delete")
+def _analysis_deleted(mapper, connection, target):
+    day = _day(_loaded(target, "created_at"))
+    _add_daily(target, day, "analyses_created", -1)
+    _add_daily(target, day, "analysis_revenue", -(target.price or 0))
+
+
+def _add_option_revenue(connection, target, delta: float) -> None:
+    if delta:
+        day = _analysis_day(connection, object_session(target), target.analysis_id)
+        _add_daily(target, day, "option_revenue", delta)
+
+
+@event.listens_for(DocumentOption, "after_insert")
+def _option_inserted(mapper, connection, target):
+    _add_option_revenue(connection, target, target.price or 0)
+
+
+@event.listens_for(DocumentOption, "after_update")
+def _option_updated(mapper, connection, target):
+    history = inspect(target).attrs.price.history
+    if history.has_changes():
+        _add_option_revenue(connection, target, sum(history.added) - sum(history.deleted))
+
+
+@event.listens_for(DocumentOption, "after_delete")
+def _option_deleted(mapper, connection, target):
+    _add_option_revenue(connection, target, -(target.price or 0))
+
+
+@event.listens_for(Document, "after_insert")
+def _document_inserted(mapper, connection, target):
+    _add_daily(target, _day(_loaded(target, "uploaded_at")), "documents_uploaded", 1)
+
+
+@event.listens_for(Document, "after_delete")
+def _document_deleted(mapper, connection, target):
+    _add_daily(target, _day(_loaded(target, "uploaded_at")), "documents_uploaded", -1)
+
+
+def _upsert(dialect: str, table, key: str, values: dict, increments):
+    insert = pg_insert if dialect == "postgresql" else sqlite_insert
+    stmt = insert(table).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[key, "shard"],
+        set_={column: table.c[column] + stmt.excluded[column] for column in increments},
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_deltas(session, flush_context):
+    deltas = session.info.pop("stats_deltas", None)
+    if deltas is None:
+        return
+    status_deltas, daily_deltas = deltas
+    connection = session.connection()
+    dialect = connection.dialect.name
+    # One shard for the whole transaction, whose row locks are held until commit
+    shard = session.info.setdefault("stats_shard", random.randrange(STATS_SHARDS))
+    # Rows are touched in key order, so concurrent flushes lock them in the same order
+    for status in sorted(status_deltas):
+        if status_deltas[status]:
+            connection.execute(_upsert(dialect, CaseStatusCount.__table__, "status",
+                                       {"status": status, "shard": shard, "count": status_deltas[status]},
+                                       ("count",)))
+    for day in sorted(daily_deltas):
+        values = {column: daily_deltas[day].get(column, 0) for column in DAILY_COLUMNS}
+        connection.execute(_upsert(dialect, DailyStats.__table__, "day",
+                                   {"day": day, "shard": shard, **values}, DAILY_COLUMNS))
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _forget_analysis_days(session):
+    session.info.pop("stats_analysis_days", None)
+    session.info.pop("stats_deltas", None)
+    session.info.pop("stats_shard", None)
+
+
+def _utc_day(db: AsyncSession, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.timezone(literal_column("'UTC'"), column), Date)
+    # SQLite stores CURRENT_TIMESTAMP, which is UTC
+    return func.date(column)
+
+
+def _day_value(value) -> date:
+    # func.date() returns text on SQLite
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+async def reconcile(db: AsyncSession) -> Optional[int]:
+    """Correct the summary tables to match cases, analyses, options and documents.
+
+    Each correction is the source-table total minus the summary total, read
+    by a single statement and so from one snapshot: a write committed
+    concurrently is either in both or in neither, and writers are never
+    blocked. Corrections are added to shard 0. Returns the number of
+    corrected rows, or None if another process is reconciling.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        locked = (await db.execute(select(func.pg_try_advisory_xact_lock(RECONCILE_LOCK_ID)))).scalar()
+        if not locked:
+            await db.rollback()
+            return None
+
+    counts = (
+        select(cast(Case.status, String).label("status"), func.count().label("count"))
+        .group_by(Case.status)
+        .union_all(select(CaseStatusCount.status, -CaseStatusCount.count))
+        .subquery()
+    )
+    result = await db.execute(
+        select(counts.c.status, func.sum(counts.c.count)).group_by(counts.c.status)
+    )
+    status_corrections = {status: delta for status, delta in result.all() if delta}
+
+    analysis_day = _utc_day(db, Analysis.created_at)
+    zero = literal_column("0")
+    buckets = (
+        select(_utc_day(db, Case.created_at).label("day"), func.count().label("cases_created"),
+               zero.label("analyses_created"), zero.label("documents_uploaded"),
+               zero.label("analysis_revenue"), zero.label("option_revenue"))
+        .group_by(_utc_day(db, Case.created_at))
+        .union_all(
+            select(analysis_day, zero, func.count(), zero, func.sum(Analysis.price), zero)
+            .group_by(analysis_day),
+            select(_utc_day(db, Document.uploaded_at), zero, zero, func.count(), zero, zero)
+            .group_by(_utc_day(db, Document.uploaded_at)),
+            select(analysis_day, zero, zero, zero, zero, func.sum(DocumentOption.price))
+            .join(Analysis, Analysis.id == DocumentOption.analysis_id)
+            .group_by(analysis_day),
+            select(DailyStats.day, *(-DailyStats.__table__.c[column] for column in DAILY_COLUMNS)),
+        )
+        .subquery()
+    )
+    result = await db.execute(
+        select(buckets.c.day, *(func.sum(buckets.c[column]) for column in DAILY_COLUMNS))
+        .where(buckets.c.day.is_not(None))
+        .group_by(buckets.c.day)
+    )
+    daily_corrections = {}
+    for day, *values in result.all():
+        values = dict(zip(DAILY_COLUMNS, (value or 0 for value in values)))
+        if any(abs(value) > REVENUE_TOLERANCE for value in values.values()):
+            daily_corrections[_day_value(day)] = values
+
+    for status in sorted(status_corrections):
+        await db.execute(_upsert(dialect, CaseStatusCount.__table__, "status",
+                                 {"status": status, "shard": 0, "count": status_corrections[status]}, ("count",)))
+    for day in sorted(daily_corrections):
+        await db.execute(_upsert(dialect, DailyStats.__table__, "day",
+                                 {"day": day, "shard": 0, **daily_corrections[day]}, DAILY_COLUMNS))
+    await db.commit()
+    return len(status_corrections) + len(daily_corrections)
+
+
+async def reconcile_periodically(interval: float = STATS_RECONCILE_SECONDS) -> None:
+    from app.database import async_session
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with async_session() as db:
+                await reconcile(db)
+        except Exception:
+            logger.exception("Stats reconciliation failed")
+
+
+async def _reconcile_command() -> None:
+    from app.database import async_session
+
+    async with async_session() as db:
+        corrected = await reconcile(db)
+    print("another process is reconciling" if corrected is None else f"corrected {corrected} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Legal Nexus dashboard stats maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("reconcile", help="correct the summary tables from the source tables")
+    args = parser.parse_args()
+    asyncio.run(_reconcile_command())
@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.database import dialect_insert
+from app.models import Blob, BlobPage, Document
+
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+BLOB_DIR = UPLOAD_DIR / "blobs"
+TMP_DIR = UPLOAD_DIR / "tmp"
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))
+# Whole request body of a batch upload; larger batches are rejected before any file is stored
+MAX_BATCH_UPLOAD_SIZE = int(os.getenv("MAX_BATCH_UPLOAD_SIZE", str(4 * MAX_UPLOAD_SIZE)))
+# Multipart framing and form fields around an uploaded file
+FORM_OVERHEAD = 1024 * 1024
+# Unreferenced blobs younger than this are kept: their upload may not be committed yet
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+
+
+def ensure_dirs() -> None:
+    BLOB_DIR.mkdir(parents=True, exist_ok=True)
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def blob_path(sha256: str) -> Path:
+    return BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+async def save_upload(file: UploadFile, max_size: Optional[int] = None) -> Tuple[int, str, Path]:
+    """Stream an upload into the blob store, returning (size, sha256, path).
+
+    The file is copied in fixed-size chunks to a temporary file while the
+    size limit is enforced and the hash computed, then moved to its
+    content-addressed location. Identical content is stored only once.
+    """
+    if max_size is None:
+        max_size = MAX_UPLOAD_SIZE
+    ensure_dirs()
+    tmp_path = TMP_DIR / uuid.uuid4().hex
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds maximum upload size of {max_size} bytes"
+                    )
+                digest.update(chunk)
+                await f.write(chunk)
+
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256)
+        try:
+            # Refresh mtime so a concurrent gc sees the blob as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # New content, or just removed by gc: store it
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        else:
+            tmp_path.unlink()
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return size, sha256, path
+
+
+def _too_large(limit: int) -> JSONResponse:
+    return JSONResponse(
+        {"detail": f"Request body exceeds maximum upload size of {limit} bytes"},
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    )
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware capping upload request bodies before they are parsed.
+
+    Starlette spools a whole multipart body to disk before the endpoint runs,
+    so save_upload's per-file limit alone only applies once it was received.
+    """
+
+    def __init__(self, app: ASGIApp, prefix: str = "/api/v1/documents/upload/"):
+        self.app = app
+        self.prefix = prefix
+
+    def limit(self, path: str) -> Optional[int]:
+        if not path.startswith(self.prefix):
+            return None
+        if path.endswith("/batch"):
+            return MAX_BATCH_UPLOAD_SIZE
+        return MAX_UPLOAD_SIZE + FORM_OVERHEAD
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limit(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            declared_size = int(dict(scope["headers"]).get(b"content-length", b"0"))
+        except ValueError:
+            declared_size = 0
+        if declared_size > limit:
+            await _too_large(limit)(scope, receive, send)
+            return
+
+        # Without a declared length the body is counted while it is read
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Ends the form parsing as if the client had gone away
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal started
+            if exceeded:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not started:
+            await _too_large(limit)(scope, receive, send)
+
+
+async def add_blob_ref(db: AsyncSession, sha256: str, size: int) -> None:
+    """Count one more Document referencing the blob, within the caller's transaction."""
+    await add_blob_refs(db, {sha256: (size, 1)})
+
+
+async def add_blob_refs(db: AsyncSession, refs: Dict[str, Tuple[int, int]]) -> None:
+    """Add references to many blobs in one statement; refs maps sha256 to (size, count)."""
+    if not refs:
+        return
+    # Sorted so concurrent batches lock rows in the same order
+    stmt = dialect_insert(db)(Blob).values([
+        {"sha256": sha256, "size": size, "ref_count": count}
+        for sha256, (size, count) in sorted(refs.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Blob.sha256],
+        set_={"ref_count": Blob.ref_count + stmt.excluded.ref_count}
+    )
+    await db.execute(stmt)
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0
+
+
+def _remove_unused(path: Path, cutoff: float) -> bool:
+    """Delete a blob file unless an upload refreshed it; False if it was kept."""
+    # Moved aside first: an upload refreshing it from now on finds it missing and stores it again
+    trash = TMP_DIR / f"gc-{uuid.uuid4().hex}"
+    try:
+        os.replace(path, trash)
+    except FileNotFoundError:
+        return True
+    if trash.stat().st_mtime > cutoff:
+        os.replace(trash, path)
+        return False
+    trash.unlink()
+    return True
+
+
+async def collect_garbage(db: AsyncSession, dry_run: bool = False,
+                          grace_seconds: int = BLOB_GC_GRACE_SECONDS) -> dict:
+    """Reconcile reference counts with Document rows and delete unreferenced blobs."""
+    referenced = (
+        select(func.count(Document.id))
+        .where(Document.sha256 == Blob.sha256)
+        .scalar_subquery()
+    )
+    if not dry_run:
+        ensure_dirs()
+        await db.execute(update(Blob).values(ref_count=referenced))
+        await db.commit()
+
+    cutoff = time.time() - grace_seconds
+    stats = {"deleted_blobs": 0, "deleted_orphans": 0, "deleted_tmp": 0, "freed_bytes": 0}
+
+    result = await db.execute(select(Blob.sha256, Blob.size).where(referenced == 0))
+    for sha256, size in result.all():
+        path = blob_path(sha256)
+        if _mtime(path) > cutoff or (not dry_run and not _remove_unused(path, cutoff)):
+            continue
+        stats["deleted_blobs"] += 1
+        stats["freed_bytes"] += size
+        if not dry_run:
+            await db.execute(delete(BlobPage).where(BlobPage.sha256 == sha256))
+            await db.execute(delete(Blob).where(Blob.sha256 == sha256, referenced == 0))
+    if not dry_run:
+        await db.commit()
+
+    # Files on disk without a blob row, e.g. left behind by a failed commit
+    known = set((await db.execute(select(Blob.sha256))).scalars().all())
+    if BLOB_DIR.exists():
+        for path in BLOB_DIR.glob("*/*/*"):
+            if path.name in known or _mtime(path) > cutoff:
+                continue
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+            if not dry_run and not _remove_unused(path, cutoff):
+                continue
+            stats["deleted_orphans"] += 1
+            stats["freed_bytes"] += size
+    if TMP_DIR.exists():
+        for path in TMP_DIR.iterdir():
+            if _mtime(path) > cutoff:
+                continue
+            stats["deleted_tmp"] += 1
+            if not dry_run:
+                path.unlink(missing_ok=True)
+    return stats
+
+
+async def _gc_command(dry_run: bool) -> None:
+    from app.database import async_session
+
+    async with async_session() as db:
+        stats = await collect_garbage(db, dry_run=dry_run)
+    print(", ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Legal Nexus document blob store maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    gc_parser = subparsers.add_parser("gc", help="delete blobs no longer referenced by any document")
+    gc_parser.add_argument("--dry-run", action="store_true", help="report what would be deleted")
+    args = parser.parse_args()
+    asyncio.run(_gc_command(args.dry_run))
@@ -0,0 +1 @@
+# Backend benchmarks
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Peak memory and time of the streaming case export versus building the list in memory.
+
+Seeds each --rows count of cases into a throwaway SQLite database (or
+DATABASE_URL), then exports them twice: the way a full get_cases-style
+response is built (ORM objects, Case schema validation, one JSON document),
+and through GET /api/v1/exports/cases served by uvicorn, reading and
+discarding the body. Peak memory is measured with tracemalloc in a second
+pass so it does not slow down the timed one.
+
+    python -m benchmarks.export --rows 10000 50000 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_db_dir = tempfile.mkdtemp(prefix="legal-nexus-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_dir}/bench.db")
+os.environ.setdefault("AI_BACKEND", "fake")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.database import async_session, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Case  # noqa: E402
+from app.schemas import Case as CaseSchema  # noqa: E402
+from benchmarks.streaming import free_port, login  # noqa: E402
+
+NOTES = "Otrzymałem nakaz zapłaty z e-sądu i nie zgadzam się z kwotą roszczenia. " * 3
+
+
+async def seed_cases(client_id: int, rows: int) -> None:
+    async with async_session() as db:
+        existing = (await db.execute(select(func.count(Case.id)))).scalar_one()
+        for start in range(existing, rows, 5000):
+            db.add_all(
+                Case(name=f"Sprawa {i}", client_id=client_id, client_notes=NOTES)
+                for i in range(start, min(rows, start + 5000))
+            )
+            await db.commit()
+
+
+async def in_memory() -> int:
+    async with async_session() as db:
+        cases = (await db.execute(select(Case).order_by(Case.id))).scalars().all()
+        body = json.dumps([CaseSchema.model_validate(case).model_dump(mode="json") for case in cases]).encode()
+    return len(body)
+
+
+async def streamed(client: httpx.AsyncClient, headers: dict) -> int:
+    size = 0
+    async with client.stream("GET", "/api/v1/exports/cases", headers=headers) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+    return size
+
+
+async def measure(export) -> tuple:
+    started = time.perf_counter()
+    size = await export()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    await export()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+async def run(row_counts) -> None:
+    await init_db()
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=600) as client:
+        headers = await login(client)
+        me = (await client.get("/api/v1/users/me", headers=headers)).json()
+        for rows in sorted(row_counts):
+            await seed_cases(me["id"], rows)
+            for name, export in (("in-memory", in_memory), ("streamed", lambda: streamed(client, headers))):
+                size, elapsed, peak = await measure(export)
+                print(f"rows={rows:>7} {name:>9}: {elapsed:6.2f}s {rows / elapsed:8.0f} rows/s "
+                      f"body={size / 2**20:6.1f}MiB peak={peak / 2**20:6.1f}MiB")
+
+    server.should_exit = True
+    await serve
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000])
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.rows))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
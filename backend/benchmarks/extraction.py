@@ -0,0 +1,93 @@
+"""Text extraction throughput in pages per second.
+
+Runs app.extraction.extract_file over a corpus in a process pool for each
+worker count and reports pages/sec. Without --corpus a synthetic corpus of
+text PDFs is generated; point --corpus at a directory of real PDFs and
+scans (OCR needs the tesseract binary) for representative numbers.
+
+    python -m benchmarks.extraction --documents 40 --pages 25 --workers 1 2 4
+    python -m benchmarks.extraction --corpus ~/scans --workers 4
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.extraction import extract_file
+
+LINE = "Sad Rejonowy uznal powodztwo o zaplate za zasadne w calosci, strona {page} akt sprawy {doc}."
+
+
+def make_pdf(pages) -> bytes:
+    """Minimal uncompressed PDF with one line of Helvetica text per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 11 Tf 40 780 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def synthetic_corpus(directory: Path, documents: int, pages: int):
+    paths = []
+    for doc in range(documents):
+        path = directory / f"doc{doc}.pdf"
+        path.write_bytes(make_pdf([LINE.format(page=page, doc=doc) for page in range(1, pages + 1)]))
+        paths.append(path)
+    return paths
+
+
+def run(paths, workers: int) -> None:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # Warm the workers so process start-up is not counted
+        list(pool.map(extract_file, [str(paths[0])] * workers))
+        started = time.perf_counter()
+        results = list(pool.map(extract_file, [str(path) for path in paths]))
+        elapsed = time.perf_counter() - started
+    pages = sum(len(result) for result in results)
+    chars = sum(len(text) for result in results for text in result)
+    print(f"workers={workers} documents={len(paths)} pages={pages} chars={chars} "
+          f"elapsed={elapsed:.2f}s throughput={pages / elapsed:.1f} pages/s")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, help="directory of PDFs and images to extract")
+    parser.add_argument("--documents", type=int, default=40, help="synthetic documents to generate")
+    parser.add_argument("--pages", type=int, default=25, help="pages per synthetic document")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="legal-nexus-extract-") as tmp:
+        if args.corpus:
+            paths = sorted(path for path in args.corpus.rglob("*") if path.is_file())
+        else:
+            paths = synthetic_corpus(Path(tmp), args.documents, args.pages)
+        if not paths:
+            sys.exit("corpus is empty")
+        for workers in args.workers:
+            run(paths, workers)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,103 @@
+"""Login latency under concurrent load.
+
+Boots app.main:app in-process against a throwaway SQLite database, registers
+users and fires concurrent logins while probing /health, so event-loop stalls
+from password hashing show up as /health latency.
+
+    python -m benchmarks.login --users 50 --concurrency 50
+    python -m benchmarks.login --blocking   # hash on the event loop, for comparison
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix="legal-nexus-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_dir}/bench.db")
+os.environ.setdefault("AI_BACKEND", "fake")
+
+import httpx  # noqa: E402
+
+from app import auth  # noqa: E402
+from app.database import init_db  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(name, samples):
+    print(
+        f"{name:>8}: n={len(samples)} "
+        f"p50={percentile(samples, 50) * 1000:.1f}ms "
+        f"p95={percentile(samples, 95) * 1000:.1f}ms "
+        f"p99={percentile(samples, 99) * 1000:.1f}ms "
+        f"max={max(samples) * 1000:.1f}ms"
+    )
+
+
+async def run(users: int, concurrency: int, rounds: int, blocking: bool) -> None:
+    if blocking:
+        async def run_inline(func, *args):
+            return func(*args)
+        auth._run_hasher = run_inline
+
+    await init_db()
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        credentials = []
+        for i in range(users):
+            payload = {"email": f"bench{i}@example.com", "name": f"Bench {i}", "password": "bench-password"}
+            response = await client.post("/api/v1/auth/register", json=payload)
+            response.raise_for_status()
+            credentials.append({"email": payload["email"], "password": payload["password"]})
+
+        login_latencies, health_latencies = [], []
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+
+        async def login(creds):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/api/v1/auth/login", json=creds)
+                login_latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        async def probe_health():
+            # Measured from when the probe was due, so time spent waiting for a blocked loop counts
+            while not done.is_set():
+                due = time.perf_counter() + 0.01
+                await asyncio.sleep(0.01)
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - due)
+
+        probe = asyncio.create_task(probe_health())
+        started = time.perf_counter()
+        await asyncio.gather(*(login(credentials[i % users]) for i in range(users * rounds)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+
+    mode = "blocking" if blocking else f"executor({auth.PASSWORD_HASH_WORKERS} workers)"
+    print(f"mode={mode} bcrypt_rounds={auth.BCRYPT_ROUNDS} logins={len(login_latencies)} "
+          f"throughput={len(login_latencies) / elapsed:.1f}/s")
+    report("login", login_latencies)
+    report("health", health_latencies)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3, help="logins per user")
+    parser.add_argument("--blocking", action="store_true", help="run bcrypt on the event loop")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.users, args.concurrency, args.rounds, args.blocking))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+"""Per-case retrieval cost and prompt size, versus pasting every document into the prompt.
+
+Builds a CaseIndex over --documents synthetic documents of --pages pages,
+times the initial build, adding one more document (what happens when an
+upload finishes extraction) and passage selection per question, and compares
+the estimated prompt tokens of the retrieved context with the full case text.
+Needs no database or model.
+
+    python -m benchmarks.retrieval
+    python -m benchmarks.retrieval --documents 200 --pages 20
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from app.ai import build_analysis_prompt
+from app.retrieval import CaseIndex, estimate_tokens, format_passages, select_passages
+
+VOCABULARY = (
+    "umowa najmu wypowiedzenie kaucja nakaz zapłaty sprzeciw sąd rejonowy powód pozwany wierzyciel dłużnik "
+    "odsetki ustawowe termin doręczenie pełnomocnictwo egzekucja komornik postanowienie wyrok apelacja "
+    "zadośćuczynienie odszkodowanie spadek testament zachowek alimenty rozwód opieka przedawnienie roszczenie "
+    "faktura płatność wezwanie ugoda mediacja koszty postępowania lokal mieszkanie wynajmujący najemca"
+).split()
+QUESTIONS = [
+    "Czy wypowiedzenie umowy najmu było skuteczne?",
+    "Jak napisać sprzeciw od nakazu zapłaty?",
+    "Czy roszczenie o zapłatę faktury uległo przedawnieniu?",
+    "Kiedy komornik może prowadzić egzekucję z mieszkania?",
+    "Jak obliczyć zachowek po spadkodawcy?",
+]
+
+
+def make_document(rng: random.Random, pages: int, words: int = 400) -> list:
+    # Legal terms mixed with a long tail of rarer words, as in real documents
+    return [
+        (f"dokument, s. {page}", " ".join(
+            rng.choice(VOCABULARY) if rng.random() < 0.3 else f"w{rng.randrange(50000)}"
+            for _ in range(words)
+        ))
+        for page in range(1, pages + 1)
+    ]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+    rng = random.Random(7)
+    documents = [make_document(rng, args.pages) for _ in range(args.documents)]
+
+    index = CaseIndex()
+    started = time.perf_counter()
+    for number, pages in enumerate(documents):
+        index.add(f"doc-{number}", pages)
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    index.add("doc-new", make_document(rng, args.pages))
+    incremental = time.perf_counter() - started
+
+    timings = []
+    for number in range(args.queries):
+        question = QUESTIONS[number % len(QUESTIONS)]
+        started = time.perf_counter()
+        passages = select_passages(index, question)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    full_text = "\n".join(text for pages in documents for _, text in pages)
+    full_tokens = estimate_tokens(build_analysis_prompt(QUESTIONS[0], full_text))
+    retrieved_tokens = estimate_tokens(build_analysis_prompt(QUESTIONS[0], format_passages(passages)))
+    print(f"documents={args.documents} pages={args.pages} passages={len(index.passages)} terms={len(index.postings)}")
+    print(f"build: {build * 1000:.1f}ms, add one document: {incremental * 1000:.2f}ms")
+    print(f"select passages: p50={statistics.median(timings) * 1000:.2f}ms "
+          f"p95={timings[int(len(timings) * 0.95) - 1] * 1000:.2f}ms")
+    print(f"prompt tokens: full case text={full_tokens}, retrieved={retrieved_tokens} "
+          f"({retrieved_tokens / full_tokens:.1%})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,118 @@
+"""Cold start time of the API: module import cost and time to the first /health response.
+
+Imports app.main in a fresh interpreter under `python -X importtime`, lists
+the slowest imports, and fails if modules that should load lazily (the
+Gemini SDK, PDF and OCR libraries) are imported at startup. Then starts
+uvicorn --runs times and measures from process start to the first 200 from
+/health. Exits non-zero when a limit is exceeded, so it can guard CI.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --max-ready-ms 3000
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Only needed for AI generation or in extraction worker processes
+LAZY_MODULES = ["google.generativeai", "google.ai.generativelanguage", "pypdf", "pytesseract", "PIL"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env() -> dict:
+    db_dir = tempfile.mkdtemp(prefix="legal-nexus-bench-")
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{db_dir}/bench.db")
+    env.setdefault("UPLOAD_DIR", os.path.join(db_dir, "uploads"))
+    return env
+
+
+def import_profile(env: dict) -> list:
+    """(module, nesting depth, cumulative microseconds) in -X importtime order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        profile.append((name.strip(), depth, int(cumulative)))
+    return profile
+
+
+def time_to_health(env: dict, timeout: float = 60) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/health did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="server starts to time")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--max-import-ms", type=float, help="fail if importing app.main takes longer")
+    parser.add_argument("--max-ready-ms", type=float, help="fail if the median time to /health is longer")
+    args = parser.parse_args(argv)
+    env = server_env()
+    failures = []
+
+    profile = import_profile(env)
+    total_ms = next(us for name, _, us in profile if name == "app.main") / 1000
+    print(f"import app.main: {total_ms:.0f}ms, slowest direct imports:")
+    # Depth 1 is what app.main imports itself; depth 0 is app.main and interpreter start-up
+    direct = sorted(((us, name) for name, depth, us in profile if depth == 1), reverse=True)
+    for us, name in direct[:args.top]:
+        print(f"  {us / 1000:7.1f}ms  {name}")
+    imported = {name for name, _, _ in profile}
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        failures.append(f"imported at startup, should load lazily: {', '.join(eager)}")
+    if args.max_import_ms is not None and total_ms > args.max_import_ms:
+        failures.append(f"import took {total_ms:.0f}ms, limit {args.max_import_ms:.0f}ms")
+
+    # One untimed start warms the OS file cache, as on a node that already ran the image
+    time_to_health(env)
+    samples = [time_to_health(env) * 1000 for _ in range(args.runs)]
+    ready_ms = statistics.median(samples)
+    print(f"time to first /health: median={ready_ms:.0f}ms min={min(samples):.0f}ms max={max(samples):.0f}ms "
+          f"runs={args.runs}")
+    if args.max_ready_ms is not None and ready_ms > args.max_ready_ms:
+        failures.append(f"time to /health {ready_ms:.0f}ms, limit {args.max_ready_ms:.0f}ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
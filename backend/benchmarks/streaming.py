@@ -0,0 +1,104 @@
+"""Time to first byte of streamed AI analyses versus the full generation time.
+
+Serves app.main:app with uvicorn on a local port against a throwaway SQLite
+database and the fake model, which waits --first-token seconds and then emits
+one word every --chunk-delay seconds. Requests go over real HTTP so response
+buffering shows up in the numbers.
+
+    python -m benchmarks.streaming --requests 20 --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix="legal-nexus-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_dir}/bench.db")
+os.environ.setdefault("AI_BACKEND", "fake")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_db_dir, "uploads"))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app import ai  # noqa: E402
+from app.database import init_db  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def login(client: httpx.AsyncClient) -> dict:
+    payload = {"email": "operator@example.com", "name": "Operator", "password": "bench-password", "role": "OPERATOR"}
+    (await client.post("/api/v1/auth/register", json=payload)).raise_for_status()
+    response = await client.post("/api/v1/auth/login", json={"email": payload["email"], "password": payload["password"]})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def stream_once(client: httpx.AsyncClient, headers: dict, case_id: int) -> tuple:
+    started = time.perf_counter()
+    first_chunk = None
+    async with client.stream("POST", f"/api/v1/analyses/generate/{case_id}/stream",
+                             params={"question": "Jak wnieść sprzeciw od nakazu zapłaty?"}, headers=headers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == "event: chunk" and first_chunk is None:
+                first_chunk = time.perf_counter() - started
+            if line == "event: done":
+                break
+    return first_chunk, time.perf_counter() - started
+
+
+async def run(requests: int, concurrency: int, first_token: float, chunk_delay: float) -> None:
+    ai.set_backend(ai.FakeBackend(delay=first_token, chunk_delay=chunk_delay))
+    await init_db()
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        headers = await login(client)
+        case = await client.post("/api/v1/cases/", json={"name": "Benchmark"}, headers=headers)
+        case_id = case.json()["id"]
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await stream_once(client, headers, case_id)
+
+        results = await asyncio.gather(*(one() for _ in range(requests)))
+
+    server.should_exit = True
+    await serve
+
+    ttfb = [first for first, _ in results]
+    total = [elapsed for _, elapsed in results]
+    print(f"requests={requests} concurrency={concurrency} "
+          f"first_token_delay={first_token}s chunk_delay={chunk_delay}s")
+    print(f"first chunk: median={statistics.median(ttfb) * 1000:.0f}ms max={max(ttfb) * 1000:.0f}ms")
+    print(f"complete:    median={statistics.median(total) * 1000:.0f}ms max={max(total) * 1000:.0f}ms")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--first-token", type=float, default=0.3, help="fake model delay before the first chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="fake model delay between chunks")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.requests, args.concurrency, args.first_token, args.chunk_delay))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
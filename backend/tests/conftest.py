@@ -0,0 +1,137 @@
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+# Settings are read at import time, so they are set before the app is imported
+_TMP = tempfile.mkdtemp(prefix="legalnexus-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_TMP}/test.db")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_TMP, "uploads"))
+os.environ["AI_BACKEND"] = "fake"
+os.environ["STATS_RECONCILE_SECONDS"] = "0"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.ai import FakeBackend, set_backend  # noqa: E402
+from app.cache import CACHES  # noqa: E402
+from app.database import Base, engine, init_db  # noqa: E402
+from app.jobs import analysis_jobs  # noqa: E402
+from app.main import app  # noqa: E402
+
+PASSWORD = "secret123"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database():
+    """An empty schema created with init_db; in-process state is reset afterwards."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await init_db()
+    yield engine
+    await analysis_jobs.stop()
+    analysis_jobs.jobs.clear()
+    for cache in CACHES.values():
+        cache.clear()
+    await engine.dispose()
+
+
+@pytest.fixture
+def fake_backend():
+    """A FakeBackend whose prompts can be inspected."""
+    backend = FakeBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(None)
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+
+async def register(client: httpx.AsyncClient, role: str, email: str = None) -> dict:
+    """Register and log in a user; returns its Authorization header."""
+    email = email or f"{role.lower()}@example.com"
+    response = await client.post("/api/v1/auth/register", json={
+        "email": email, "name": role.title(), "password": PASSWORD, "role": role,
+    })
+    assert response.status_code == 200, response.text
+    response = await client.post("/api/v1/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def wait_for_job(client: httpx.AsyncClient, job_id: str, headers: dict) -> dict:
+    """Poll an analysis job until it completes or fails; returns its last state."""
+    for _ in range(200):
+        response = await client.get(f"/api/v1/analyses/jobs/{job_id}", headers=headers)
+        assert response.status_code == 200, response.text
+        if response.json()["status"] in ("COMPLETED", "FAILED"):
+            return response.json()
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+class LiveStream:
+    """Body chunks of a streaming response, readable while the response is still being sent."""
+
+    def __init__(self):
+        self.status = None
+        self.headers = {}
+        self.bodies: asyncio.Queue = asyncio.Queue()
+        self.text = ""
+
+    async def read_until(self, marker: str, timeout: float = 5) -> str:
+        """Text received up to and including the chunk containing marker, from the last read on."""
+        start = len(self.text)
+        while marker not in self.text[start:]:
+            self.text += await asyncio.wait_for(self.bodies.get(), timeout)
+        return self.text[start:]
+
+
+@asynccontextmanager
+async def live_stream(method: str, path: str, headers: dict):
+    """Call the ASGI app directly; the client disconnects when the block exits.
+
+    httpx's ASGI transport only returns once the whole response is done, so it
+    cannot observe the first bytes of a stream or follow one that never ends.
+    """
+    stream = LiveStream()
+    disconnected = asyncio.Event()
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            stream.status = message["status"]
+            stream.headers = {name.decode(): value.decode() for name, value in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            await stream.bodies.put(message.get("body", b"").decode())
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 1234), "server": ("test", 80),
+    }
+    task = asyncio.create_task(app(scope, receive, send))
+    try:
+        yield stream
+    finally:
+        disconnected.set()
+        await asyncio.wait_for(task, 5)
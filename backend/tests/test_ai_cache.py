@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app import ai_cache
+from app.database import async_session
+from app.models import AIResponse, AIResponseBand
+from tests.conftest import register, wait_for_job
+
+pytestmark = pytest.mark.anyio
+
+QUESTION = "Czy mogę wypowiedzieć umowę najmu lokalu?"
+SIMILAR_QUESTION = "Czy mogę wypowiedzieć umowę najmu mieszkania?"
+
+
+async def create_case(client, headers, notes=None) -> int:
+    response = await client.post("/api/v1/cases/", json={"name": "Najem", "client_notes": notes}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+async def generate(client, headers, case_id: int, question: str = QUESTION, **params) -> dict:
+    response = await client.post(f"/api/v1/analyses/generate/{case_id}", params={"question": question, **params},
+                                 headers=headers)
+    assert response.status_code == 202, response.text
+    return await wait_for_job(client, response.json()["id"], headers)
+
+
+async def similar(client, headers, question: str = SIMILAR_QUESTION, **params) -> list:
+    response = await client.get("/api/v1/analyses/similar", params={"question": question, **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_answers_built_from_a_case_stay_with_it(client, fake_backend):
+    operator = await register(client, "OPERATOR")
+    anna = await register(client, "CLIENT", "anna@example.com")
+    jan = await register(client, "CLIENT", "jan@example.com")
+    private = await create_case(client, anna, "Wynajmujący lokalu przy ul. Polnej 5 zalega z kaucją najmu 4000 zł.")
+    other = await create_case(client, jan)
+
+    job = await generate(client, operator, private)
+    assert job["status"] == "COMPLETED" and job["cache_status"] == "miss"
+    assert "ul. Polnej 5" in fake_backend.prompts[0]
+
+    # Offered again for the same case only
+    drafts = await similar(client, operator, case_id=private)
+    assert [draft["question"] for draft in drafts] == [QUESTION]
+    assert await similar(client, operator, case_id=other) == []
+    assert await similar(client, operator) == []
+
+    # Neither as a draft nor as an exact hit on another case
+    job = await generate(client, operator, other, draft_id=drafts[0]["id"])
+    assert job["status"] == "FAILED"
+    assert "not found" in job["error"]
+    job = await generate(client, operator, other)
+    assert job["cache_status"] == "miss"
+    assert len(fake_backend.prompts) == 2
+    assert "ul. Polnej 5" not in fake_backend.prompts[1]
+    response = await client.get(f"/api/v1/analyses/case/{other}", headers=jan)
+    assert "ul. Polnej 5" not in response.json()["content"]
+
+    # The same case gets its own answer back from the cache
+    job = await generate(client, operator, private)
+    assert job["cache_status"] == "hit"
+    assert len(fake_backend.prompts) == 2
+
+
+async def test_answers_without_context_are_shared(client, fake_backend):
+    operator = await register(client, "OPERATOR")
+    first = await create_case(client, await register(client, "CLIENT", "anna@example.com"))
+    second = await create_case(client, await register(client, "CLIENT", "jan@example.com"))
+
+    assert (await generate(client, operator, first))["cache_status"] == "miss"
+    assert (await generate(client, operator, second))["cache_status"] == "hit"
+    drafts = await similar(client, operator, case_id=second)
+    assert [draft["question"] for draft in drafts] == [QUESTION]
+    assert len(fake_backend.prompts) == 1
+
+
+async def test_exact_hit_ignores_case_and_punctuation(database):
+    async with async_session() as db:
+        await ai_cache.store(db, QUESTION, "model", "Odpowiedź")
+        assert await ai_cache.lookup(db, "czy MOGĘ wypowiedzieć umowę najmu lokalu", "model") == "Odpowiedź"
+        assert await ai_cache.lookup(db, QUESTION, "other-model") is None
+        assert await ai_cache.lookup(db, QUESTION, "model", context="[1] (umowa) najem") is None
+        hits = (await db.execute(select(AIResponse.hit_count))).scalar_one()
+    assert hits == 1
+
+
+async def test_near_duplicates_are_matched(database):
+    async with async_session() as db:
+        await ai_cache.store(db, QUESTION, "model", "Odpowiedź o najmie")
+        await ai_cache.store(db, "Jak obliczyć zachowek po ojcu?", "model", "Odpowiedź o zachowku")
+        matches = await ai_cache.find_similar(db, SIMILAR_QUESTION, "model")
+        assert [match.response for match in matches] == ["Odpowiedź o najmie"]
+        assert ai_cache.AI_CACHE_SIMILARITY <= matches[0].similarity < 1
+        assert await ai_cache.find_similar(db, "Kiedy przedawnia się faktura?", "model") == []
+        assert await ai_cache.find_similar(db, SIMILAR_QUESTION, "other-model") == []
+
+
+async def test_expired_entries_are_ignored_and_purged(database):
+    async with async_session() as db:
+        await ai_cache.store(db, QUESTION, "model", "Stara odpowiedź")
+        await ai_cache.store(db, "Jak obliczyć zachowek po ojcu?", "model", "Odpowiedź o zachowku")
+        await db.execute(update(AIResponse).where(AIResponse.question == QUESTION)
+                         .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+        await db.commit()
+        assert await ai_cache.lookup(db, QUESTION, "model") is None
+        assert await ai_cache.find_similar(db, SIMILAR_QUESTION, "model") == []
+
+        assert await ai_cache.purge(db) == 1
+        assert (await db.execute(select(AIResponse.question))).scalars().all() == ["Jak obliczyć zachowek po ojcu?"]
+        bands = (await db.execute(select(AIResponseBand.response_id).distinct())).scalars().all()
+        assert len(bands) == 1
+
+
+async def test_purge_keeps_the_most_recently_used(database):
+    async with async_session() as db:
+        for number in range(3):
+            await ai_cache.store(db, f"Pytanie numer {number} o najem", "model", f"Odpowiedź {number}")
+        assert await ai_cache.lookup(db, "Pytanie numer 0 o najem", "model") == "Odpowiedź 0"
+        assert await ai_cache.purge(db, max_entries=2) == 1
+        remaining = (await db.execute(select(AIResponse.response).order_by(AIResponse.response))).scalars().all()
+    assert remaining == ["Odpowiedź 0", "Odpowiedź 2"]
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import database
+from app.database import Base, async_session
+from app.models import Analysis
+from tests.conftest import register, wait_for_job
+
+pytestmark = pytest.mark.anyio
+
+ANALYSIS = {
+    "content": "Treść analizy",
+    "summary": "Podsumowanie",
+    "recommendations": "[]",
+    "price": 59.0,
+}
+
+
+@pytest.fixture
+async def lagging_replica(tmp_path, monkeypatch):
+    """A replica that never receives the primary's writes."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(database, "async_read_session",
+                        async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    yield
+    await engine.dispose()
+
+
+async def test_case_analysis_cache_is_filled_from_primary(client, lagging_replica):
+    client_headers = await register(client, "CLIENT")
+    operator_headers = await register(client, "OPERATOR")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=client_headers)).json()["id"]
+
+    response = await client.get(f"/api/v1/analyses/case/{case_id}", headers=client_headers)
+    assert response.status_code == 404
+
+    created = await client.post("/api/v1/analyses/", json={"case_id": case_id, **ANALYSIS}, headers=operator_headers)
+    assert created.status_code == 200
+    response = await client.get(f"/api/v1/analyses/case/{case_id}", headers=client_headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == created.json()["id"]
+
+
+async def test_generation_job_saves_analysis(client, fake_backend):
+    client_headers = await register(client, "CLIENT")
+    operator_headers = await register(client, "OPERATOR")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=client_headers)).json()["id"]
+
+    response = await client.post(f"/api/v1/analyses/generate/{case_id}",
+                                 params={"question": "Czy mogę wypowiedzieć umowę najmu?"}, headers=operator_headers)
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "QUEUED"
+
+    job = await wait_for_job(client, job["id"], operator_headers)
+    assert job["status"] == "COMPLETED", job["error"]
+    assert job["progress"] == 100
+    assert job["content"].startswith("Analiza testowa")
+    assert len(fake_backend.prompts) == 1
+    assert "Czy mogę wypowiedzieć umowę najmu?" in fake_backend.prompts[0]
+
+    async with async_session() as db:
+        analysis = await db.get(Analysis, job["analysis_id"])
+    assert analysis.case_id == case_id
+    assert analysis.content == "Analiza testowa wygenerowana offline.\n\n" + fake_backend.prompts[0].strip()
+    response = await client.get(f"/api/v1/analyses/case/{case_id}", headers=client_headers)
+    assert response.json()["id"] == job["analysis_id"]
+
+    # Clients may not follow jobs; unknown ids are 404
+    assert (await client.get(f"/api/v1/analyses/jobs/{job['id']}", headers=client_headers)).status_code == 403
+    assert (await client.get("/api/v1/analyses/jobs/unknown", headers=operator_headers)).status_code == 404
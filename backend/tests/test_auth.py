@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import select
+
+from app.database import async_session
+from app.models import User, UserRole
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_changes_are_not_hidden_by_a_read_before_commit(client):
+    headers = await register(client, "CLIENT")
+    assert (await client.get("/api/v1/users/me", headers=headers)).status_code == 200
+
+    async with async_session() as db:
+        user = (await db.execute(select(User).where(User.email == "client@example.com"))).scalar_one()
+        user.is_active = False
+        await db.flush()
+        # A request between flush and commit still sees, and caches, the active user
+        assert (await client.get("/api/v1/users/me", headers=headers)).status_code == 200
+        await db.commit()
+
+    response = await client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Inactive user"
+
+
+async def test_rolled_back_changes_keep_the_principal(client):
+    headers = await register(client, "CLIENT")
+    async with async_session() as db:
+        user = (await db.execute(select(User).where(User.email == "client@example.com"))).scalar_one()
+        user.role = UserRole.ADMIN
+        await db.flush()
+        await db.rollback()
+        assert "principal_cache_emails" not in db.info
+
+    # Listing users is for admins only
+    assert (await client.get("/api/v1/users/", headers=headers)).status_code == 403
@@ -0,0 +1,32 @@
+"""Smoke test: every benchmark still runs end to end, with tiny parameters."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+BENCHMARKS = [
+    ("retrieval", ["--documents", "3", "--pages", "2", "--queries", "5"]),
+    ("extraction", ["--documents", "2", "--pages", "2", "--workers", "1"]),
+    ("login", ["--users", "2", "--concurrency", "2", "--rounds", "1"]),
+    ("export", ["--rows", "20"]),
+    ("streaming", ["--requests", "2", "--concurrency", "1", "--first-token", "0", "--chunk-delay", "0"]),
+    ("startup", ["--runs", "1"]),
+    ("run", ["--clients", "2", "--cases", "5", "--documents-per-case", "1", "--requests", "4",
+             "--concurrency", "2", "--model-delay", "0"]),
+]
+
+
+@pytest.mark.parametrize("name, args", BENCHMARKS, ids=[name for name, _ in BENCHMARKS])
+def test_benchmark_runs(name, args, tmp_path):
+    # Each benchmark creates its own throwaway database and upload directory, not the test suite's
+    env = {key: value for key, value in os.environ.items() if key not in ("DATABASE_URL", "UPLOAD_DIR")}
+    if name == "run":
+        args = args + ["--output", str(tmp_path / "result.json")]
+    result = subprocess.run([sys.executable, "-m", f"benchmarks.{name}", *args], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert result.stdout.strip()
@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import update
+
+from app.database import async_session
+from app.models import Case, CaseStatus
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_list_cases_by_status(client):
+    headers = await register(client, "CLIENT")
+    ids = [(await client.post("/api/v1/cases/", json={"name": name}, headers=headers)).json()["id"]
+           for name in ("Najem", "Spadek")]
+    async with async_session() as db:
+        await db.execute(update(Case).where(Case.id == ids[1]).values(status=CaseStatus.COMPLETED))
+        await db.commit()
+
+    response = await client.get("/api/v1/cases/", params={"status": "COMPLETED"}, headers=headers)
+    assert [case["id"] for case in response.json()["items"]] == [ids[1]]
+    response = await client.get("/api/v1/cases/", params={"status": "UNKNOWN"}, headers=headers)
+    assert response.status_code == 422
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import database
+from app.database import DB_REPLICA_RETRY_SECONDS, Base, read_session
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+class CountingSessions:
+    """Session factory over an engine that counts the sessions opened."""
+
+    def __init__(self, url: str):
+        self.engine = create_async_engine(url)
+        self.sessions = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return self.sessions()
+
+
+@pytest.fixture
+async def replica(tmp_path, monkeypatch):
+    """Installs read replicas: replica(reachable) returns the session factory now in use."""
+    factories = []
+
+    async def install(reachable: bool) -> CountingSessions:
+        # A database file in a missing directory cannot be opened
+        path = tmp_path / "replica.db" if reachable else tmp_path / "missing" / "replica.db"
+        factories.append(CountingSessions(f"sqlite+aiosqlite:///{path}"))
+        if reachable:
+            async with factories[-1].engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        monkeypatch.setattr(database, "async_read_session", factories[-1])
+        return factories[-1]
+
+    monkeypatch.setattr(database, "_replica_down_until", 0.0)
+    yield install
+    for factory in factories:
+        await factory.engine.dispose()
+
+
+async def test_unreachable_replica_falls_back_to_primary(client, replica):
+    down = await replica(reachable=False)
+    before = time.monotonic()
+    async with read_session() as session:
+        assert session.get_bind() is database.engine.sync_engine
+    assert down.opened == 1
+    assert before + DB_REPLICA_RETRY_SECONDS <= database._replica_down_until <= time.monotonic() + DB_REPLICA_RETRY_SECONDS
+
+    # Read endpoints keep working, without trying the replica again until the retry time
+    headers = await register(client, "CLIENT")
+    response = await client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["email"] == "client@example.com"
+    assert down.opened == 1
+
+    # After the retry time a reachable replica is used again
+    up = await replica(reachable=True)
+    database._replica_down_until = time.monotonic() - 1
+    async with read_session() as session:
+        assert session.get_bind() is up.engine.sync_engine
+    assert up.opened == 1
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+
+from app import storage
+from app.database import async_session
+from app.models import Blob, Document
+from app.routers import documents
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def failing_storage(monkeypatch):
+    """save_upload that rejects large.pdf as too large and fails on broken.pdf."""
+    save_upload = documents.save_upload
+
+    async def save(file):
+        if file.filename == "large.pdf":
+            raise HTTPException(status_code=413, detail="File exceeds maximum upload size of 10 bytes")
+        if file.filename == "broken.pdf":
+            raise OSError(28, "No space left on device")
+        return await save_upload(file)
+
+    monkeypatch.setattr(documents, "save_upload", save)
+
+
+async def test_batch_upload_reports_failed_files(client, failing_storage):
+    headers = await register(client, "CLIENT")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=headers)).json()["id"]
+    files = [
+        ("files", ("umowa.pdf", b"%PDF-1.4 umowa", "application/pdf")),
+        ("files", ("broken.pdf", b"%PDF-1.4 broken", "application/pdf")),
+        ("files", ("large.pdf", b"%PDF-1.4 large", "application/pdf")),
+        ("files", ("skan.png", b"\x89PNG skan", "image/png")),
+    ]
+    response = await client.post(f"/api/v1/documents/upload/{case_id}/batch", files=files, headers=headers)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["created"], result["failed"]) == (2, 2)
+    assert [(item["name"], item["ok"], item["error"]) for item in result["items"]] == [
+        ("umowa.pdf", True, None),
+        ("broken.pdf", False, "Could not store file"),
+        ("large.pdf", False, "File exceeds maximum upload size of 10 bytes"),
+        ("skan.png", True, None),
+    ]
+
+    response = await client.get(f"/api/v1/documents/case/{case_id}", headers=headers)
+    assert sorted(document["name"] for document in response.json()["items"]) == ["skan.png", "umowa.pdf"]
+
+
+async def create_case(client, headers) -> int:
+    return (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=headers)).json()["id"]
+
+
+async def test_upload_is_stored_under_its_hash(client):
+    headers = await register(client, "CLIENT")
+    case_id = await create_case(client, headers)
+    content = b"%PDF-1.4 umowa najmu"
+    tmp_before = set(storage.TMP_DIR.iterdir())
+    response = await client.post(f"/api/v1/documents/upload/{case_id}",
+                                 files={"file": ("umowa.pdf", content, "application/pdf")}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    response = await client.get(f"/api/v1/documents/case/{case_id}", headers=headers)
+    [document] = response.json()["items"]
+    sha256 = hashlib.sha256(content).hexdigest()
+    assert (document["sha256"], document["size"]) == (sha256, len(content))
+    assert storage.blob_path(sha256).read_bytes() == content
+    assert set(storage.TMP_DIR.iterdir()) == tmp_before
+
+
+async def test_oversized_upload_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(storage, "MAX_UPLOAD_SIZE", 1024)
+    headers = await register(client, "CLIENT")
+    case_id = await create_case(client, headers)
+    tmp_before = set(storage.TMP_DIR.iterdir())
+    path = f"/api/v1/documents/upload/{case_id}"
+
+    # Within the request limit, so the file is streamed and rejected by save_upload
+    response = await client.post(path, files={"file": ("large.pdf", b"x" * 2048, "application/pdf")}, headers=headers)
+    assert response.status_code == 413
+    assert response.json()["detail"] == "File exceeds maximum upload size of 1024 bytes"
+
+    # Over the request limit: rejected before the body is parsed, by declared size or while reading
+    monkeypatch.setattr(storage, "FORM_OVERHEAD", 1024)
+    response = await client.post(path, files={"file": ("large.pdf", b"x" * 4096, "application/pdf")}, headers=headers)
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Request body exceeds maximum upload size of 2048 bytes"
+
+    async def chunks():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"large.pdf\"\r\n\r\n"
+        for _ in range(8):
+            yield b"x" * 512
+
+    response = await client.post(path, content=chunks(),
+                                 headers={**headers, "Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Request body exceeds maximum upload size of 2048 bytes"
+
+    response = await client.get(f"/api/v1/documents/case/{case_id}", headers=headers)
+    assert response.json()["items"] == []
+    assert set(storage.TMP_DIR.iterdir()) == tmp_before
+
+
+async def upload(client, headers, case_id: int, name: str, content: bytes) -> None:
+    response = await client.post(f"/api/v1/documents/upload/{case_id}",
+                                 files={"file": (name, content, "application/pdf")}, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+async def ref_counts() -> dict:
+    async with async_session() as db:
+        return dict((await db.execute(select(Blob.sha256, Blob.ref_count))).all())
+
+
+def age(path, seconds: float) -> None:
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+async def test_identical_uploads_share_one_blob(client):
+    headers = await register(client, "CLIENT")
+    first_case, second_case = await create_case(client, headers), await create_case(client, headers)
+    content = b"%PDF-1.4 pelnomocnictwo"
+    sha256 = hashlib.sha256(content).hexdigest()
+    await upload(client, headers, first_case, "a.pdf", content)
+    await upload(client, headers, second_case, "b.pdf", content)
+    assert (await ref_counts())[sha256] == 2
+    assert list(storage.blob_path(sha256).parent.iterdir()) == [storage.blob_path(sha256)]
+
+    # A blob file gc removed in the meantime is stored again by the next upload
+    storage.blob_path(sha256).unlink()
+    await upload(client, headers, first_case, "c.pdf", content)
+    assert storage.blob_path(sha256).read_bytes() == content
+
+
+async def test_gc_removes_only_unreferenced_old_blobs(client):
+    headers = await register(client, "CLIENT")
+    case_id = await create_case(client, headers)
+    kept, unused, fresh = b"%PDF-1.4 kept", b"%PDF-1.4 unused", b"%PDF-1.4 fresh"
+    for name, content in (("kept.pdf", kept), ("unused.pdf", unused), ("fresh.pdf", fresh)):
+        await upload(client, headers, case_id, name, content)
+    hashes = {content: hashlib.sha256(content).hexdigest() for content in (kept, unused, fresh)}
+    async with async_session() as db:
+        await db.execute(delete(Document).where(Document.name.in_(["unused.pdf", "fresh.pdf"])))
+        await db.commit()
+    for content in (kept, unused):
+        age(storage.blob_path(hashes[content]), 7200)
+    orphan = storage.blob_path("ab" * 32)
+    orphan.parent.mkdir(parents=True, exist_ok=True)
+    orphan.write_bytes(b"left behind")
+    age(orphan, 7200)
+
+    async with async_session() as db:
+        stats = await storage.collect_garbage(db, dry_run=True, grace_seconds=3600)
+    assert (stats["deleted_blobs"], stats["deleted_orphans"]) == (1, 1)
+    assert storage.blob_path(hashes[unused]).exists() and orphan.exists()
+
+    async with async_session() as db:
+        stats = await storage.collect_garbage(db, grace_seconds=3600)
+    assert (stats["deleted_blobs"], stats["deleted_orphans"]) == (1, 1)
+    assert stats["freed_bytes"] == len(unused) + len(b"left behind")
+    assert not storage.blob_path(hashes[unused]).exists() and not orphan.exists()
+    # Still referenced, or unreferenced but within the grace period
+    assert storage.blob_path(hashes[kept]).exists() and storage.blob_path(hashes[fresh]).exists()
+    assert await ref_counts() == {hashes[kept]: 1, hashes[fresh]: 0}
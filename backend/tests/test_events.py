@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.auth import Principal
+from app.database import async_session
+from app.events import HEARTBEAT, RESET, EventBroker, case_events
+from app.models import Case, CaseStatus, User, UserRole
+from tests.conftest import live_stream, register
+
+pytestmark = pytest.mark.anyio
+
+ANNA = Principal(id=1, email="anna@example.com", role=UserRole.CLIENT, is_active=True)
+OPERATOR = Principal(id=3, email="operator@example.com", role=UserRole.OPERATOR, is_active=True)
+
+
+async def take(subscription, count: int, timeout: float = 1) -> list:
+    return [await asyncio.wait_for(subscription.__anext__(), timeout) for _ in range(count)]
+
+
+async def waiting_for(subscription, count: int) -> asyncio.Task:
+    """Start taking count items; returns once the subscriber is waiting for events."""
+    task = asyncio.ensure_future(take(subscription, count))
+    await asyncio.sleep(0.01)
+    return task
+
+
+def publish(broker: EventBroker, case_id: int, client_id: int) -> None:
+    broker.publish("case.updated", case_id, client_id, {"status": "COMPLETED"})
+
+
+async def test_clients_only_get_events_of_their_cases():
+    broker = EventBroker(backend="memory")
+    anna = await waiting_for(broker.subscribe(ANNA, heartbeat=60), 2)
+    operator = await waiting_for(broker.subscribe(OPERATOR, heartbeat=60), 3)
+    only_case_11 = await waiting_for(broker.subscribe(OPERATOR, case_id=11, heartbeat=60), 1)
+
+    publish(broker, 10, client_id=1)
+    publish(broker, 20, client_id=2)
+    publish(broker, 11, client_id=1)
+    assert [event.case_id for event in await anna] == [10, 11]
+    assert [event.case_id for event in await operator] == [10, 20, 11]
+    assert [event.case_id for event in await only_case_11] == [11]
+
+
+async def test_resume_from_last_event_id():
+    broker = EventBroker(backend="memory", history_size=3)
+    for case_id in (1, 2, 3):
+        publish(broker, case_id, client_id=1)
+    first = [event for _, event in broker.history][0]
+
+    resumed = await take(broker.subscribe(OPERATOR, last_event_id=first.id, heartbeat=60), 2)
+    assert [event.case_id for event in resumed] == [2, 3]
+    # Ids fall out of the buffer: the client is told to refetch, then gets new events
+    publish(broker, 4, client_id=1)
+    subscription = broker.subscribe(OPERATOR, last_event_id=first.id, heartbeat=60)
+    assert await take(subscription, 1) == [RESET]
+    publish(broker, 5, client_id=1)
+    assert [event.case_id for event in await take(subscription, 1)] == [5]
+
+
+async def test_reset_when_events_may_have_been_missed():
+    broker = EventBroker(backend="memory", history_size=2)
+    subscription = broker.subscribe(OPERATOR, heartbeat=60)
+    waiting = await waiting_for(subscription, 1)
+    publish(broker, 1, client_id=1)
+    assert [event.case_id for event in await waiting] == [1]
+
+    # A subscriber that falls behind the buffer
+    for case_id in (2, 3, 4):
+        publish(broker, case_id, client_id=1)
+    assert await take(subscription, 1) == [RESET]
+    publish(broker, 5, client_id=1)
+    assert [event.case_id for event in await take(subscription, 1)] == [5]
+
+    # A lost LISTEN connection wakes waiting subscribers with RESET
+    waiting = await waiting_for(subscription, 1)
+    broker._reset()
+    assert await waiting == [RESET]
+
+
+async def test_heartbeat_when_idle():
+    broker = EventBroker(backend="memory")
+    subscription = broker.subscribe(OPERATOR, heartbeat=0.01)
+    assert await take(subscription, 2) == [HEARTBEAT, HEARTBEAT]
+
+
+async def test_published_after_commit_only(database):
+    async with async_session() as db:
+        user = User(email="anna@example.com", name="Anna", hashed_password="x", role=UserRole.CLIENT)
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+        published = len(case_events.history)
+
+        db.add(Case(name="Najem", client_id=user_id))
+        await db.flush()
+        await db.rollback()
+        assert len(case_events.history) == published
+
+        case = Case(name="Spadek", client_id=user_id)
+        db.add(case)
+        await db.flush()
+        assert len(case_events.history) == published
+        await db.commit()
+        case.status = CaseStatus.COMPLETED
+        await db.commit()
+    events = [event for _, event in list(case_events.history)[published:]]
+    assert [(event.type, event.case_id, event.client_id) for event in events] == [
+        ("case.created", case.id, user_id), ("case.updated", case.id, user_id),
+    ]
+    assert events[1].data["previous_status"] == CaseStatus.NEW
+
+
+async def test_stream_with_query_token_is_scoped_to_the_client(client):
+    anna = await register(client, "CLIENT", "anna@example.com")
+    jan = await register(client, "CLIENT", "jan@example.com")
+    jan_case = (await client.post("/api/v1/cases/", json={"name": "Jana"}, headers=jan)).json()["id"]
+    token = anna["Authorization"].removeprefix("Bearer ")
+
+    response = await client.get(f"/api/v1/events/stream?case_id={jan_case}&token={token}")
+    assert response.status_code == 403
+    assert (await client.get("/api/v1/events/stream?token=invalid")).status_code == 401
+    assert (await client.get("/api/v1/events/stream")).status_code == 401
+
+    async with live_stream("GET", f"/api/v1/events/stream?token={token}", {}) as stream:
+        await stream.read_until(": connected")
+        assert stream.status == 200
+        await client.post("/api/v1/cases/", json={"name": "Jana druga"}, headers=jan)
+        await client.post("/api/v1/cases/", json={"name": "Anny"}, headers=anna)
+        text = await stream.read_until("event: case.created")
+    assert "Jana" not in text
+    data = json.loads(text.split("data: ", 1)[1].split("\n", 1)[0])
+    assert data["name"] == "Anny"
+    async with async_session() as db:
+        owner = (await db.execute(select(Case.client_id).where(Case.id == data["case_id"]))).scalar_one()
+        anna_id = (await db.execute(select(User.id).where(User.email == "anna@example.com"))).scalar_one()
+    assert owner == anna_id
@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+
+import pytest
+
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_case(client, headers, name: str, notes: str = None) -> int:
+    response = await client.post("/api/v1/cases/", json={"name": name, "client_notes": notes}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def ndjson(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.fixture
+async def clients(client):
+    anna = await register(client, "CLIENT", "anna@example.com")
+    jan = await register(client, "CLIENT", "jan@example.com")
+    operator = await register(client, "OPERATOR")
+    cases = {
+        "anna": [await create_case(client, anna, "Najem"), await create_case(client, anna, "Spadek")],
+        "jan": [await create_case(client, jan, "Kredyt")],
+    }
+    return {"anna": anna, "jan": jan, "operator": operator, "cases": cases}
+
+
+async def test_ndjson_rows_in_id_order(client, clients):
+    response = await client.get("/api/v1/exports/cases", headers=clients["operator"])
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="cases.ndjson"'
+    rows = ndjson(response)
+    assert [row["id"] for row in rows] == clients["cases"]["anna"] + clients["cases"]["jan"]
+    assert set(rows[0]) == {"id", "name", "client_id", "status", "client_notes", "operator_notes",
+                            "created_at", "updated_at"}
+    assert (rows[0]["name"], rows[0]["status"]) == ("Najem", "NEW")
+
+
+async def test_clients_only_export_their_cases(client, clients):
+    response = await client.get("/api/v1/exports/cases", headers=clients["anna"])
+    assert [row["id"] for row in ndjson(response)] == clients["cases"]["anna"]
+    jan_id = ndjson(await client.get("/api/v1/exports/cases", headers=clients["jan"]))[0]["client_id"]
+
+    response = await client.get("/api/v1/exports/cases", params={"client_id": jan_id}, headers=clients["anna"])
+    assert response.status_code == 403
+    response = await client.get("/api/v1/exports/analyses", params={"client_id": jan_id}, headers=clients["anna"])
+    assert response.status_code == 403
+
+    response = await client.get("/api/v1/exports/cases", params={"client_id": jan_id}, headers=clients["operator"])
+    assert [row["id"] for row in ndjson(response)] == clients["cases"]["jan"]
+
+
+async def test_analyses_follow_their_case_owner(client, clients):
+    for case_id in (clients["cases"]["anna"][0], clients["cases"]["jan"][0]):
+        response = await client.post("/api/v1/analyses/", headers=clients["operator"], json={
+            "case_id": case_id, "content": "Treść", "summary": "Podsumowanie", "recommendations": "[]",
+            "price": 59.0,
+        })
+        assert response.status_code == 200
+    response = await client.get("/api/v1/exports/analyses", headers=clients["anna"])
+    rows = ndjson(response)
+    assert [row["case_id"] for row in rows] == [clients["cases"]["anna"][0]]
+    assert "content" not in rows[0]
+
+    response = await client.get("/api/v1/exports/analyses", params={"include_content": True},
+                                headers=clients["operator"])
+    assert [row["content"] for row in ndjson(response)] == ["Treść", "Treść"]
+
+
+async def test_csv_escapes_formulas(client):
+    headers = await register(client, "CLIENT")
+    names = ["=HYPERLINK(\"http://x\")", "+48 600 000 000", "-1+1", "@SUM(A1)", "Najem, lokal \"A\""]
+    for name in names:
+        await create_case(client, headers, name, notes="zwykła notatka")
+
+    response = await client.get("/api/v1/exports/cases", params={"format": "csv"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    header, *rows = list(csv.reader(io.StringIO(response.text)))
+    assert header[:2] == ["id", "name"]
+    assert [row[1] for row in rows] == ["'" + name for name in names[:4]] + [names[4]]
+    assert {row[header.index("client_notes")] for row in rows} == {"zwykła notatka"}
+    assert {row[header.index("status")] for row in rows} == {"NEW"}
@@ -0,0 +1,52 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.database import async_session
+from app.extraction import extract_pending, shutdown_extraction
+from app.models import Blob, ExtractionStatus
+from app.storage import blob_path
+
+pytestmark = pytest.mark.anyio
+
+
+def write_pdf() -> str:
+    import pypdf
+
+    writer = pypdf.PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    path = blob_path("0" * 64).parent / "tmp.pdf"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        writer.write(f)
+    data = path.read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    blob_path(sha256).parent.mkdir(parents=True, exist_ok=True)
+    path.rename(blob_path(sha256))
+    return sha256
+
+
+async def test_stale_running_blobs_are_reclaimed(database):
+    sha256 = write_pdf()
+    now = datetime.now(timezone.utc)
+    async with async_session() as db:
+        for key, status, claimed_at in (
+            (sha256, ExtractionStatus.RUNNING, now - timedelta(hours=2)),
+            ("f" * 64, ExtractionStatus.RUNNING, now),
+        ):
+            db.add(Blob(sha256=key, size=1, ref_count=1, extraction_status=status, extraction_claimed_at=claimed_at))
+        await db.commit()
+
+    try:
+        stats = await extract_pending()
+    finally:
+        shutdown_extraction()
+
+    assert stats == {"completed": 1, "failed": 0, "skipped": 0}
+    async with async_session() as db:
+        statuses = dict((await db.execute(select(Blob.sha256, Blob.extraction_status))).all())
+    assert statuses[sha256] == ExtractionStatus.COMPLETED
+    # Claimed moments ago: still being extracted elsewhere
+    assert statuses["f" * 64] == ExtractionStatus.RUNNING
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+
+from app import idempotency
+from app.auth import create_access_token
+from app.database import async_session
+from app.models import Case, IdempotencyKey
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+async def count(column) -> int:
+    async with async_session() as db:
+        return (await db.execute(select(func.count(column)))).scalar()
+
+
+async def test_retry_replays_first_response(client):
+    headers = {**await register(client, "CLIENT"), "Idempotency-Key": "create-a"}
+    first = await client.post("/api/v1/cases/", json={"name": "A"}, headers=headers)
+    retry = await client.post("/api/v1/cases/", json={"name": "A"}, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert await count(Case.id) == 1
+
+    other = await client.post("/api/v1/cases/", json={"name": "B"}, headers=headers)
+    assert other.status_code == 422
+
+
+async def test_key_survives_relogin(client):
+    headers = await register(client, "CLIENT")
+    first = await client.post("/api/v1/cases/", json={"name": "A"}, headers={**headers, "Idempotency-Key": "k"})
+    # A new token for the same user, as after logging in again between retries
+    token = create_access_token({"sub": "client@example.com"}, expires_delta=timedelta(minutes=5))
+    retry = await client.post("/api/v1/cases/", json={"name": "A"},
+                              headers={"Authorization": f"Bearer {token}", "Idempotency-Key": "k"})
+    assert retry.headers.get("idempotent-replayed") == "true"
+    assert retry.json()["id"] == first.json()["id"]
+
+    operator = await register(client, "OPERATOR")
+    response = await client.post("/api/v1/cases/", json={"name": "A"}, headers={**operator, "Idempotency-Key": "k"})
+    assert "idempotent-replayed" not in response.headers
+
+
+async def test_invalid_token_is_not_buffered(client):
+    response = await client.post("/api/v1/cases/", json={"name": "A"},
+                                 headers={"Authorization": "Bearer nonsense", "Idempotency-Key": "k"})
+    assert response.status_code == 401
+    assert await count(IdempotencyKey.key) == 0
+
+
+async def test_request_body_limit(client, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_MAX_REQUEST_BODY", 1024)
+    headers = {**await register(client, "CLIENT"), "Idempotency-Key": "big"}
+    response = await client.post("/api/v1/cases/", json={"name": "x" * 2048}, headers=headers)
+    assert response.status_code == 413
+
+    # Without a declared length the limit applies while reading
+    async def chunks():
+        for _ in range(4):
+            yield b"x" * 512
+
+    response = await client.post("/api/v1/cases/", content=chunks(),
+                                 headers={**headers, "Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert await count(Case.id) == 0
+
+
+async def test_concurrent_retry_waits_for_first_attempt(client):
+    headers = {**await register(client, "CLIENT"), "Idempotency-Key": "same"}
+    responses = await asyncio.gather(*(
+        client.post("/api/v1/cases/", json={"name": "A"}, headers=headers) for _ in range(3)
+    ))
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert await count(Case.id) == 1
+
+
+async def test_abandoned_attempt_frees_key(client):
+    headers = {**await register(client, "CLIENT"), "Idempotency-Key": "lost"}
+    # A worker that died mid-request leaves its claim behind
+    async with async_session() as db:
+        db.add(IdempotencyKey(subject="client@example.com", key="lost", fingerprint="x",
+                              expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+        await db.commit()
+    response = await client.post("/api/v1/cases/", json={"name": "A"}, headers=headers)
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
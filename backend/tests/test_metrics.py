@@ -0,0 +1,52 @@
+import logging
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app import metrics
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+ROUTE = "/api/v1/cases/{case_id}"
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+async def test_requests_are_labelled_by_route_template(client):
+    headers = await register(client, "CLIENT")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=headers)).json()["id"]
+    requests = sample("http_requests_total", method="GET", route=ROUTE, status="200")
+    latencies = sample("http_request_duration_seconds_count", method="GET", route=ROUTE)
+    queries = sample("db_queries_per_request_sum", route=ROUTE)
+    observed = sample("db_queries_per_request_count", route=ROUTE)
+
+    response = await client.get(f"/api/v1/cases/{case_id}", headers=headers)
+    assert response.status_code == 200
+    assert sample("http_requests_total", method="GET", route=ROUTE, status="200") == requests + 1
+    assert sample("http_request_duration_seconds_count", method="GET", route=ROUTE) == latencies + 1
+    # One statement: the case itself; the user comes from the token
+    assert sample("db_queries_per_request_count", route=ROUTE) == observed + 1
+    assert sample("db_queries_per_request_sum", route=ROUTE) == queries + 1
+
+    response = await client.get("/api/v1/cases/999999", headers=headers)
+    assert response.status_code == 404
+    assert sample("http_requests_total", method="GET", route=ROUTE, status="404") >= 1
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert f'http_requests_total{{method="GET",route="{ROUTE}",status="200"}}' in response.text
+    # Unknown paths share one label instead of one per URL
+    await client.get("/no/such/path")
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+
+
+async def test_slow_queries_are_logged(client, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    headers = await register(client, "CLIENT")
+    with caplog.at_level(logging.WARNING, logger="app.sql.slow"):
+        await client.get("/api/v1/cases/", headers=headers)
+    assert any(record.getMessage().startswith("slow query") and "FROM cases" in record.getMessage()
+               for record in caplog.records)
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.ai import CircuitBreaker, ModelBackend, ModelClient, ModelUnavailable, TransientModelError
+
+pytestmark = pytest.mark.anyio
+
+# Script item: block until the backend's gate is opened
+WAIT = object()
+
+
+class ScriptedBackend(ModelBackend):
+    """Each call plays the next script: chunks to yield, WAIT for the gate, or an exception to raise."""
+
+    model_name = "scripted"
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.gate = threading.Event()
+        self._lock = threading.Lock()
+
+    def stream(self, prompt: str):
+        with self._lock:
+            script = self.scripts[min(self.calls, len(self.scripts) - 1)]
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            for item in script:
+                if item is WAIT:
+                    assert self.gate.wait(5), "gate was never opened"
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+    async def wait_started(self, calls: int = 1) -> None:
+        """Wait until the backend has been called `calls` times in total."""
+        for _ in range(500):
+            if self.calls >= calls:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("backend was not called")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def make_client():
+    clients = []
+
+    def make(backend, **options):
+        options.setdefault("backoff", 0)
+        clients.append(ModelClient(backend=backend, **options))
+        return clients[-1]
+
+    yield make
+    for client in clients:
+        client.shutdown()
+
+
+async def test_concurrency_cap(make_client):
+    backend = ScriptedBackend([WAIT, "ok"])
+    client = make_client(backend, max_concurrency=2)
+    tasks = [asyncio.create_task(client.generate(f"prompt {number}")) for number in range(5)]
+    await backend.wait_started(2)
+    await asyncio.sleep(0.05)
+    assert backend.active == 2
+
+    backend.gate.set()
+    assert await asyncio.gather(*tasks) == ["ok"] * 5
+    assert backend.calls == 5
+    assert backend.max_active == 2
+
+
+async def test_deadline_expires(make_client):
+    backend = ScriptedBackend([WAIT, "late"])
+    client = make_client(backend, timeout=10, deadline=0.1, max_retries=5)
+    try:
+        with pytest.raises(TimeoutError, match="after 1 attempt"):
+            await client.generate("prompt")
+    finally:
+        backend.gate.set()
+    assert backend.calls == 1
+
+
+async def test_transient_failure_is_retried(make_client):
+    backend = ScriptedBackend([TransientModelError("busy")], ["ok"])
+    client = make_client(backend, max_retries=2)
+    assert await client.generate("prompt") == "ok"
+    assert backend.calls == 2
+
+
+async def test_no_retry_after_output_streamed(make_client):
+    backend = ScriptedBackend(["Pierwsza część ", TransientModelError("connection reset")], ["ok"])
+    client = make_client(backend, max_retries=2)
+    chunks = []
+    with pytest.raises(TransientModelError):
+        await client.generate("prompt", on_chunk=chunks.append)
+    assert chunks == ["Pierwsza część "]
+    assert backend.calls == 1
+
+
+async def test_breaker_opens_and_half_opens(make_client):
+    clock = Clock()
+    backend = ScriptedBackend([TransientModelError("down")], [TransientModelError("down")], [WAIT, "ok"])
+    client = make_client(backend, max_retries=0,
+                         breaker=CircuitBreaker(threshold=2, reset_seconds=30, clock=clock))
+    for _ in range(2):
+        with pytest.raises(TransientModelError):
+            await client.generate("prompt")
+
+    # Open: calls fail fast without reaching the model
+    with pytest.raises(ModelUnavailable) as raised:
+        await client.generate("prompt")
+    assert raised.value.retry_after == 30
+    assert backend.calls == 2
+
+    # Half-open: one trial call goes through, the others are still rejected
+    clock.now += 30
+    trial = asyncio.create_task(client.generate("trial"))
+    await backend.wait_started(3)
+    with pytest.raises(ModelUnavailable):
+        await client.generate("other")
+
+    backend.gate.set()
+    assert await trial == "ok"
+    assert not client.breaker.is_open
+    assert await client.generate("after") == "ok"
+
+
+async def test_identical_prompts_share_one_call(make_client):
+    backend = ScriptedBackend(["Część pierwsza. ", WAIT, "Część druga."])
+    client = make_client(backend)
+    first_chunks, late_chunks = [], []
+    first = asyncio.create_task(client.generate("prompt", on_chunk=first_chunks.append))
+    await backend.wait_started()
+    while not first_chunks:
+        await asyncio.sleep(0.01)
+
+    # A caller joining mid-stream gets the chunks it missed, then the rest
+    late = asyncio.create_task(client.generate("prompt", on_chunk=late_chunks.append))
+    await asyncio.sleep(0.01)
+    backend.gate.set()
+    assert await asyncio.gather(first, late) == ["Część pierwsza. Część druga."] * 2
+    assert backend.calls == 1
+    assert first_chunks == late_chunks == ["Część pierwsza. ", "Część druga."]
+
+
+async def test_cancelled_trial_releases_the_breaker(make_client):
+    clock = Clock()
+    backend = ScriptedBackend([TransientModelError("down")], [WAIT, "late"], ["ok"])
+    client = make_client(backend, max_retries=0, breaker=CircuitBreaker(threshold=1, reset_seconds=30, clock=clock))
+    with pytest.raises(TransientModelError):
+        await client.generate("prompt")
+
+    # The half-open trial is cancelled, e.g. because the client disconnected
+    clock.now += 30
+    trial = asyncio.create_task(client.generate("trial"))
+    await backend.wait_started(2)
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+    backend.gate.set()
+
+    # The next call becomes the trial instead of being rejected forever
+    assert await client.generate("after") == "ok"
+    assert not client.breaker.is_open
+
+
+async def test_timed_out_calls_count_against_the_cap(make_client):
+    backend = ScriptedBackend([WAIT, "late"], ["ok"])
+    client = make_client(backend, max_concurrency=1, timeout=0.05, max_retries=0)
+    with pytest.raises(TimeoutError):
+        await client.generate("first")
+
+    # The abandoned call still runs on its thread, so the next one waits for it
+    second = asyncio.create_task(client.generate("second"))
+    await asyncio.sleep(0.1)
+    assert backend.calls == 1
+    assert not second.done()
+
+    backend.gate.set()
+    assert await second == "ok"
+    assert backend.max_active == 1
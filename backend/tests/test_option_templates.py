@@ -0,0 +1,29 @@
+import pytest
+
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+TEMPLATE = {
+    "name": "Sprzeciw od nakazu zapłaty",
+    "description": "Przygotowanie sprzeciwu",
+    "price": 199.0,
+    "estimated_time": "3 dni",
+    "category": "pisma",
+}
+
+
+async def test_partial_update_rejects_nulls(client):
+    headers = await register(client, "ADMIN")
+    template = (await client.post("/api/v1/option-templates/", json=TEMPLATE, headers=headers)).json()
+    url = f"/api/v1/option-templates/{template['id']}"
+
+    response = await client.patch(url, json={"price": 249.0}, headers=headers)
+    assert response.status_code == 200
+    assert {**template, "price": 249.0} == response.json()
+
+    response = await client.patch(url, json={"name": None, "price": None, "sort_order": 1}, headers=headers)
+    assert response.status_code == 422
+    assert "name, price cannot be null" in response.json()["detail"][0]["msg"]
+    response = await client.get("/api/v1/option-templates/", headers=headers)
+    assert {**template, "price": 249.0} in response.json()
@@ -0,0 +1,57 @@
+import base64
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app.database import async_session
+from app.models import Case
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+async def all_pages(client, headers, **params) -> list:
+    ids = []
+    cursor = None
+    while True:
+        response = await client.get("/api/v1/cases/", params={**params, **({"cursor": cursor} if cursor else {})},
+                                    headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        ids += [case["id"] for case in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("order", ["desc", "asc"])
+async def test_pages_with_equal_timestamps_neither_overlap_nor_skip(client, order):
+    headers = await register(client, "CLIENT")
+    created = [(await client.post("/api/v1/cases/", json={"name": f"Sprawa {n}"}, headers=headers)).json()["id"]
+               for n in range(7)]
+    # As for cases created in one transaction or by a bulk import
+    async with async_session() as db:
+        await db.execute(update(Case).values(created_at=datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)))
+        await db.commit()
+
+    ids = await all_pages(client, headers, limit=2, order=order)
+    # Ties on created_at are broken by id
+    assert ids == sorted(created, reverse=order == "desc")
+
+    response = await client.get("/api/v1/cases/", params={"limit": 3, "include_total": True}, headers=headers)
+    assert response.json()["total"] == 7
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b'{"created_at": 1}').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+    base64.urlsafe_b64encode(b'["2026-01-05T12:00:00", "x"]').decode(),
+    base64.urlsafe_b64encode(b'[null, 1]').decode(),
+])
+async def test_malformed_cursor_is_rejected(client, cursor):
+    headers = await register(client, "CLIENT")
+    response = await client.get("/api/v1/cases/", params={"cursor": cursor}, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,97 @@
+import hashlib
+
+import pytest
+
+from app import responses
+from app.responses import parse_range
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+CONTENT = b"%PDF-1.4 " + bytes(range(256))
+
+
+@pytest.fixture
+async def document(client):
+    """An uploaded PDF: (headers, content path, ETag)."""
+    headers = await register(client, "CLIENT")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=headers)).json()["id"]
+    response = await client.post(f"/api/v1/documents/upload/{case_id}",
+                                 files={"file": ("umowa.pdf", CONTENT, "application/pdf")}, headers=headers)
+    path = f"/api/v1/documents/{response.json()['document_id']}/content"
+    return headers, path, f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-9", None),
+    ("bytes=-", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=9-5", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 100)
+
+
+async def test_full_and_partial_content(client, document):
+    headers, path, etag = document
+    response = await client.get(path, headers=headers)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert (response.headers["etag"], response.headers["accept-ranges"]) == (etag, "bytes")
+
+    response = await client.get(path, headers={**headers, "Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[2:6]
+    assert response.headers["content-range"] == f"bytes 2-5/{len(CONTENT)}"
+    assert response.headers["content-length"] == "4"
+
+    response = await client.get(path, headers={**headers, "Range": "bytes=-16"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-16:]
+    assert response.headers["content-range"] == f"bytes {len(CONTENT) - 16}-{len(CONTENT) - 1}/{len(CONTENT)}"
+
+
+async def test_unsatisfiable_range(client, document):
+    headers, path, _ = document
+    response = await client.get(path, headers={**headers, "Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+async def test_if_range_with_another_etag_sends_everything(client, document):
+    headers, path, _ = document
+    response = await client.get(path, headers={**headers, "Range": "bytes=2-5", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+async def test_matching_etag_is_not_modified(client, document):
+    headers, path, etag = document
+    response = await client.get(path, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = await client.get(path, headers={**headers, "If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
+async def test_accel_redirect_hands_the_body_to_nginx(client, document, monkeypatch):
+    monkeypatch.setattr(responses, "DOCUMENT_ACCEL_REDIRECT_PREFIX", "/protected-uploads/")
+    headers, path, etag = document
+    response = await client.get(path, headers={**headers, "Range": "bytes=2-5"})
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"].startswith("/protected-uploads/")
+    assert response.headers["x-accel-redirect"].endswith(etag.strip('"'))
+    assert response.headers["etag"] == etag
@@ -0,0 +1,127 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import delete, update
+
+from app.database import async_session
+from app.models import Blob, BlobPage, Case, Document, DocumentType, ExtractionStatus
+from app.retrieval import NOTES_SOURCE, CaseIndex, estimate_tokens, select_passages, sync_case_index
+from tests.conftest import register, wait_for_job
+
+pytestmark = pytest.mark.anyio
+
+LEASE = "Umowa najmu lokalu mieszkalnego zawarta na czas nieokreślony z miesięcznym okresem wypowiedzenia."
+ORDER = "Sąd rejonowy wydał nakaz zapłaty, od którego pozwany może wnieść sprzeciw w terminie dwóch tygodni."
+ESTATE = "Spadkobierca ustawowy może dochodzić zachowku od osoby obdarowanej przez spadkodawcę."
+
+
+def test_search_ranks_matching_passages():
+    index = CaseIndex()
+    index.add("lease", [("umowa, s. 1", LEASE)])
+    index.add("order", [("nakaz, s. 1", ORDER), ("nakaz, s. 2", ESTATE)])
+    # Stems match inflected forms: "nakazu" and "zapłaty" find "nakaz zapłaty"
+    hits = index.search("Jak napisać sprzeciw od nakazu zapłaty?")
+    assert [passage.label for _, passage in hits] == ["nakaz, s. 1"]
+    hits = index.search("wypowiedzenie najmu albo nakaz")
+    assert {passage.label for _, passage in hits} == {"umowa, s. 1", "nakaz, s. 1"}
+    assert hits[0][0] >= hits[1][0]
+    assert index.search("odszkodowanie") == []
+
+
+def test_add_replaces_and_remove_forgets_a_source():
+    index = CaseIndex()
+    index.add("lease", [("umowa, s. 1", LEASE)])
+    index.add("order", [("nakaz, s. 1", ORDER)])
+    index.add("lease", [("umowa, s. 1", ESTATE)], version="2")
+    assert [passage.text for _, passage in index.search("najmu")] == []
+    assert [passage.text for _, passage in index.search("zachowku")] == [ESTATE]
+    assert index.versions["lease"] == "2"
+
+    index.remove("lease")
+    index.remove("missing")
+    assert index.search("zachowku") == []
+    assert set(index.sources) == {"order"}
+    assert index.total_length == sum(passage.length for passage in index.passages.values())
+    assert all(set(postings) <= set(index.passages) for postings in index.postings.values())
+
+
+def test_select_passages_fits_the_budget():
+    index = CaseIndex()
+    index.add("order", [(f"nakaz, s. {page}", ORDER) for page in range(1, 11)])
+    cost = estimate_tokens(ORDER)
+    assert len(select_passages(index, "nakaz zapłaty", token_budget=cost * 3)) == 3
+    assert select_passages(index, "nakaz zapłaty", token_budget=cost - 1) == []
+    assert len(select_passages(index, "nakaz zapłaty", token_budget=cost * 10, limit=4)) == 4
+
+
+async def add_document(case_id: int, sha256: str, name: str, pages: list) -> None:
+    """A document whose text has already been extracted."""
+    async with async_session() as db:
+        db.add(Blob(sha256=sha256, size=1, ref_count=1, extraction_status=ExtractionStatus.COMPLETED,
+                    page_count=len(pages)))
+        db.add_all(BlobPage(sha256=sha256, page_number=number, text=text) for number, text in enumerate(pages, 1))
+        db.add(Document(case_id=case_id, name=name, type=DocumentType.PDF, url=f"/files/{sha256}", size=1,
+                        sha256=sha256))
+        await db.commit()
+
+
+async def test_sync_case_index_picks_up_documents_and_notes(client):
+    headers = await register(client, "CLIENT")
+    response = await client.post("/api/v1/cases/", json={"name": "Najem", "client_notes": LEASE}, headers=headers)
+    case_id = response.json()["id"]
+
+    async with async_session() as db:
+        index = await sync_case_index(db, case_id)
+    assert set(index.sources) == {NOTES_SOURCE}
+
+    await add_document(case_id, "a" * 64, "nakaz.pdf", [ORDER, ESTATE])
+    async with async_session() as db:
+        case = await db.get(Case, case_id)
+        case.client_notes = ESTATE
+        await db.commit()
+        assert await sync_case_index(db, case_id) is index
+    assert set(index.sources) == {NOTES_SOURCE, "a" * 64}
+    assert [passage.label for _, passage in index.search("nakaz")] == ["nakaz.pdf, s. 1"]
+    # Changed notes are indexed again, replacing the old text
+    assert index.search("najmu") == []
+    assert {passage.label for _, passage in index.search("zachowku")} == {"notatki klienta", "nakaz.pdf, s. 2"}
+
+
+async def test_sync_case_index_replaces_and_drops_documents(client):
+    headers = await register(client, "CLIENT")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=headers)).json()["id"]
+    await add_document(case_id, "a" * 64, "nakaz.pdf", [ORDER])
+    await add_document(case_id, "b" * 64, "umowa.pdf", [LEASE])
+    async with async_session() as db:
+        index = await sync_case_index(db, case_id)
+    assert set(index.sources) == {NOTES_SOURCE, "a" * 64, "b" * 64}
+
+    async with async_session() as db:
+        # Extracted again, e.g. after an OCR fix
+        await db.execute(update(BlobPage).where(BlobPage.sha256 == "a" * 64).values(text=ESTATE))
+        await db.execute(update(Blob).where(Blob.sha256 == "a" * 64).values(extracted_at=datetime.now(timezone.utc)))
+        await db.execute(delete(Document).where(Document.sha256 == "b" * 64))
+        await db.commit()
+        assert await sync_case_index(db, case_id) is index
+    assert set(index.sources) == {NOTES_SOURCE, "a" * 64}
+    assert index.search("nakaz") == []
+    assert index.search("najmu") == []
+    assert [passage.label for _, passage in index.search("zachowku")] == ["nakaz.pdf, s. 1"]
+
+
+async def test_generation_prompt_includes_passages(client, fake_backend):
+    client_headers = await register(client, "CLIENT")
+    operator_headers = await register(client, "OPERATOR")
+    response = await client.post("/api/v1/cases/", json={"name": "Nakaz", "client_notes": LEASE},
+                                 headers=client_headers)
+    case_id = response.json()["id"]
+    await add_document(case_id, "b" * 64, "nakaz.pdf", [ORDER, ESTATE])
+
+    response = await client.post(f"/api/v1/analyses/generate/{case_id}",
+                                 params={"question": "Jak napisać sprzeciw od nakazu zapłaty?"},
+                                 headers=operator_headers)
+    job = await wait_for_job(client, response.json()["id"], operator_headers)
+    assert job["status"] == "COMPLETED", job["error"]
+    assert job["context_passages"] == 1
+    assert f"[1] (nakaz.pdf, s. 1) {ORDER}" in fake_backend.prompts[0]
+    assert ESTATE not in fake_backend.prompts[0]
@@ -0,0 +1,70 @@
+"""Search through the FTS5 index on SQLite or the tsvector columns on PostgreSQL, as init_db creates them."""
+import pytest
+
+from app.database import engine
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_case(client, headers, name: str, notes: str) -> int:
+    response = await client.post("/api/v1/cases/", json={"name": name, "client_notes": notes}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+async def search(client, headers, q: str, **params) -> list:
+    response = await client.get("/api/v1/search/", params={"q": q, **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["items"]
+
+
+@pytest.fixture
+async def cases(client):
+    anna = await register(client, "CLIENT", "anna@example.com")
+    jan = await register(client, "CLIENT", "jan@example.com")
+    operator = await register(client, "OPERATOR")
+    lease = await create_case(client, anna, "Wypowiedzenie umowy najmu",
+                              "Wynajmujący wypowiedział umowę najmu bez zachowania terminu wypowiedzenia.")
+    order = await create_case(client, anna, "Nakaz zapłaty",
+                              "Otrzymałam nakaz zapłaty za fakturę; w umowie najmu nie było o tym mowy.")
+    car = await create_case(client, jan, "Najem samochodu", "Spór o kaucję z umowy najmu samochodu.")
+    response = await client.post("/api/v1/analyses/", headers=operator, json={
+        "case_id": lease, "content": "Wypowiedzenie umowy najmu wymaga formy pisemnej.",
+        "summary": "Wypowiedzenie najmu jest wadliwe", "recommendations": "[]", "price": 59.0,
+    })
+    assert response.status_code == 200
+    return {"anna": anna, "jan": jan, "operator": operator, "lease": lease, "order": order, "car": car,
+            "analysis": response.json()["id"]}
+
+
+async def test_ranks_by_relevance(client, cases):
+    hits = await search(client, cases["operator"], "wypowiedzenie najmu")
+    assert [(hit["kind"], hit["id"]) for hit in hits[:2]] == [("analysis", cases["analysis"]), ("case", cases["lease"])] \
+        or [(hit["kind"], hit["id"]) for hit in hits[:2]] == [("case", cases["lease"]), ("analysis", cases["analysis"])]
+    ranks = [hit["rank"] for hit in hits]
+    assert ranks == sorted(ranks, reverse=True)
+    # Only matches for both terms; the order notes mention "najmu" but not "wypowiedzenie"
+    assert cases["order"] not in [hit["case_id"] for hit in hits]
+    assert "<mark>" in hits[0]["headline"]
+
+    hits = await search(client, cases["operator"], "wypowiedzenie", kind="case")
+    assert {hit["kind"] for hit in hits} == {"case"}
+
+
+# legal_pl copies `simple`, which keeps accents
+@pytest.mark.skipif(engine.dialect.name != "sqlite", reason="only the FTS5 tokenizer folds diacritics")
+async def test_prefix_and_diacritics(client, cases):
+    # "nakaz" finds "nakaz" and "zapłat" finds "zapłaty"
+    hits = await search(client, cases["operator"], "nakaz zapłat")
+    assert [hit["case_id"] for hit in hits] == [cases["order"]]
+    # Accents are folded: "spor" finds "Spór"
+    hits = await search(client, cases["operator"], "spor kaucje")
+    assert [hit["case_id"] for hit in hits] == [cases["car"]]
+
+
+async def test_clients_only_find_their_cases(client, cases):
+    assert {hit["case_id"] for hit in await search(client, cases["jan"], "najmu")} == {cases["car"]}
+    assert {hit["case_id"] for hit in await search(client, cases["anna"], "najmu")} == {cases["lease"], cases["order"]}
+    assert {hit["case_id"] for hit in await search(client, cases["operator"], "najmu")} == \
+        {cases["lease"], cases["order"], cases["car"]}
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app.database import async_session
+from app.models import Case, CaseStatus, CaseStatusCount
+from app.stats import reconcile
+from tests.conftest import register
+
+pytestmark = pytest.mark.anyio
+
+
+async def get_stats(client, headers) -> dict:
+    response = await client.get("/api/v1/stats/", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_stats_follow_writes(client):
+    client_headers = await register(client, "CLIENT")
+    operator_headers = await register(client, "OPERATOR")
+    # Concurrent writers land on different shards; the endpoint sums them
+    await asyncio.gather(*(
+        client.post("/api/v1/cases/", json={"name": f"Sprawa {number}"}, headers=client_headers)
+        for number in range(5)
+    ))
+    case_id = (await client.get("/api/v1/cases/", headers=client_headers)).json()["items"][0]["id"]
+    response = await client.post("/api/v1/analyses/", headers=operator_headers, json={
+        "case_id": case_id, "content": "Treść", "summary": "Podsumowanie", "recommendations": "[]", "price": 59.0,
+    })
+    assert response.status_code == 200
+
+    stats = await get_stats(client, operator_headers)
+    assert sum(stats["cases_by_status"].values()) == 5
+    assert stats["open_cases"] == 5
+    assert stats["totals"]["cases_created"] == 5
+    assert stats["totals"]["analyses_created"] == 1
+    assert stats["totals"]["analysis_revenue"] == 59.0
+
+    async with async_session() as db:
+        assert await reconcile(db) == 0
+
+    response = await client.get("/api/v1/stats/", headers=client_headers)
+    assert response.status_code == 403
+
+
+async def test_reconcile_corrects_writes_outside_the_orm(client):
+    client_headers = await register(client, "CLIENT")
+    operator_headers = await register(client, "OPERATOR")
+    for number in range(3):
+        await client.post("/api/v1/cases/", json={"name": f"Sprawa {number}"}, headers=client_headers)
+    async with async_session() as db:
+        await db.execute(update(Case).values(status=CaseStatus.COMPLETED))
+        await db.commit()
+    assert (await get_stats(client, operator_headers))["open_cases"] == 3
+
+    async with async_session() as db:
+        assert await reconcile(db) == 2
+        assert await reconcile(db) == 0
+        shards = (await db.execute(select(func.count()).select_from(CaseStatusCount))).scalar()
+    stats = await get_stats(client, operator_headers)
+    assert stats["open_cases"] == 0
+    assert stats["cases_by_status"]["COMPLETED"] == 3
+    # Corrections are added to shard 0 rather than rewriting the tables
+    assert shards >= 2
@@ -0,0 +1,120 @@
+"""Generation streams: time to first byte and replay of finished jobs."""
+import json
+import threading
+
+import pytest
+from sqlalchemy import func, select
+
+from app.ai import ModelBackend, set_backend
+from app.database import async_session
+from app.jobs import analysis_jobs
+from app.models import Analysis
+from tests.conftest import live_stream, register, wait_for_job
+
+pytestmark = pytest.mark.anyio
+
+FIRST = "Pierwsza część analizy. "
+REST = ["Druga część. ", "Trzecia część."]
+
+
+class GatedBackend(ModelBackend):
+    """Streams the first chunk at once and the rest only after the gate is opened."""
+
+    model_name = "gated"
+
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+    def stream(self, prompt: str):
+        yield FIRST
+        assert self.gate.wait(5), "gate was never opened"
+        yield from REST
+
+
+@pytest.fixture
+def gated_backend():
+    backend = GatedBackend()
+    set_backend(backend)
+    yield backend
+    backend.gate.set()
+    set_backend(None)
+
+
+async def test_first_chunk_is_sent_before_generation_finishes(client, gated_backend):
+    client_headers = await register(client, "CLIENT")
+    operator_headers = await register(client, "OPERATOR")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=client_headers)).json()["id"]
+
+    path = f"/api/v1/analyses/generate/{case_id}/stream?question=Czy+mog%C4%99+wypowiedzie%C4%87"
+    async with live_stream("POST", path, operator_headers) as stream:
+        text = await stream.read_until("event: chunk")
+        assert stream.status == 200
+        # The model is still blocked after its first chunk, which has already reached the client
+        assert not gated_backend.gate.is_set()
+        assert f"id: 1\nevent: chunk\ndata: {{\"text\": \"{FIRST}\"}}" in text
+        gated_backend.gate.set()
+        text += await stream.read_until("event: done")
+        assert REST[-1] in text
+
+
+async def test_finished_job_replays_missed_chunks_as_one_event(client, gated_backend):
+    client_headers = await register(client, "CLIENT")
+    operator_headers = await register(client, "OPERATOR")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=client_headers)).json()["id"]
+    gated_backend.gate.set()
+    response = await client.post(f"/api/v1/analyses/generate/{case_id}", params={"question": "Czy mogę wypowiedzieć?"},
+                                 headers=operator_headers)
+    job = await wait_for_job(client, response.json()["id"], operator_headers)
+    assert job["status"] == "COMPLETED", job["error"]
+    assert analysis_jobs.get(job["id"]).events == []
+
+    def events(text):
+        return [message.split("\n") for message in text.strip().split("\n\n")][1:]
+
+    response = await client.get(f"/api/v1/analyses/jobs/{job['id']}/stream", headers=operator_headers)
+    assert events(response.text) == [
+        ["id: 3", "event: chunk", f'data: {{"text": "{FIRST}{"".join(REST)}"}}'],
+        ["id: 4", "event: done", f'data: {{"analysis_id": {job["analysis_id"]}}}'],
+    ]
+    # A reconnect after the first chunk gets the rest of the text, with the same event ids
+    response = await client.get(f"/api/v1/analyses/jobs/{job['id']}/stream",
+                                headers={**operator_headers, "Last-Event-ID": "1"})
+    assert events(response.text) == [
+        ["id: 3", "event: chunk", f'data: {{"text": "{"".join(REST)}"}}'],
+        ["id: 4", "event: done", f'data: {{"analysis_id": {job["analysis_id"]}}}'],
+    ]
+    response = await client.get(f"/api/v1/analyses/jobs/{job['id']}/stream",
+                                headers={**operator_headers, "Last-Event-ID": "4"})
+    assert events(response.text) == []
+
+
+async def test_retried_stream_follows_the_first_job(client, gated_backend):
+    client_headers = await register(client, "CLIENT")
+    operator_headers = await register(client, "OPERATOR")
+    case_id = (await client.post("/api/v1/cases/", json={"name": "Najem"}, headers=client_headers)).json()["id"]
+    headers = {**operator_headers, "Idempotency-Key": "stream-a"}
+
+    path = f"/api/v1/analyses/generate/{case_id}/stream?question=Czy+mog%C4%99+wypowiedzie%C4%87"
+    async with live_stream("POST", path, headers) as first:
+        text = await first.read_until("event: chunk")
+        job_id = json.loads(text.split("data: ", 1)[1].split("\n", 1)[0])["job_id"]
+        assert first.headers["content-location"] == f"/api/v1/analyses/jobs/{job_id}/stream"
+        # A retry while the first stream is still open follows the same job
+        async with live_stream("POST", path, headers) as retry:
+            text = await retry.read_until("event: chunk")
+            assert retry.status == 200
+            assert retry.headers["idempotent-replayed"] == "true"
+            assert f'"job_id": "{job_id}"' in text
+            assert FIRST in text
+        gated_backend.gate.set()
+        await first.read_until("event: done")
+
+    response = await client.post(path, headers=headers)
+    assert response.headers["idempotent-replayed"] == "true"
+    assert f'"job_id": "{job_id}"' in response.text
+    assert "".join(REST) in response.text and "event: done" in response.text
+    async with async_session() as db:
+        assert (await db.execute(select(func.count(Analysis.id)))).scalar() == 1